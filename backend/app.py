@@ -1,27 +1,96 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, UploadFile, File, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 import pandas as pd
 import json
 import os
-import io
-from typing import List, Dict, Optional
-from collections import defaultdict, Counter
+from typing import AsyncIterator, Collection, Iterator, List, Dict, Optional
+from collections import defaultdict, Counter, OrderedDict
 from datetime import datetime
 import aiofiles
 import math
 import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import numpy as np
 from pydantic import BaseModel, validator, Field
 import logging
 import threading
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from utils.tokenizer import Tokenizer
+from utils.lexicon_loader import Lexicon, open_lexicon, additions_path
 from utils.file_io import read_json, write_json, read_csv, write_csv
+from utils.append_log import (
+    AppendLog,
+    read_with_delta,
+    batch_exists,
+    list_batches,
+    delta_path,
+)
+from utils.id_allocator import BlockIdAllocator
+from utils.batch_cache import CursorCache, ShardCache
+from utils.postings import (
+    Matches,
+    ImpactList,
+    score_at_a_time,
+    iter_matches,
+    posting_list,
+    entry_docs,
+    docs_entry,
+    at_least,
+    intersect,
+    find,
+    phrase_gap,
+    mask_fields,
+    mask_weight_table,
+    FIELDS,
+    FIELD_BITS,
+    FIELD_POSITION_GAP,
+    positions_path,
+)
+from utils.impacts import load_impact_model, reimpact_index
+from utils.hotel_rollup import ROLLUP_DOC_TYPE, rollup_add, rollup_weights, write_hotel_rollup
+from utils.query_parser import parse_query
+from utils.scoring import (
+    SCORE_FIELDS,
+    Ranking,
+    ScoringPool,
+    hydrate,
+    rank_documents,
+)
+from utils.deadline import DEADLINE_CHECK_ROWS, Deadline
+from utils.responses import FastJSONResponse, dumps, etag_matches, make_etag, not_modified
+from utils.generation import Generation, generation_path
+from utils.admission import AdmissionController, Overloaded
+from utils.suggest import (
+    SuggestIndex,
+    TOP_K as SUGGEST_TOP_K,
+    suggest_base,
+    suggest_is_current,
+    build_suggest_files,
+)
+from utils.symspell import SymSpellIndex, symspell_path, symspell_is_current, build_symspell_file
+from utils.snapshot import (
+    Snapshot,
+    SnapshotError,
+    PackedIntMap,
+    stamp_files,
+    write_snapshot,
+    json_section,
+    pickle_section,
+    int_map_sections,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Shards read during the current /search/batch, path -> read in progress,
+# so each shard is read once however many of its queries need it
+batch_shards: ContextVar[Optional[Dict]] = ContextVar("batch_shards", default=None)
+
 ########################################
 # Sentiment Analyzer Initialization
 ########################################
@@ -40,18 +109,6 @@ def analyze_sentiment(text: str) -> float:
     return sentiment["compound"]
 
 
-def clean_float_values(obj):
-    if isinstance(obj, dict):
-        return {k: clean_float_values(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_float_values(x) for x in obj]
-    elif isinstance(obj, float):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return obj
-    return obj
-
-
 ########################################
 # Configuration
 ########################################
@@ -64,15 +121,90 @@ class Config:
     HOTELS_PATH = f"{DATA_DIR}/hotels_cleaned.csv"
     LEXICON_PATH = f"{INDEX_DIR}/lexicon/lexicon.json"
     SENTIMENT_PATH = f"{INDEX_DIR}/doc_sentiment.json"
+    # Written by `python app.py snapshot`, used at startup while current
+    SNAPSHOT_PATH = f"{INDEX_DIR}/engine.snapshot"
 
     INVERTED_BATCH_SIZE = 20000
     FORWARD_BATCH_SIZE = 20000
     REVIEW_BATCH_SIZE = 1000
+    REV_ID_BLOCK_SIZE = 10000
+
+    # Bulk uploads are parsed and indexed this many rows at a time
+    UPLOAD_CHUNK_ROWS = 5000
+    UPLOAD_INDEX_CHUNKS_IN_FLIGHT = 2
 
+    # Append-only ingestion: a batch's delta log is folded back into its CSV
+    # once it holds this many rows, or after this many idle seconds.
+    DELTA_COMPACT_ROWS = 5000
+    DELTA_COMPACT_INTERVAL = 30.0
+
+    # Results per /search page. The top MAX_RESULTS of a search are kept
+    # for SEARCH_CURSOR_TTL seconds so later pages only hydrate their slice.
+    SEARCH_PAGE_SIZE = 50
     MAX_RESULTS = 500
+    SEARCH_CURSOR_CACHE_SIZE = 1024
+    SEARCH_CURSOR_TTL = 300.0
+    # Queries per /search/batch request
+    MAX_BATCH_QUERIES = 64
+    # Parsed review batches a /search/stream keeps between its blocks
+    STREAM_REVIEW_BATCHES = 4
+
+    # Cache-Control of GET responses by endpoint. Their strong ETags change
+    # with the index generation, which indexing and uploads bump, so with
+    # "no-cache" clients and proxies revalidate and get 304s until then.
+    CACHE_CONTROL = {
+        "search": "public, no-cache",
+        "hotel": "public, no-cache",
+    }
+
+    # Time budget of a /search, overridable per request with timeout_ms up
+    # to MAX_SEARCH_TIMEOUT_MS. Past it, posting traversal and scoring stop
+    # and the best results so far are returned marked "partial": true.
+    SEARCH_TIMEOUT_MS = 2000
+    MAX_SEARCH_TIMEOUT_MS = 30000
+    # How often a running /search checks whether its client disconnected
+    DISCONNECT_POLL_INTERVAL = 0.1
+
+    # Admission control, per server worker: at most SEARCH_MAX_IN_FLIGHT
+    # searches run and SEARCH_MAX_QUEUE wait. A waiter is shed with a 503
+    # after SEARCH_QUEUE_INTERVAL_MS, or after SEARCH_QUEUE_TARGET_MS once
+    # the queue has not drained for a whole interval (CoDel).
+    SEARCH_MAX_IN_FLIGHT = 8
+    SEARCH_MAX_QUEUE = 64
+    SEARCH_QUEUE_TARGET_MS = 5
+    SEARCH_QUEUE_INTERVAL_MS = 100
+    SEARCH_RETRY_AFTER_S = 1
+
+    # Filtering and scoring run off the event loop on a "thread" or
+    # "process" executor with SCORING_WORKERS workers. At most
+    # SCORING_CONCURRENCY searches per server worker score at once.
+    SCORING_EXECUTOR = "thread"
+    SCORING_WORKERS = 4
+    SCORING_CONCURRENCY = 4
+
+    # Query tokens missing from the lexicon are mapped to the closest known
+    # term: at most one edit per 3 characters, capped at this distance.
+    SPELL_MAX_DISTANCE = 2
+
+    # Parsed inverted index shards kept in memory per worker
+    SHARD_CACHE_SIZE = 64
+    # Run once at startup to pull hot shards into the cache
+    WARMUP_QUERIES = ["hotel", "room", "staff", "clean", "location", "breakfast"]
     MAX_DOCS_TO_PROCESS = 1000000
 
+    # "exact" recomputes each posting's field, frequency and length scoring
+    # per query; "impact" sums the quantized impacts stored in the shards
+    # (`python app.py reimpact` writes them) and falls back to exact if they
+    # were built with different SCORING_PARAMS.
+    SCORING_MODE = "exact"
+    # In impact mode, plain OR queries are evaluated score-at-a-time over
+    # impact-ordered postings: evaluation stops once the top MAX_RESULTS
+    # are settled, or after this many postings (approximate results).
+    IMPACT_ORDERED_EVALUATION = True
+    IMPACT_POSTINGS_BUDGET = 2000000
+
     SCORING_PARAMS = {
+        # Keys are the field registry in utils/postings.py (FIELDS)
         "field_weights": {
             "name": 4.0,
             "region": 2.0,
@@ -86,6 +218,7 @@ class Config:
         "multi_token_bonus": 0.2,  # small bonus per distinct token matched
         "field_weight_bonus": 1.0,  # how much to multiply field weights
         "length_norm_factor": 0.05,  # small factor to reduce huge freq blowups
+        "phrase_boost": 1.0,  # per matched phrase, divided by 1 + extra positions
         # For sentiment adjustments
         "negative_sentiment_weight": 2.0,  # Weight multiplier if query sentiment is negative
         "positive_sentiment_weight": 1.5,  # Weight multiplier if query sentiment is positive
@@ -160,6 +293,31 @@ class HotelCreate(BaseModel):
         return v
 
 
+class SearchQuery(BaseModel):
+    """One query of a /search/batch; the parameters of /search."""
+
+    query: str
+    doc_type: str = "all"
+    location: Optional[str] = None
+    hotel_class: Optional[int] = None
+    mode: str = "or"
+    min_should_match: Optional[int] = Field(None, ge=1)
+    limit: int = Field(Config.SEARCH_PAGE_SIZE, ge=1, le=Config.MAX_RESULTS)
+    fields: Optional[str] = None
+    ids_only: bool = False
+
+    @validator("mode")
+    def validate_mode(cls, v):
+        if v not in ("and", "or"):
+            raise ValueError("mode must be 'and' or 'or'")
+        return v
+
+
+class SearchBatch(BaseModel):
+    queries: List[SearchQuery] = Field(..., min_length=1, max_length=Config.MAX_BATCH_QUERIES)
+    timeout_ms: Optional[int] = Field(None, ge=1, le=Config.MAX_SEARCH_TIMEOUT_MS)
+
+
 ########################################
 # Cache Implementation
 ########################################
@@ -202,15 +360,42 @@ class Cache:
 ########################################
 class SearchEngine:
     def __init__(self):
-        self.tokenizer = Tokenizer()
+        # Everything heavy is loaded by start(), see the lifespan handler
+        self.tokenizer = None
         self.lexicon = {}
         self.hotels_df = pd.DataFrame()
         self.reviews_df = pd.DataFrame()
         self.document_cache = Cache()
+        self.shard_cache = ShardCache(Config.SHARD_CACHE_SIZE)
+        # Summed field weight per field bitmask
+        self.mask_weights = mask_weight_table(Config.SCORING_PARAMS["field_weights"])
+        # Positions streams, only read for phrase and proximity queries
+        self.positions_cache = ShardCache(Config.SHARD_CACHE_SIZE)
         self.config = Config
 
-        self.current_rev_id = 0
-        self.rev_id_lock = threading.Lock()
+        # name -> {"status", "seconds"[, "error"]}, reported by /ready
+        self.components = {}
+        self.loaded = False  # core data is in memory, requests can be served
+        self.warmed = False  # background warm-up has finished
+        self.append_log = AppendLog(
+            Config.DELTA_COMPACT_ROWS,
+            Config.DELTA_COMPACT_INTERVAL,
+            keys={Config.HOTELS_PATH: "hotel_id", Config.REVIEWS_DIR: "rev_id"},
+        )
+
+        # Hotels created since hotels_df was last materialized
+        self.pending_hotels = []
+        self.hotels_lock = threading.Lock()
+        self.next_hotel_id = 1
+
+        # Background indexing of uploaded chunks
+        self.indexing_slots = asyncio.Semaphore(Config.UPLOAD_INDEX_CHUNKS_IN_FLIGHT)
+        self.indexing_tasks = set()
+        # Shard, lexicon and sentiment updates are read-modify-write of
+        # shared files; one document is indexed at a time
+        self.index_lock = threading.Lock()
+
+        self.rev_ids = None
         self.rev_id_file = os.path.join(Config.DATA_DIR, "current_rev_id.json")
 
         # rev_id -> hotel_id
@@ -219,79 +404,329 @@ class SearchEngine:
         # doc_id -> sentiment score
         self.doc_sentiment = {}
 
-        self._load_data()
+        # Inverted index shard files known to exist
+        self.shard_paths = set()
+        self.snapshot = None
+
+        # Prefix -> top-k completions for /suggest
+        self.suggester = None
+        # Spelling correction for out-of-vocabulary query tokens
+        self.speller = None
+        # Set when scoring by precomputed impacts
+        self.impacts = None
+        self.admission = AdmissionController(
+            Config.SEARCH_MAX_IN_FLIGHT,
+            Config.SEARCH_MAX_QUEUE,
+            Config.SEARCH_QUEUE_TARGET_MS / 1000,
+            Config.SEARCH_QUEUE_INTERVAL_MS / 1000,
+            Config.SEARCH_RETRY_AFTER_S,
+        )
+        self.cursors = CursorCache(Config.SEARCH_CURSOR_CACHE_SIZE, Config.SEARCH_CURSOR_TTL)
+        # Bumped whenever indexed data changes; response ETags derive from
+        # it. Persisted with the index, so all workers and restarts share it.
+        self.generation = Generation(generation_path(Config.INVERTED_INDEX_PATH))
+        self.scoring = ScoringPool(
+            Config.SCORING_EXECUTOR, Config.SCORING_WORKERS, Config.SCORING_CONCURRENCY
+        )
+
+    ##########################################################
+    # Startup
+    ##########################################################
+    async def start(self):
+        """
+        Load the independent components concurrently, then warm the reviews
+        frame and hot shards in the background. Progress is in self.components.
+        """
+        self.append_log.start()
+        started = time.perf_counter()
+        loaded = await asyncio.gather(
+            self._load_component("tokenizer", self._load_tokenizer),
+            self._load_data_components(),
+        )
+        self.loaded = all(loaded)
+        if not self.loaded:
+            logger.error("Search engine failed to load; see /ready for details.")
+            return
+        logger.info(f"Search engine loaded in {time.perf_counter() - started:.2f}s.")
+
+        # Before warm-up, so every query is scored the same way
+        if Config.SCORING_MODE == "impact":
+            await self._load_component("impacts", self._load_impacts)
+
+        await asyncio.gather(
+            self._load_component("reviews", self.get_reviews_df),
+            self._load_component("hot_shards", self._warm_shards),
+            self._load_component("suggest", self._load_suggest),
+            self._load_component("speller", self._load_speller),
+        )
+        self.warmed = True
+        logger.info(f"Search engine warmed in {time.perf_counter() - started:.2f}s.")
+
+    async def _load_data_components(self) -> bool:
+        """From the binary snapshot when it is current, else from the source files."""
+        if os.path.exists(Config.SNAPSHOT_PATH):
+            if await self._load_component("snapshot", self._load_snapshot):
+                return await self._load_component("rev_ids", self._initialize_rev_id)
+            logger.warning("Snapshot unusable, loading from source files.")
+        loaded = await asyncio.gather(
+            self._load_component("lexicon", self._load_lexicon),
+            self._load_component("hotels", self._load_hotels),
+            self._load_component("reviews_map", self._load_reviews_map),
+            self._load_component("sentiment", self._load_sentiment_scores),
+            self._load_component("shards", self._scan_shards),
+        )
+        return all(loaded)
+
+    async def _load_component(self, name: str, fn) -> bool:
+        status = self.components[name] = {"status": "loading", "seconds": None}
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                await fn()
+            else:
+                await run_in_threadpool(fn)
+            status["status"] = "ready"
+            return True
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+            logger.error(f"Loading {name} failed: {e}", exc_info=True)
+            return False
+        finally:
+            status["seconds"] = round(time.perf_counter() - started, 3)
+
+    def _load_tokenizer(self):
+        self.tokenizer = Tokenizer()
+
+    def _load_lexicon(self):
+        self.lexicon = open_lexicon(Config.LEXICON_PATH)
+        logger.debug(f"Loaded lexicon with {len(self.lexicon)} entries.")
+
+    def _load_suggest(self):
+        """
+        Open the completion lists written by the index build, rebuilding them
+        from the inverted shards if they are missing or older than the lexicon.
+        """
+        if suggest_is_current(Config.LEXICON_PATH):
+            self.suggester = SuggestIndex.open(suggest_base(Config.LEXICON_PATH))
+        else:
+            logger.warning("Completion lists missing or stale; rebuilding them.")
+            self.suggester = build_suggest_files(
+                self.lexicon, Config.LEXICON_PATH, Config.INVERTED_INDEX_PATH
+            )
+        logger.debug(f"Loaded completion lists for {len(self.suggester.lists)} prefixes.")
+
+    def _load_speller(self):
+        """
+        Open the delete index written with the lexicon, or build it from the
+        loaded lexicon if it is missing or stale. Terms added since the
+        lexicon was compiled go to the in-memory overlay.
+        """
+        if symspell_is_current(Config.LEXICON_PATH):
+            speller = SymSpellIndex.open(symspell_path(Config.LEXICON_PATH))
+            for term, word_id in list(self.lexicon.added.items()):
+                speller.add(term, word_id)
+        else:
+            logger.warning("Spelling index missing or stale; rebuilding it.")
+            speller = build_symspell_file(self.lexicon, Config.LEXICON_PATH)
+        self.speller = speller
+
+    def _load_impacts(self):
+        """
+        Read the impact scale of the index. If the impacts are missing or
+        were built with other scoring params, this fails and queries are
+        scored exactly.
+        """
+        self.impacts = None
+        self.impacts = load_impact_model(
+            Config.INVERTED_INDEX_PATH, Config.SCORING_PARAMS, self.mask_weights, FIELDS
+        )
+        logger.debug(f"Scoring by impacts with scale {self.impacts.scale}.")
+
+    def _correct_token(self, token: str) -> Optional[str]:
+        """Closest lexicon term to an out-of-vocabulary token, if any."""
+        if self.speller is None or token.isdigit():
+            return None
+        max_distance = min(Config.SPELL_MAX_DISTANCE, len(token) // 3)
+        frequency = self.suggester.doc_frequency if self.suggester is not None else None
+        matches = self.speller.lookup(self.lexicon, token, max_distance, frequency)
+        return matches[0][0] if matches else None
+
+    def _load_reviews_map(self):
         self._initialize_rev_id()
         self._rebuild_rev_to_hotel_from_disk()
-        self._load_sentiment_scores()
 
-    def _load_data(self):
-        self.lexicon = read_json(Config.LEXICON_PATH)
-        self.hotels_df = read_csv(Config.HOTELS_PATH)
-        logger.debug(f"Loaded lexicon with {len(self.lexicon)} entries.")
-        logger.debug(f"Loaded hotels data with {len(self.hotels_df)} entries.")
+    def _scan_shards(self):
+        paths = set()
+        for doc_type in ("hotels", "reviews", ROLLUP_DOC_TYPE):
+            shard_dir = f"{Config.INVERTED_INDEX_PATH}/{doc_type}"
+            if os.path.isdir(shard_dir):
+                paths.update(
+                    f"{shard_dir}/{fn}"
+                    for fn in os.listdir(shard_dir)
+                    if fn.startswith("inverted_index_") and fn.endswith(".json")
+                )
+        self.shard_paths = paths
+
+    def _shard_exists(self, path: str) -> bool:
+        if path in self.shard_paths:
+            return True
+        if os.path.exists(path):
+            self.shard_paths.add(path)
+            return True
+        return False
+
+    ##########################################################
+    # Binary snapshot
+    ##########################################################
+    def _snapshot_sources(self) -> List[str]:
+        """Files a snapshot is derived from; any change makes it stale."""
+        paths = [
+            Config.LEXICON_PATH,
+            Config.HOTELS_PATH,
+            delta_path(Config.HOTELS_PATH),
+            Config.SENTIMENT_PATH,
+        ]
+        for batch in list_batches(Config.REVIEWS_DIR, "reviews_"):
+            paths += [batch, delta_path(batch)]
+        return paths
+
+    def write_snapshot(self, path: str = Config.SNAPSHOT_PATH):
+        """
+        Serialize lexicon, hotels, rev_id -> hotel_id, sentiment scores and
+        the shard directory into one binary file.
+        """
+        trie_bytes, id_bytes = self.lexicon.to_bytes()
+        sections = {
+            "manifest": json_section(
+                {
+                    "created": datetime.now().isoformat(),
+                    "sources": stamp_files(self._snapshot_sources()),
+                }
+            ),
+            "lexicon.trie": trie_bytes,
+            "lexicon.ids": id_bytes,
+            "hotels": pickle_section(self.get_hotels_df()),
+            **int_map_sections("rev_to_hotel", self.rev_to_hotel.items(), np.int64),
+            **int_map_sections(
+                "sentiment",
+                ((k, v) for k, v in self.doc_sentiment.items() if str(k).isdigit()),
+                np.float64,
+            ),
+            "shards": json_section(sorted(self.shard_paths)),
+        }
+        write_snapshot(path, sections)
+        logger.info(f"Wrote engine snapshot to {path}.")
+
+    def _load_snapshot(self):
+        snapshot = Snapshot(Config.SNAPSHOT_PATH)
+        manifest = snapshot.json("manifest")
+        if stamp_files(self._snapshot_sources()) != manifest["sources"]:
+            raise SnapshotError(
+                "Snapshot is stale; re-run `python app.py snapshot`"
+            )
+
+        self.lexicon = Lexicon.from_bytes(
+            snapshot.bytes("lexicon.trie"), snapshot.array("lexicon.ids", np.int64)
+        )
+        self.lexicon.load_additions(additions_path(Config.LEXICON_PATH))
+        self._set_hotels(snapshot.pickle("hotels"))
+        self.rev_to_hotel = PackedIntMap.from_snapshot(snapshot, "rev_to_hotel", np.int64)
+        self.doc_sentiment = PackedIntMap.from_snapshot(
+            snapshot, "sentiment", np.float64, key_type=str
+        )
+        self.shard_paths = set(snapshot.json("shards"))
+        self.snapshot = snapshot
+        logger.debug(f"Loaded engine snapshot created {manifest['created']}.")
+
+    async def _warm_shards(self):
+        for query in Config.WARMUP_QUERIES:
+            await self.search(query, "all")
+
+    def bump_generation(self):
+        """Mark the indexed data changed, so earlier ETags no longer match."""
+        self.generation.bump()
+
+    def etag(self, *parts) -> str:
+        """Strong ETag of a response identified by parts, at the current generation."""
+        return make_etag(self.generation.current(), *parts)
+
+    def status(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "ready": self.warmed,
+            "components": self.components,
+        }
 
     def reload_data(self):
-        self.lexicon = read_json(Config.LEXICON_PATH)
-        self.hotels_df = read_csv(Config.HOTELS_PATH)
+        """
+        Full re-read of lexicon, hotels and reviews from disk.
+        Only for explicit admin reloads; ingestion updates the in-memory
+        stores incrementally.
+        """
+        self.lexicon = open_lexicon(Config.LEXICON_PATH)
+        self._load_hotels()
         self.reviews_df = self._load_reviews()
+        self._load_suggest()
+        self._load_speller()
+        if Config.SCORING_MODE == "impact":
+            try:
+                self._load_impacts()
+            except ValueError as e:
+                logger.warning(f"Scoring exactly: {e}")
         logger.debug("Reloaded data for search engine.")
 
+    def _load_hotels(self):
+        self._set_hotels(read_with_delta(Config.HOTELS_PATH, "hotel_id"))
+
+    def _set_hotels(self, hotels_df: pd.DataFrame):
+        with self.hotels_lock:
+            self.hotels_df = hotels_df
+            self.pending_hotels = []
+            if not hotels_df.empty and "hotel_id" in hotels_df.columns:
+                self.next_hotel_id = int(hotels_df["hotel_id"].max()) + 1
+            else:
+                self.next_hotel_id = 1
+
     def _initialize_rev_id(self):
-        if os.path.exists(self.rev_id_file):
-            with open(self.rev_id_file, "r") as f:
-                data = json.load(f)
-                self.current_rev_id = int(
-                    data.get("current_rev_id", self._find_max_rev_id())
-                )
-                logger.debug(
-                    f"Initialized current_rev_id from file: {self.current_rev_id}"
-                )
-        else:
-            self.current_rev_id = self._find_max_rev_id()
-            self._persist_rev_id()
-            logger.debug(
-                f"Initialized current_rev_id by finding max rev_id: {self.current_rev_id}"
-            )
+        # current_rev_id.json holds the end of the reserved block; the max
+        # rev_id scan only runs when the file is missing.
+        self.rev_ids = BlockIdAllocator(
+            self.rev_id_file,
+            block_size=Config.REV_ID_BLOCK_SIZE,
+            floor=self._find_max_rev_id,
+        )
+        logger.debug(f"Initialized rev_id allocator at {self.rev_ids.high_water}")
 
     def _find_max_rev_id(self) -> int:
         max_rev_id = 0
         try:
-            for file in os.listdir(Config.REVIEWS_DIR):
-                if file.startswith("reviews_") and file.endswith(".csv"):
-                    path = os.path.join(Config.REVIEWS_DIR, file)
-                    df = read_csv(path)
-                    if "rev_id" in df.columns and not df.empty:
-                        cur = df["rev_id"].max()
-                        if cur > max_rev_id:
-                            max_rev_id = cur
+            for path in list_batches(Config.REVIEWS_DIR, "reviews_"):
+                df = read_with_delta(path, "rev_id")
+                if "rev_id" in df.columns and not df.empty:
+                    cur = df["rev_id"].max()
+                    if cur > max_rev_id:
+                        max_rev_id = cur
             logger.debug(f"Found max rev_id: {max_rev_id}")
             return int(max_rev_id)
         except Exception as e:
             logger.error(f"Error finding max rev_id: {e}", exc_info=True)
             return 0
 
-    def _persist_rev_id(self):
-        with open(self.rev_id_file, "w") as f:
-            json.dump({"current_rev_id": int(self.current_rev_id)}, f)
-            logger.debug(f"Persisted current_rev_id: {self.current_rev_id}")
-
     def _get_next_rev_id(self) -> int:
-        with self.rev_id_lock:
-            self.current_rev_id += 1
-            self._persist_rev_id()
-            logger.debug(f"Generated new rev_id: {self.current_rev_id}")
-            return self.current_rev_id
+        rev_id = self.rev_ids.next_id()
+        logger.debug(f"Generated new rev_id: {rev_id}")
+        return rev_id
 
     def _rebuild_rev_to_hotel_from_disk(self):
         self.rev_to_hotel.clear()
-        for fn in os.listdir(Config.REVIEWS_DIR):
-            if fn.startswith("reviews_") and fn.endswith(".csv"):
-                df = read_csv(os.path.join(Config.REVIEWS_DIR, fn))
-                if "rev_id" in df.columns and "hotel_id" in df.columns:
-                    for _, row_data in df.iterrows():
-                        self.rev_to_hotel[int(row_data["rev_id"])] = int(
-                            row_data["hotel_id"]
-                        )
+        for path in list_batches(Config.REVIEWS_DIR, "reviews_"):
+            df = read_with_delta(path, "rev_id")
+            if "rev_id" in df.columns and "hotel_id" in df.columns:
+                for _, row_data in df.iterrows():
+                    self.rev_to_hotel[int(row_data["rev_id"])] = int(
+                        row_data["hotel_id"]
+                    )
         logger.debug(
             f"Rebuilt rev_to_hotel mapping with {len(self.rev_to_hotel)} entries."
         )
@@ -304,18 +739,44 @@ class SearchEngine:
         return f"{Config.REVIEWS_DIR}/reviews_{start}-{end}.csv"
 
     def get_hotels_df(self):
-        if self.hotels_df.empty:
-            self.hotels_df = read_csv(Config.HOTELS_PATH)
+        if self.hotels_df.empty and not self.pending_hotels:
+            self._load_hotels()
             logger.debug(f"Loaded hotels data with {len(self.hotels_df)} entries.")
+        if self.pending_hotels:
+            # Fold hotels created since the last read in with a single concat
+            with self.hotels_lock:
+                if self.pending_hotels:
+                    self.hotels_df = pd.concat(
+                        [self.hotels_df, pd.DataFrame(self.pending_hotels)],
+                        ignore_index=True,
+                    )
+                    self.pending_hotels = []
         return self.hotels_df
 
+    async def add_hotels(self, rows: List[Dict]) -> List[int]:
+        """
+        Assign hotel IDs, persist the rows to the hotels append log and make
+        them visible to searches. Nothing is rewritten or reloaded.
+        """
+        if self.hotels_df.empty and not self.pending_hotels:
+            self._load_hotels()
+        with self.hotels_lock:
+            start_id = self.next_hotel_id
+            self.next_hotel_id += len(rows)
+        for offset, row in enumerate(rows):
+            row["hotel_id"] = start_id + offset
+
+        await self.append_log.append_async(Config.HOTELS_PATH, rows, "hotel_id")
+        with self.hotels_lock:
+            self.pending_hotels.extend(rows)
+        return [row["hotel_id"] for row in rows]
+
     def _load_reviews(self):
         revs = []
-        for f in os.listdir(Config.REVIEWS_DIR):
-            if f.endswith(".csv"):
-                df = read_csv(os.path.join(Config.REVIEWS_DIR, f))
-                if not df.empty:
-                    revs.append(df)
+        for path in list_batches(Config.REVIEWS_DIR, "reviews_"):
+            df = read_with_delta(path, "rev_id")
+            if not df.empty:
+                revs.append(df)
         if revs:
             combined = pd.concat(revs, ignore_index=True)
             logger.debug(f"Loaded reviews data with {len(combined)} entries.")
@@ -335,7 +796,7 @@ class SearchEngine:
         """
         if os.path.exists(Config.SENTIMENT_PATH):
             try:
-                with open(Config.SENTIMENT_PATH, "r") as f:
+                with open(Config.SENTIMENT_PATH, "r", encoding="utf-8-sig") as f:
                     self.doc_sentiment = json.load(f)
                 logger.debug(
                     f"Loaded sentiment scores with {len(self.doc_sentiment)} entries."
@@ -352,7 +813,7 @@ class SearchEngine:
         Save the sentiment scores to the sentiment JSON file.
         """
         try:
-            write_json(Config.SENTIMENT_PATH, self.doc_sentiment)
+            write_json(Config.SENTIMENT_PATH, dict(self.doc_sentiment.items()))
             logger.debug(f"Saved sentiment scores to {Config.SENTIMENT_PATH}.")
         except Exception as e:
             logger.error(f"Error saving sentiment scores: {e}", exc_info=True)
@@ -360,28 +821,55 @@ class SearchEngine:
     ##########################################################
     # Main search with Sentiment and Filter Adjustments
     ##########################################################
-    async def search(
-        self,
-        query: str,
-        doc_type: str,
-        location: Optional[str] = None,
-        hotel_class: Optional[int] = None,
-    ) -> Dict:
-        logger.info(
-            f"search(query='{query}', doc_type='{doc_type}', location='{location}', hotel_class='{hotel_class}') called."
-        )
-        from fastapi.concurrency import run_in_threadpool
-
-        # 1) Basic tokenization
+    async def _analyze_query(self, query: str) -> Optional[Dict]:
+        """
+        Tokens, spelling corrections, sentiment and word ids of query:
+        base_tokens, corrections, query_sentiment, word_ids, required (the
+        word ids mode=and and min_should_match count) and phrase_ids.
+        word_ids is empty when nothing can match. None if the query has no
+        tokens.
+        """
+        return (await self._analyze_queries([query]))[0]
+
+    async def _analyze_queries(self, queries: List[str]) -> List[Optional[Dict]]:
+        """_analyze_query of each query, tokenized by spaCy in one pass."""
+        # 1) Basic tokenization; quoted phrases are matched separately below
+        parsed = [parse_query(query) for query in queries]
+        texts = []
+        for query, phrases in parsed:
+            texts.append(query.lower())
+            texts += [ph.text.lower() for ph in phrases]
+        tokenized = iter(await run_in_threadpool(self.tokenizer.tokenize_many, texts))
+        analyzed = []
+        for query, phrases in parsed:
+            spacy_tokens = next(tokenized)
+            phrase_tokens = [next(tokenized) for _ in phrases]
+            analyzed.append(self._analyze_tokens(query, phrases, spacy_tokens, phrase_tokens))
+        return analyzed
+
+    def _analyze_tokens(
+        self, query: str, phrases: List, spacy_tokens: List[str], phrase_tokens: List[List[str]]
+    ) -> Optional[Dict]:
         original_words = [w for w in query.lower().split() if w]
-        spacy_tokens = await run_in_threadpool(
-            self.tokenizer.tokenize_with_spacy, query.lower()
-        )
         base_tokens = list(set(original_words + spacy_tokens))
         logger.debug(f"Tokenized query: {base_tokens}")
         if not base_tokens:
             logger.debug("No tokens extracted from query.")
-            return {"results": [], "count": 0, "total_matches": 0}
+            return None
+
+        # Correct misspelled terms. Only spaCy tokens are corrected; the raw
+        # words include stopwords, which are never in the lexicon.
+        corrections = {}
+        for token in set(spacy_tokens).union(*phrase_tokens):
+            if token not in self.lexicon:
+                corrected = self._correct_token(token)
+                if corrected is not None:
+                    corrections[token] = corrected
+                    logger.debug(f"Corrected token '{token}' to '{corrected}'.")
+        if corrections:
+            base_tokens = list(
+                dict.fromkeys(corrections.get(t, t) for t in base_tokens)
+            )
 
         # 2) Compute sentiment of the query
         query_text = " ".join(base_tokens)
@@ -398,555 +886,1107 @@ class SearchEngine:
                 logger.debug(f"Token '{token}' not found in lexicon.")
         if not word_ids:
             logger.debug("No word IDs found for tokens.")
+
+        # A phrase with a term outside the lexicon cannot match anything
+        phrase_ids = []
+        for ph, tokens in zip(phrases, phrase_tokens):
+            tokens = [corrections.get(t, t) for t in tokens]
+            if not all(t in self.lexicon for t in tokens):
+                logger.debug(f"Phrase '{ph.text}' has unknown terms.")
+                word_ids = []
+                break
+            if tokens:
+                phrase_ids.append(([self.lexicon[t] for t in tokens], ph.slop))
+
+        # The terms mode=and and min_should_match require are the spaCy
+        # tokens; raw words that differ from them (e.g. unlemmatized verbs)
+        # only add to the score.
+        required = list(
+            dict.fromkeys(
+                self.lexicon[t]
+                for t in (corrections.get(t, t) for t in spacy_tokens)
+                if t in self.lexicon
+            )
+        ) or list(dict.fromkeys(word_ids))
+        return {
+            "base_tokens": base_tokens,
+            "corrections": corrections,
+            "query_sentiment": query_sentiment,
+            "word_ids": word_ids,
+            "required": required,
+            "phrase_ids": phrase_ids,
+        }
+
+    async def search(
+        self,
+        query: str,
+        doc_type: str,
+        location: Optional[str] = None,
+        hotel_class: Optional[int] = None,
+        mode: str = "or",
+        min_should_match: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        limit: Optional[int] = None,
+        fields: Optional[Collection[str]] = None,
+        analyzed: Optional[Dict] = None,
+        cursor_key: Optional[str] = None,
+    ) -> Dict:
+        """
+        The first `limit` results; later pages come from search_page with
+        the response's next_cursor, which starts with cursor_key if given.
+        fields projects the results, see _results_page. Without a deadline
+        the search runs to completion; with one, the response's "partial"
+        says whether it expired first. analyzed is the query's
+        _analyze_query, if already done.
+        """
+        deadline = deadline or Deadline()
+        limit = limit or self.config.SEARCH_PAGE_SIZE
+        logger.info(
+            f"search(query='{query}', doc_type='{doc_type}', location='{location}', hotel_class='{hotel_class}', mode='{mode}', min_should_match={min_should_match}) called."
+        )
+        if analyzed is None:
+            analyzed = await self._analyze_query(query)
+        if analyzed is None:
             return {"results": [], "count": 0, "total_matches": 0}
+        corrections = analyzed["corrections"]
+        if not analyzed["word_ids"]:
+            return {"results": [], "count": 0, "total_matches": 0, "corrections": corrections}
+        base_tokens = analyzed["base_tokens"]
+        query_sentiment = analyzed["query_sentiment"]
+        word_ids = analyzed["word_ids"]
+        phrase_ids = analyzed["phrase_ids"]
 
-        # 4) Union-based search in hotels and reviews
-        matched_hotels = await self._search_union(word_ids, "hotels")
-        matched_reviews = await self._search_union(word_ids, "reviews")
+        hotel_passes = await run_in_threadpool(self._hotel_filter, location, hotel_class)
 
-        # 5) Apply Filters: Location and Hotel Class
-        if location:
-            # Normalize location string for case-insensitive matching
-            location_normalized = location.strip().lower()
-            # Filter matched_hotels with partial matching
-            filtered_matched_hotels = {}
-            for h_id, info in matched_hotels.items():
-                hotel_row = self.hotels_df[self.hotels_df["hotel_id"] == int(h_id)]
-                if hotel_row.empty:
-                    continue
-                hotel_locality = str(hotel_row.iloc[0]["locality"]).strip().lower()
-                if location_normalized not in hotel_locality:
-                    continue
-                if hotel_class is not None:
-                    hotel_class_value = hotel_row.iloc[0]["hotel_class"]
-                    if hotel_class_value != hotel_class:
-                        continue
-                filtered_matched_hotels[h_id] = info
-            matched_hotels = filtered_matched_hotels
-            logger.debug(
-                f"After location and hotel_class filtering, matched_hotels count: {len(matched_hotels)}"
+        # Broad OR queries stop reading postings once the top results are known
+        if (
+            self.impacts is not None
+            and self.config.IMPACT_ORDERED_EVALUATION
+            and mode == "or"
+            and not min_should_match
+            and not phrase_ids
+        ):
+            matched, total = await self._search_impact_ordered(
+                word_ids, doc_type, hotel_passes, deadline
             )
-
-            # Filter matched_reviews based on associated hotel's location and hotel_class
-            filtered_matched_reviews = {}
-            for rev_id_str, info in matched_reviews.items():
-                try:
-                    rev_id_int = int(rev_id_str)
-                except ValueError:
-                    logger.debug(f"Invalid review ID: {rev_id_str}")
-                    continue
-                if rev_id_int not in self.rev_to_hotel:
-                    logger.debug(f"Review ID {rev_id_int} not mapped to any hotel.")
-                    continue
-                h_id = self.rev_to_hotel[rev_id_int]
-                hotel_row = self.hotels_df[self.hotels_df["hotel_id"] == h_id]
-                if hotel_row.empty:
-                    continue
-                hotel_locality = str(hotel_row.iloc[0]["locality"]).strip().lower()
-                if location_normalized not in hotel_locality:
-                    continue
-                if hotel_class is not None:
-                    hotel_class_value = hotel_row.iloc[0]["hotel_class"]
-                    if hotel_class_value != hotel_class:
-                        continue
-                filtered_matched_reviews[rev_id_str] = info
-            matched_reviews = filtered_matched_reviews
-            logger.debug(
-                f"After location and hotel_class filtering, matched_reviews count: {len(matched_reviews)}"
+            return await self._ranked_results(
+                doc_type,
+                matched,
+                base_tokens,
+                query_sentiment,
+                corrections,
+                deadline,
+                limit,
+                total,
+                fields,
+                cursor_key,
             )
 
+        # 4) Union-based search in hotels and reviews, or, for mode=and and
+        # min_should_match, only the docs containing enough query terms
+        hotel_review_matches = None  # review matches keyed by hotel
+        if mode == "and" or min_should_match:
+            required = analyzed["required"]
+            if mode == "and":
+                minimum = len(required)
+            else:
+                minimum = min(min_should_match, len(required))
+            logger.debug(f"Matching at least {minimum} of {len(required)} terms.")
+            matched_hotels, matched_reviews = await asyncio.gather(
+                self._search_matching(required, word_ids, minimum, "hotels", deadline),
+                self._search_matching(required, word_ids, minimum, "reviews", deadline),
+            )
         else:
-            if hotel_class is not None:
-                # If only hotel_class is provided without location
-                filtered_matched_hotels = {}
-                for h_id, info in matched_hotels.items():
-                    hotel_row = self.hotels_df[self.hotels_df["hotel_id"] == int(h_id)]
-                    if hotel_row.empty:
-                        continue
-                    hotel_class_value = hotel_row.iloc[0]["hotel_class"]
-                    if hotel_class_value != hotel_class:
-                        continue
-                    filtered_matched_hotels[h_id] = info
-                matched_hotels = filtered_matched_hotels
-                logger.debug(
-                    f"After hotel_class filtering, matched_hotels count: {len(matched_hotels)}"
+            if doc_type != "reviews" and not phrase_ids:
+                # Reviews only count per hotel here: read the hotel rollup,
+                # O(hotels) postings instead of O(reviews)
+                matched_hotels, hotel_review_matches = await asyncio.gather(
+                    self._search_union(word_ids, "hotels", deadline),
+                    self._search_review_rollup(word_ids, deadline),
+                )
+                matched_reviews = Matches.empty()
+            else:
+                matched_hotels, matched_reviews = await asyncio.gather(
+                    self._search_union(word_ids, "hotels", deadline),
+                    self._search_union(word_ids, "reviews", deadline),
                 )
 
-                # Filter matched_reviews based on associated hotel's hotel_class
-                filtered_matched_reviews = {}
-                for rev_id_str, info in matched_reviews.items():
-                    try:
-                        rev_id_int = int(rev_id_str)
-                    except ValueError:
-                        logger.debug(f"Invalid review ID: {rev_id_str}")
-                        continue
-                    if rev_id_int not in self.rev_to_hotel:
-                        logger.debug(f"Review ID {rev_id_int} not mapped to any hotel.")
-                        continue
-                    h_id = self.rev_to_hotel[rev_id_int]
-                    hotel_row = self.hotels_df[self.hotels_df["hotel_id"] == h_id]
-                    if hotel_row.empty:
-                        continue
-                    hotel_class_value = hotel_row.iloc[0]["hotel_class"]
-                    if hotel_class_value != hotel_class:
-                        continue
-                    filtered_matched_reviews[rev_id_str] = info
-                matched_reviews = filtered_matched_reviews
-                logger.debug(
-                    f"After hotel_class filtering, matched_reviews count: {len(matched_reviews)}"
+        # Phrase and proximity operators filter the matches and boost the
+        # closest ones; positions are only read here
+        if phrase_ids:
+            matched_hotels, matched_reviews = await asyncio.gather(
+                self._match_phrases(matched_hotels, phrase_ids, "hotels", deadline),
+                self._match_phrases(matched_reviews, phrase_ids, "reviews", deadline),
+            )
+
+        # 5) Apply Filters: Location and Hotel Class
+        if hotel_passes is not None:
+            matched_hotels = matched_hotels.select(hotel_passes(matched_hotels.ids))
+            # Reviews are filtered by their hotel's location and hotel_class
+            matched_reviews = matched_reviews.select(
+                hotel_passes(self._review_hotels(matched_reviews.ids))
+            )
+            if hotel_review_matches is not None:
+                hotel_review_matches = hotel_review_matches.select(
+                    hotel_passes(hotel_review_matches.ids)
                 )
+            logger.debug(
+                f"After location and hotel_class filtering: {len(matched_hotels)} hotels, {len(matched_reviews)} reviews"
+            )
 
         if doc_type == "reviews":
-            final_list = self._score_and_fetch_reviews(
-                matched_reviews, base_tokens, query_sentiment
+            return await self._ranked_results(
+                doc_type,
+                matched_reviews,
+                base_tokens,
+                query_sentiment,
+                corrections,
+                deadline,
+                limit,
+                fields=fields,
+                cursor_key=cursor_key,
             )
-            total = len(final_list)
-            final_list = final_list[: self.config.MAX_RESULTS]
-            return {
-                "results": final_list,
-                "count": len(final_list),
-                "total_matches": total,
-            }
         else:
-            # doc_type=all or doc_type=hotels
-            unified_hotels = {}
+            # doc_type=all or doc_type=hotels: review matches count towards
+            # their hotel
+            if hotel_review_matches is None:
+                hotel_review_matches = matched_reviews.rekey(
+                    self._review_hotels(matched_reviews.ids)
+                )
+            unified_hotels = Matches.concat([matched_hotels, hotel_review_matches])
+
+            return await self._ranked_results(
+                doc_type,
+                unified_hotels,
+                base_tokens,
+                query_sentiment,
+                corrections,
+                deadline,
+                limit,
+                fields=fields,
+                cursor_key=cursor_key,
+            )
 
-            for doc_id, info in matched_hotels.items():
-                try:
-                    h_id = int(doc_id)
-                except ValueError:
-                    logger.debug(f"Invalid hotel ID: {doc_id}")
-                    continue
-                if h_id not in unified_hotels:
-                    unified_hotels[h_id] = {
-                        "freq": info["freq"],
-                        "fields": info["fields"][:],
-                    }
-                else:
-                    unified_hotels[h_id]["freq"] += info["freq"]
-                    unified_hotels[h_id]["fields"].extend(info["fields"])
+    def _hotel_filter(self, location: Optional[str], hotel_class: Optional[int]):
+        """
+        hotel ids -> boolean array of the ones passing the location and
+        hotel_class filters (ids < 0 never pass), or None if unfiltered.
+        """
+        if not location and hotel_class is None:
+            return None
+        hotels_df = self.get_hotels_df()
+        keep = np.ones(len(hotels_df), dtype=bool)
+        if location:
+            # Case-insensitive partial matching on locality
+            localities = hotels_df["locality"].astype(str).str.strip().str.lower()
+            keep &= localities.str.contains(location.strip().lower(), regex=False).to_numpy()
+        if hotel_class is not None:
+            keep &= (hotels_df["hotel_class"] == hotel_class).to_numpy()
+        passing = np.unique(hotels_df["hotel_id"].to_numpy()[keep].astype(np.int64))
+        logger.debug(f"{len(passing)} hotels pass the location and hotel_class filters.")
 
-            for rev_id_str, info in matched_reviews.items():
-                try:
-                    rev_id_int = int(rev_id_str)
-                except ValueError:
-                    logger.debug(f"Invalid review ID: {rev_id_str}")
-                    continue
-                if rev_id_int not in self.rev_to_hotel:
-                    logger.debug(f"Review ID {rev_id_int} not mapped to any hotel.")
-                    continue
-                h_id = self.rev_to_hotel[rev_id_int]
-                if h_id not in unified_hotels:
-                    unified_hotels[h_id] = {
-                        "freq": info["freq"],
-                        "fields": info["fields"][:],
-                    }
-                else:
-                    unified_hotels[h_id]["freq"] += info["freq"]
-                    unified_hotels[h_id]["fields"].extend(info["fields"])
+        def hotel_passes(h_ids: np.ndarray) -> np.ndarray:
+            return np.isin(h_ids, passing)
 
-            final_list = self._score_hotels(
-                unified_hotels, base_tokens, query_sentiment
+        return hotel_passes
+
+    async def _search_impact_ordered(
+        self,
+        word_ids: List[int],
+        doc_type: str,
+        hotel_passes=None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple:
+        """
+        Top MAX_RESULTS docs by summed impact, evaluated score-at-a-time.
+        For doc_type=reviews the docs are reviews; otherwise hotels, with
+        each review term's impacts summed per hotel, from the hotel rollup
+        or else from the review postings. The
+        filter is applied to postings as they are read. Returns the Matches
+        of the top docs and the number of matching docs seen.
+        """
+        deadline = deadline or Deadline()
+        lists = []
+        if doc_type == "reviews":
+            review_words = word_ids
+        else:
+            hotel_entries, (rollups, review_words) = await asyncio.gather(
+                self._fetch_postings(word_ids, "hotels", deadline),
+                self._review_rollups(word_ids, deadline),
             )
-            total = len(final_list)
-            final_list = final_list[: self.config.MAX_RESULTS]
-            return {
-                "results": final_list,
-                "count": len(final_list),
-                "total_matches": total,
-            }
+            lists += [self._impact_list(e) for e in hotel_entries.values()]
+            lists += [self._impact_list(e) for e in rollups.values()]
+        review_entries = await self._fetch_postings(review_words, "reviews", deadline)
+        lists += [
+            self._impact_list(e, rollup=doc_type != "reviews") for e in review_entries.values()
+        ]
+
+        predicate = None
+        if hotel_passes is not None:
+
+            def predicate(keys: np.ndarray) -> np.ndarray:
+                return hotel_passes(self._review_hotels(keys) if doc_type == "reviews" else keys)
 
-    async def _search_union(self, word_ids: List[int], doc_type: str) -> Dict:
+        keys, seen, reason = score_at_a_time(
+            lists,
+            self.config.MAX_RESULTS,
+            self.config.IMPACT_POSTINGS_BUDGET,
+            predicate,
+            deadline.check,
+        )
+        logger.debug(
+            f"Impact-ordered evaluation for '{doc_type}' stopped ({reason}) after {seen} docs."
+        )
+        return Matches.gather(lists, keys, self.impacts.scale), seen
+
+    async def _review_rollups(
+        self, word_ids: List[int], deadline: Optional[Deadline] = None
+    ) -> tuple:
         """
-        For each word_id, gather docs from that doc_type => perform a union
-        Summation of freq if doc appears multiple times
+        Hotel rollup entries of word_ids, and the word ids whose review
+        postings must be rolled up at query time instead: their review
+        shard has no rollup shard yet, or, when scoring by impacts, their
+        rollup entry has no impacts.
+        """
+        rollups = await self._fetch_postings(word_ids, ROLLUP_DOC_TYPE, deadline)
+        fallback = [
+            w_id
+            for w_id in dict.fromkeys(word_ids)
+            if w_id not in rollups
+            and not self._shard_exists(self._shard_path(w_id, ROLLUP_DOC_TYPE))
+        ]
+        if self.impacts is not None:
+            for w_id in [w_id for w_id, entry in rollups.items() if "impacts" not in entry]:
+                del rollups[w_id]
+                fallback.append(w_id)
+        return rollups, fallback
+
+    async def _search_review_rollup(
+        self, word_ids: List[int], deadline: Optional[Deadline] = None
+    ) -> Matches:
+        """Review matches per hotel, summed like _search_union would after re-keying."""
+        rollups, fallback = await self._review_rollups(word_ids, deadline)
+        lists, weights = [], []
+        for entry in rollups.values():
+            pl = posting_list(entry)
+            lists.append(pl)
+            if self.impacts is not None:
+                weights.append(pl.impacts * self.impacts.scale)
+            else:
+                if "_weights" not in entry:
+                    entry["_weights"] = rollup_weights(
+                        entry, self.config.SCORING_PARAMS["field_weights"]
+                    )
+                weights.append(entry["_weights"])
+        matches = Matches.union(lists, weights)
+        if fallback:
+            logger.debug(f"No hotel rollup for word IDs {fallback}; rolling up reviews.")
+            reviews = await self._search_union(fallback, "reviews", deadline)
+            matches = Matches.concat([matches, reviews.rekey(self._review_hotels(reviews.ids))])
+        return matches
+
+    def _impact_list(self, entry: Dict, rollup: bool = False) -> ImpactList:
         """
-        results = {}
-        doc_counter = 0
+        entry's postings in impact order, memoized on the entry like its
+        PostingList; with rollup, keyed by the reviews' hotels.
+        """
+        key = "_hotel_impacts" if rollup else "_impacts"
+        cached = entry.get(key)
+        if cached is None:
+            pl = posting_list(entry)
+            self._term_weights(pl)  # fills in missing impacts
+            cached = ImpactList.from_postings(pl)
+            if rollup:
+                cached = cached.rollup(self._review_hotels(pl.id_array))
+            entry[key] = cached
+        return cached
+
+    def _review_hotels(self, rev_ids: np.ndarray) -> np.ndarray:
+        """hotel_id of each review, -1 for reviews not mapped to a hotel."""
+        return np.fromiter(
+            (self.rev_to_hotel.get(r, -1) for r in rev_ids.tolist()),
+            dtype=np.int64,
+            count=len(rev_ids),
+        )
 
-        for w_id in word_ids:
-            batch_start = (
-                w_id // self.config.INVERTED_BATCH_SIZE
-            ) * self.config.INVERTED_BATCH_SIZE
-            batch_end = batch_start + self.config.INVERTED_BATCH_SIZE - 1
-            inv_file = f"{self.config.INVERTED_INDEX_PATH}/{doc_type}/inverted_index_{batch_start}-{batch_end}.json"
+    def _shard_path(self, w_id: int, doc_type: str) -> str:
+        batch_start = (
+            w_id // self.config.INVERTED_BATCH_SIZE
+        ) * self.config.INVERTED_BATCH_SIZE
+        batch_end = batch_start + self.config.INVERTED_BATCH_SIZE - 1
+        return f"{self.config.INVERTED_INDEX_PATH}/{doc_type}/inverted_index_{batch_start}-{batch_end}.json"
 
-            if not os.path.exists(inv_file):
+    async def _fetch_postings(
+        self, word_ids: List[int], doc_type: str, deadline: Optional[Deadline] = None
+    ) -> Dict[int, Dict]:
+        """
+        word_id -> inverted index entry in doc_type's shards. Word IDs are
+        grouped by shard so each shard is read once. Shards are not read
+        once the deadline has passed.
+        """
+        by_shard = defaultdict(list)
+        for w_id in dict.fromkeys(word_ids):
+            by_shard[self._shard_path(w_id, doc_type)].append(w_id)
+
+        entries = {}
+        for inv_file, shard_word_ids in by_shard.items():
+            if deadline is not None and deadline.check():
+                logger.info(f"Deadline passed; skipping the remaining '{doc_type}' shards.")
+                break
+            if not self._shard_exists(inv_file):
                 logger.debug(f"Inverted index file {inv_file} does not exist.")
                 continue
 
             try:
-                async with aiofiles.open(inv_file, "r", encoding="utf-8-sig") as f:
-                    content = await f.read()
-                inv_data = json.loads(content)
+                inv_data = await self._read_shard(self.shard_cache, inv_file)
                 logger.debug(f"Loaded inverted index from {inv_file}.")
             except Exception as e:
                 logger.error(f"Error reading {inv_file}: {e}", exc_info=True)
                 continue
 
-            if str(w_id) not in inv_data:
-                logger.debug(f"Word ID {w_id} not found in {inv_file}.")
-                continue
-
-            postings = inv_data[str(w_id)]["docs"]
-            logger.debug(f"Word ID {w_id} found in {len(postings)} documents.")
-
-            for p in postings:
-                doc_id = p["id"]
-                freq = p["freq"]
-                fields = p["fields"]
-
-                if doc_id not in results:
-                    results[doc_id] = {
-                        "freq": freq,
-                        "fields": fields[:],
-                    }
-                    doc_counter += 1
-                    logger.debug(f"Added new document ID {doc_id} with freq {freq}.")
-                    if doc_counter >= self.config.MAX_DOCS_TO_PROCESS:
-                        logger.info("Reached MAX_DOCS_TO_PROCESS limit.")
-                        break
-                else:
-                    results[doc_id]["freq"] += freq
-                    results[doc_id]["fields"].extend(fields)
-                    logger.debug(
-                        f"Updated document ID {doc_id} with additional freq {freq}."
-                    )
-
-            if doc_counter >= self.config.MAX_DOCS_TO_PROCESS:
-                break
+            for w_id in shard_word_ids:
+                if str(w_id) not in inv_data:
+                    logger.debug(f"Word ID {w_id} not found in {inv_file}.")
+                    continue
+                entries[w_id] = inv_data[str(w_id)]
+        return entries
+
+    async def _read_shard(self, cache: ShardCache, path: str) -> dict:
+        """cache.get(path), read once per batch search; see batch_shards."""
+        shards = batch_shards.get()
+        if shards is None:
+            return await cache.get(path)
+        if path not in shards:
+            shards[path] = asyncio.ensure_future(cache.get(path))
+        # Shielded: the queries of a batch share the read
+        return await asyncio.shield(shards[path])
+
+    async def _search_union(
+        self, word_ids: List[int], doc_type: str, deadline: Optional[Deadline] = None
+    ) -> Matches:
+        """
+        For each word_id, gather docs from that doc_type => perform a union
+        Summation of freq if doc appears multiple times
+        """
+        entries = await self._fetch_postings(word_ids, doc_type, deadline)
+        lists = [posting_list(entries[w_id]) for w_id in dict.fromkeys(word_ids) if w_id in entries]
+        results = Matches.union(lists, [self._term_weights(pl) for pl in lists])
+        if len(results) > self.config.MAX_DOCS_TO_PROCESS:
+            logger.info("Reached MAX_DOCS_TO_PROCESS limit.")
+            results = results.select(slice(0, self.config.MAX_DOCS_TO_PROCESS))
 
         logger.debug(f"Total matched documents for '{doc_type}': {len(results)}")
         return results
 
-    def _score_hotels(
-        self, matched_docs: Dict, query_tokens: List[str], query_sentiment: float
-    ) -> List[Dict]:
+    async def _search_matching(
+        self,
+        required: List[int],
+        word_ids: List[int],
+        minimum: int,
+        doc_type: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Matches:
         """
-        Scoring for hotels with sentiment adjustment.
+        Docs of doc_type containing at least `minimum` of the required word
+        IDs, found by intersecting the sorted posting lists. Only those docs
+        are materialized; freq and field weights are then summed over all
+        word_ids they contain, as in _search_union.
         """
-        df = self.get_hotels_df()
-        if df.empty:
-            logger.debug("Hotels DataFrame is empty.")
-            return []
-
-        # Scoring parameters
-        base_freq = self.config.SCORING_PARAMS["base_freq_weight"]
-        multi_bonus = self.config.SCORING_PARAMS["multi_token_bonus"]
-        length_norm = self.config.SCORING_PARAMS["length_norm_factor"]
-        field_importance = self.config.SCORING_PARAMS["field_weights"]
-
-        # Sentiment adjustment parameters
-        negative_weight = self.config.SCORING_PARAMS["negative_sentiment_weight"]
-        positive_weight = self.config.SCORING_PARAMS["positive_sentiment_weight"]
-
-        # Sentiment scaling factors
-        SENTIMENT_BOOST_FACTOR = 0.1
-        SENTIMENT_PENALTY_FACTOR = 0.1
-
-        # Determine if the query is negative or positive
-        if query_sentiment < -0.05:
-            sentiment_type = "negative"
-        elif query_sentiment > 0.05:
-            sentiment_type = "positive"
-        else:
-            sentiment_type = "neutral"
-
-        logger.debug(f"Query sentiment type: {sentiment_type}")
-
-        doc_ids = list(matched_docs.keys())[: self.config.MAX_DOCS_TO_PROCESS]
-        distinct_query_tokens = set(query_tokens)
-        results = []
-
-        logger.debug(f"Number of matched hotels to score: {len(doc_ids)}")
+        entries = await self._fetch_postings(required + word_ids, doc_type, deadline)
+        lists = {w_id: posting_list(entry) for w_id, entry in entries.items()}
+        matched = np.asarray(
+            at_least([lists[w_id].ids if w_id in lists else [] for w_id in required], minimum)[
+                : self.config.MAX_DOCS_TO_PROCESS
+            ],
+            dtype=np.int64,
+        )
 
-        for doc_id in doc_ids:
-            doc_data = matched_docs[doc_id]
-            try:
-                h_id = int(doc_id)
-            except ValueError:
-                logger.debug(f"Invalid hotel ID: {doc_id}")
+        freqs = np.zeros(len(matched), dtype=np.int64)
+        masks = np.zeros(len(matched), dtype=np.int64)
+        weights = np.zeros(len(matched))
+        for pl in lists.values():
+            if not len(matched) or not len(pl):
                 continue
+            idx = np.minimum(np.searchsorted(pl.id_array, matched), len(pl) - 1)
+            hit = pl.id_array[idx] == matched
+            idx = idx[hit]
+            freqs[hit] += pl.freqs[idx]
+            masks[hit] |= pl.masks[idx]
+            weights[hit] += self._term_weights(pl)[idx]
 
-            row = df[df["hotel_id"] == h_id]
-            if row.empty:
-                logger.debug(f"No hotel found with ID {h_id}")
-                continue
+        logger.debug(f"Total matched documents for '{doc_type}': {len(matched)}")
+        return Matches(matched, freqs, masks, weights)
 
-            freq = doc_data["freq"]
-            fields = doc_data["fields"]
+    def _term_weights(self, pl) -> np.ndarray:
+        """
+        Per-posting weight summed into Matches.weights: the posting's field
+        weights, or its dequantized impact when scoring by impacts.
+        """
+        if self.impacts is None:
+            return self.mask_weights[pl.masks]
+        if pl.impacts is None:
+            # Entry written since the last re-impact pass
+            pl.impacts = self.impacts.quantize(pl.freqs, pl.masks)
+        return pl.impacts * self.impacts.scale
+
+    async def _match_phrases(
+        self,
+        matched: Matches,
+        phrase_ids: List[tuple],
+        doc_type: str,
+        deadline: Optional[Deadline] = None,
+    ) -> Matches:
+        """
+        Keep the matched docs that contain every phrase, found by
+        intersecting the phrase terms' postings with the matched docs and
+        then checking positions. Each phrase adds phrase_boost / (1 + extra
+        positions) to the doc's boost. Once the deadline passes, docs not
+        yet checked are dropped.
+        """
+        if not len(matched):
+            return matched
+        entries = await self._fetch_postings(
+            [w_id for ids, _ in phrase_ids for w_id in ids], doc_type, deadline
+        )
+        phrase_boost = self.config.SCORING_PARAMS["phrase_boost"]
+        candidates = matched.ids.tolist()
+        boosts = defaultdict(float)
+
+        for ids, slop in phrase_ids:
+            if any(w_id not in entries for w_id in ids):
+                return Matches.empty()
+            term_lists = [posting_list(entries[w_id]) for w_id in ids]
+            term_positions = [
+                await self._term_positions(w_id, doc_type, entries[w_id]) for w_id in ids
+            ]
+            hits = []
+            for n, doc_id in enumerate(intersect([pl.ids for pl in term_lists] + [candidates])):
+                if n % DEADLINE_CHECK_ROWS == 0 and deadline is not None and deadline.check():
+                    break
+                positions = [
+                    stream[find(pl.ids, doc_id)]
+                    for pl, stream in zip(term_lists, term_positions)
+                ]
+                extra = phrase_gap(positions, slop)
+                if extra is not None:
+                    hits.append(doc_id)
+                    boosts[doc_id] += phrase_boost / (1 + extra)
+            candidates = hits
+
+        results = matched.select(np.isin(matched.ids, candidates))
+        results.boosts = results.boosts + np.array(
+            [boosts[doc_id] for doc_id in results.ids.tolist()]
+        )
+        logger.debug(f"{len(results)} '{doc_type}' matched all phrases.")
+        return results
 
-            # Basic frequency-based scoring
-            score = freq * base_freq
+    async def _term_positions(self, w_id: int, doc_type: str, entry: Dict) -> List[List[int]]:
+        """
+        Positions of each of entry's postings, in posting_list order. Read
+        inline from older shards, else from the shard's positions stream.
+        """
+        pl = posting_list(entry)
+        docs = entry.get("docs")
+        if docs and "positions" in docs[0]:
+            return [docs[i]["positions"] for i in (pl.order or range(len(docs)))]
 
-            # Field-based weighting
-            for f in fields:
-                score += field_importance.get(f, 2.0)  # fallback=2.0 for unknown fields
+        pos_file = positions_path(self._shard_path(w_id, doc_type))
+        try:
+            stream = (await self._read_shard(self.positions_cache, pos_file)).get(str(w_id), [])
+        except Exception as e:
+            logger.error(f"Error reading {pos_file}: {e}", exc_info=True)
+            stream = []
+        if len(stream) != len(pl):
+            logger.warning(f"Positions for word ID {w_id} in {pos_file} do not match its postings.")
+            return [[] for _ in range(len(pl))]
+        return [stream[i] for i in pl.order] if pl.order else stream
+
+    def _rank_inputs(self, doc_type: str, matched_docs: Matches) -> Optional[tuple]:
+        """
+        The matches that have a record, hotels in the hotels table or
+        reviews mapped to a hotel, with their sentiments and, for reviews,
+        their hotels. None if there is nothing to rank.
+        """
+        if doc_type == "reviews":
+            if self.get_reviews_df().empty:
+                logger.debug("Reviews DataFrame is empty.")
+                return None
+            hotel_ids = self._review_hotels(matched_docs.ids)
+            mapped = hotel_ids >= 0
+            if not mapped.all():
+                logger.debug(f"{int((~mapped).sum())} matched reviews not mapped to any hotel.")
+            matched_docs, hotel_ids = matched_docs.select(mapped), hotel_ids[mapped]
+        else:
+            df = self.get_hotels_df()
+            if df.empty:
+                logger.debug("Hotels DataFrame is empty.")
+                return None
+            hotel_ids = None
+            matched_docs = matched_docs.select(slice(0, self.config.MAX_DOCS_TO_PROCESS))
+            known = np.isin(matched_docs.ids, df["hotel_id"].to_numpy())
+            if not known.all():
+                logger.debug(f"No hotel found for {int((~known).sum())} matched hotel IDs")
+            matched_docs = matched_docs.select(known)
+        if not len(matched_docs):
+            return None
+        sentiments = np.fromiter(
+            (self.doc_sentiment.get(str(doc_id), 0.0) for doc_id in matched_docs.ids.tolist()),
+            dtype=np.float64,
+            count=len(matched_docs),
+        )
+        return matched_docs, sentiments, hotel_ids
 
-            # Multi-token bonus
-            approx_matched = min(len(distinct_query_tokens), freq)
-            score += approx_matched * multi_bonus
+    async def _rank(
+        self,
+        doc_type: str,
+        matched_docs: Matches,
+        query_tokens: List[str],
+        query_sentiment: float,
+    ) -> Ranking:
+        """
+        Rank hotels, or reviews for doc_type=reviews, on the scoring
+        executor; matches are gathered in a thread, so neither blocks the
+        event loop.
+        """
+        async with self.scoring.slots:
+            inputs = await run_in_threadpool(self._rank_inputs, doc_type, matched_docs)
+            if inputs is None:
+                return Ranking.empty()
+            matched_docs, sentiments, hotel_ids = inputs
+            ranking = await self.scoring.submit(
+                rank_documents,
+                matched_docs,
+                sentiments,
+                query_tokens,
+                query_sentiment,
+                self.config.SCORING_PARAMS,
+                impact_mode=self.impacts is not None,
+                hotel_ids=hotel_ids,
+            )
+        logger.debug(f"Ranked {len(ranking)} {doc_type}.")
+        return ranking
 
-            # Length normalization
-            score /= 1 + length_norm * freq
+    def _hotel_records(
+        self, hotel_ids: np.ndarray, columns: Optional[Collection[str]] = None
+    ) -> List[Optional[Dict]]:
+        """
+        Record of each hotel, None if it is not in the hotels table; with
+        columns, only those of its columns.
+        """
+        df = self.get_hotels_df()
+        hotels = df[df["hotel_id"].isin(hotel_ids)].drop_duplicates("hotel_id")
+        if columns is not None:
+            hotels = hotels[[c for c in hotels.columns if c in columns]]
+        records = hotels.to_dict("records")
+        pos = pd.Index(hotels["hotel_id"]).get_indexer(hotel_ids)
+        return [records[p] if p >= 0 else None for p in pos.tolist()]
+
+    def _review_records(
+        self,
+        rev_ids: np.ndarray,
+        deadline: Optional[Deadline] = None,
+        columns: Optional[Collection[str]] = None,
+        batches: Optional[OrderedDict] = None,
+    ) -> List[Optional[Dict]]:
+        """
+        Record of each review, read from its hotel's review batch; None if
+        it is not found. With columns, only those columns are parsed.
+        Batches are not read once the deadline has passed. batches, if
+        given, keeps the STREAM_REVIEW_BATCHES most recently parsed batches
+        across calls, as the blocks of a stream share them.
+        """
+        # Group rev_ids by review batch, which hotels in an id range share
+        batch_map = defaultdict(list)
+        for rev_id, h_id in zip(rev_ids.tolist(), self._review_hotels(rev_ids).tolist()):
+            if h_id < 0:
+                logger.debug(f"Review ID {rev_id} not mapped to any hotel.")
+                continue
+            batch_map[self._get_review_batch_file(h_id)].append(rev_id)
 
-            # Sentiment adjustment
-            doc_sentiment = self.doc_sentiment.get(
-                str(h_id), 0.0
-            )  # Default to neutral if not found
+        found = {}
+        for batch_file, rev_list in batch_map.items():
+            if deadline is not None and deadline.check():
+                logger.info("Deadline passed; skipping the remaining review batches.")
+                break
+            batch_df = self._review_batch(batch_file, columns, batches)
+            if batch_df is None:
+                continue
+            subdf = batch_df[batch_df["rev_id"].isin(rev_list)]
+            logger.debug(f"Found {len(subdf)} matching reviews in {batch_file}.")
+            for record in subdf.to_dict("records"):
+                found[int(record["rev_id"])] = record
+        return [found.get(rev_id) for rev_id in rev_ids.tolist()]
 
-            if sentiment_type == "negative" and doc_sentiment < 0:
-                score += SENTIMENT_BOOST_FACTOR * abs(doc_sentiment)
-                logger.debug(
-                    f"Hotel ID {h_id} aligned with negative sentiment. Boosted score to {score}"
-                )
-            elif sentiment_type == "positive" and doc_sentiment > 0:
-                score += SENTIMENT_BOOST_FACTOR * doc_sentiment
-                logger.debug(
-                    f"Hotel ID {h_id} aligned with positive sentiment. Boosted score to {score}"
-                )
-            elif sentiment_type == "negative" and doc_sentiment > 0:
-                score -= SENTIMENT_PENALTY_FACTOR * doc_sentiment
-                logger.debug(
-                    f"Hotel ID {h_id} misaligned with negative sentiment. Penalized score to {score}"
-                )
-            elif sentiment_type == "positive" and doc_sentiment < 0:
-                score -= SENTIMENT_PENALTY_FACTOR * abs(doc_sentiment)
-                logger.debug(
-                    f"Hotel ID {h_id} misaligned with positive sentiment. Penalized score to {score}"
-                )
-            # Neutral sentiment: No adjustment
+    def _review_batch(
+        self,
+        batch_file: str,
+        columns: Optional[Collection[str]] = None,
+        batches: Optional[OrderedDict] = None,
+    ) -> Optional[pd.DataFrame]:
+        """Parsed review batch, None if it does not exist or has no rev_id."""
+        if batches is not None and batch_file in batches:
+            batches.move_to_end(batch_file)
+            return batches[batch_file]
+        if not batch_exists(batch_file):
+            logger.debug(f"Review batch file {batch_file} does not exist.")
+            return None
+        batch_df = read_with_delta(batch_file, "rev_id", columns)
+        if batch_df.empty or "rev_id" not in batch_df.columns:
+            logger.debug(f"Review batch file {batch_file} is empty or missing 'rev_id'.")
+            batch_df = None
+        if batches is not None:
+            batches[batch_file] = batch_df
+            while len(batches) > self.config.STREAM_REVIEW_BATCHES:
+                batches.popitem(last=False)
+        return batch_df
+
+    def _records(
+        self,
+        doc_type: str,
+        doc_ids: np.ndarray,
+        fields: Optional[Collection[str]] = None,
+        deadline: Optional[Deadline] = None,
+        batches: Optional[OrderedDict] = None,
+    ) -> List[Optional[Dict]]:
+        """
+        Records of the docs, with fields only the doc id and the record
+        columns among fields; see _hotel_records and _review_records.
+        """
+        columns = None
+        if fields is not None:
+            id_column = "rev_id" if doc_type == "reviews" else "hotel_id"
+            columns = {id_column}.union(f for f in fields if f not in SCORE_FIELDS)
+        if columns is not None and columns <= {"rev_id", "hotel_id"}:
+            return self._id_records(doc_type, doc_ids, columns)
+        if doc_type == "reviews":
+            return self._review_records(doc_ids, deadline, columns, batches)
+        return self._hotel_records(doc_ids, columns)
 
-            # Ensure the score doesn't drop below base_freq
-            if score < base_freq:
-                score = base_freq
-                logger.debug(
-                    f"Score for hotel ID {h_id} adjusted to base_freq {base_freq}."
-                )
+    def _id_records(self, doc_type: str, doc_ids: np.ndarray, columns: Collection[str]) -> List[Dict]:
+        """Records of just the docs' ids, which need no document store reads."""
+        if doc_type == "reviews":
+            ids = {"rev_id": doc_ids.tolist(), "hotel_id": self._review_hotels(doc_ids).tolist()}
+        else:
+            ids = {"hotel_id": doc_ids.tolist()}
+        names = [name for name in ids if name in columns]
+        return [dict(zip(names, values)) for values in zip(*(ids[name] for name in names))]
 
-            # Store final result
-            info = row.iloc[0].to_dict()
-            info["search_score"] = score
-            info["matched_fields"] = list(set(fields))
-            info["matched_terms"] = list(distinct_query_tokens)
-            info["sentiment_score"] = (
-                doc_sentiment  # Optional: Include sentiment score in results
-            )
+    async def _ranked_results(
+        self,
+        doc_type: str,
+        matched_docs: Matches,
+        query_tokens: List[str],
+        query_sentiment: float,
+        corrections: Dict[str, str],
+        deadline: Deadline,
+        limit: int,
+        total: Optional[int] = None,
+        fields: Optional[Collection[str]] = None,
+        cursor_key: Optional[str] = None,
+    ) -> Dict:
+        """
+        Rank the matches and return the first page. The top MAX_RESULTS
+        are kept in the cursor cache, under cursor_key if given, when there
+        is more than one page; total is the number of matches if more than
+        were ranked.
+        """
+        ranking = await self._rank(doc_type, matched_docs, query_tokens, query_sentiment)
+        ranked = {
+            "doc_type": doc_type,
+            "ranking": ranking.select(slice(0, self.config.MAX_RESULTS)),
+            "query_tokens": query_tokens,
+            "total_matches": len(ranking) if total is None else max(total, len(ranking)),
+            "corrections": corrections,
+            "partial": deadline.partial,
+        }
+        if len(ranked["ranking"]) > limit:
+            ranked["key"] = self.cursors.put(ranked, cursor_key)
+        return await self._results_page(ranked, 0, limit, deadline, fields)
 
-            results.append(clean_float_values(info))
-            logger.debug(f"Hotel ID {h_id} scored with search_score {score}")
+    async def _results_page(
+        self,
+        ranked: Dict,
+        offset: int,
+        limit: int,
+        deadline: Deadline,
+        fields: Optional[Collection[str]] = None,
+    ) -> Dict:
+        """
+        Hydrate the ranked docs offset..offset+limit into a response. With
+        fields, results hold the doc's id and only those of its record
+        columns and SCORE_FIELDS, and only those columns are read.
+        """
+        ranking = ranked["ranking"].select(slice(offset, offset + limit))
+        records = await run_in_threadpool(
+            self._records, ranked["doc_type"], ranking.ids, fields, deadline
+        )
+        results = hydrate(records, ranking, ranked["query_tokens"], fields)
+        end = offset + len(ranking)
+        return {
+            "results": results,
+            "count": len(results),
+            "total_matches": ranked["total_matches"],
+            "corrections": ranked["corrections"],
+            "partial": ranked["partial"] or deadline.partial,
+            "next_cursor": f"{ranked['key']}.{end}" if end < len(ranked["ranking"]) else None,
+        }
 
-        # Sort by final score in descending order
-        results.sort(key=lambda x: x["search_score"], reverse=True)
-        logger.debug(f"Top {len(results)} hotels after scoring.")
-        return results
+    async def search_page(
+        self,
+        cursor: str,
+        limit: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        fields: Optional[Collection[str]] = None,
+    ) -> Optional[Dict]:
+        """
+        The page of an earlier search starting at cursor, a next_cursor it
+        returned. None if the cursor is unknown or has expired.
+        """
+        key, _, offset = cursor.rpartition(".")
+        ranked = self.cursors.get(key) if offset.isdigit() else None
+        if ranked is None:
+            return None
+        return await self._results_page(
+            ranked, int(offset), limit or self.config.SEARCH_PAGE_SIZE, deadline or Deadline(), fields
+        )
 
-    def _score_and_fetch_reviews(
-        self, matched_docs: Dict, query_tokens: List[str], query_sentiment: float
+    async def search_batch(
+        self, queries: List[Dict], deadline: Optional[Deadline] = None
     ) -> List[Dict]:
         """
-        Scoring for reviews with sentiment adjustment.
-        """
-        if not matched_docs:
-            logger.debug("No matched reviews to score.")
-            return []
-        from collections import defaultdict, Counter
-
-        df = self.get_reviews_df()
-        if df.empty:
-            logger.debug("Reviews DataFrame is empty.")
-            return []
-
-        # Scoring parameters
-        base_freq = self.config.SCORING_PARAMS["base_freq_weight"]
-        multi_bonus = self.config.SCORING_PARAMS["multi_token_bonus"]
-        length_norm = self.config.SCORING_PARAMS["length_norm_factor"]
-        field_importance = self.config.SCORING_PARAMS["field_weights"]
-
-        # Sentiment adjustment parameters
-        negative_weight = self.config.SCORING_PARAMS["negative_sentiment_weight"]
-        positive_weight = self.config.SCORING_PARAMS["positive_sentiment_weight"]
-
-        # Sentiment scaling factors
-        SENTIMENT_BOOST_FACTOR = 0.1
-        SENTIMENT_PENALTY_FACTOR = 0.1
-
-        # Determine if the query is negative or positive
-        if query_sentiment < -0.05:
-            sentiment_type = "negative"
-        elif query_sentiment > 0.05:
-            sentiment_type = "positive"
-        else:
-            sentiment_type = "neutral"
-
-        logger.debug(f"Query sentiment type: {sentiment_type}")
-
-        distinct_query_tokens = set(query_tokens)
-
-        # Group rev_ids by hotel
-        hotel_map = defaultdict(list)
-        for doc_id, doc_info in matched_docs.items():
-            try:
-                rev_id_int = int(doc_id)
-            except ValueError:
-                logger.debug(f"Invalid review ID: {doc_id}")
-                continue
-            if rev_id_int not in self.rev_to_hotel:
-                logger.debug(f"Review ID {rev_id_int} not mapped to any hotel.")
+        search() of each of queries, dicts of its arguments, in order.
+        The queries are tokenized in one spaCy pass and read the postings
+        of their distinct word ids up front, each shard once for the whole
+        batch; each is then scored on its own. They share one deadline.
+        """
+        deadline = deadline or Deadline()
+        logger.info(f"search_batch() called with {len(queries)} queries.")
+        analyses = await self._analyze_queries([q["query"] for q in queries])
+
+        # The word ids each doc type's shards are read for, as search() will
+        needed = defaultdict(dict)
+        for q, analyzed in zip(queries, analyses):
+            if analyzed is None or not analyzed["word_ids"]:
                 continue
-            h_id = self.rev_to_hotel[rev_id_int]
-            hotel_map[h_id].append(rev_id_int)
-
-        results = []
-        hotel_review_count = Counter()
-
-        logger.debug(f"Number of hotels with matched reviews: {len(hotel_map)}")
+            word_ids = dict.fromkeys(analyzed["word_ids"])
+            needed["hotels"].update(word_ids)
+            if (
+                q.get("doc_type") == "reviews"
+                or q.get("mode") == "and"
+                or q.get("min_should_match")
+                or analyzed["phrase_ids"]
+            ):
+                needed["reviews"].update(word_ids)
+            else:
+                needed[ROLLUP_DOC_TYPE].update(word_ids)
 
-        for h_id, rev_list in hotel_map.items():
-            batch_file = self._get_review_batch_file(h_id)
-            if not os.path.exists(batch_file):
-                logger.debug(
-                    f"Review batch file {batch_file} does not exist for hotel ID {h_id}."
-                )
-                continue
-            batch_df = read_csv(batch_file)
-            if batch_df.empty or "rev_id" not in batch_df.columns:
-                logger.debug(
-                    f"Review batch file {batch_file} is empty or missing 'rev_id'."
+        shards = batch_shards.set({})
+        try:
+            await asyncio.gather(
+                *(
+                    self._fetch_postings(list(word_ids), doc_type, deadline)
+                    for doc_type, word_ids in needed.items()
                 )
-                continue
-            subdf = batch_df[
-                batch_df["rev_id"].astype(str).isin([str(x) for x in rev_list])
-            ]
-            if subdf.empty:
-                logger.debug(
-                    f"No matching reviews found in {batch_file} for hotel ID {h_id}."
+            )
+            read = ", ".join(f"{len(ids)} '{doc_type}'" for doc_type, ids in needed.items())
+            logger.debug(f"Read the batch's postings: {read} word IDs.")
+            return await asyncio.gather(
+                *(
+                    self.search(**q, deadline=deadline, analyzed=analyzed)
+                    if analyzed is not None
+                    else self._no_results()
+                    for q, analyzed in zip(queries, analyses)
                 )
-                continue
-
-            logger.debug(
-                f"Found {len(subdf)} matching reviews in {batch_file} for hotel ID {h_id}."
             )
+        finally:
+            batch_shards.reset(shards)
 
-            for _, row_data in subdf.iterrows():
-                rev_str = str(row_data["rev_id"])
-                if rev_str not in matched_docs:
-                    logger.debug(f"Review ID {rev_str} not in matched_docs.")
-                    continue
+    async def _no_results(self) -> Dict:
+        return {"results": [], "count": 0, "total_matches": 0}
 
-                doc_info = matched_docs[rev_str]
-                freq = doc_info["freq"]
-                fields = doc_info["fields"]
+    ##########################################################
+    # Streaming every match
+    ##########################################################
+    async def stream_search(
+        self,
+        query: str,
+        doc_type: str,
+        location: Optional[str] = None,
+        hotel_class: Optional[int] = None,
+        mode: str = "or",
+        min_should_match: Optional[int] = None,
+        fields: Optional[Collection[str]] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Every match of query, scored like search() but unranked: NDJSON
+        lines in doc id order, produced block by block from a
+        document-at-a-time walk over the posting lists (iter_matches), so
+        memory stays bounded however many docs match. Hotels are walked
+        with their review matches from the hotel rollup. Raises ValueError
+        for what cannot be walked that way: quoted phrases, and mode=and or
+        min_should_match except for doc_type=reviews.
+        """
+        logger.info(f"stream_search(query='{query}', doc_type='{doc_type}', mode='{mode}') called.")
+        analyzed = await self._analyze_query(query)
+        if analyzed is None or not analyzed["word_ids"]:
+            return self._stream_lines(iter(()), doc_type, [], 0.0)
+        if analyzed["phrase_ids"]:
+            raise ValueError("Quoted phrases are not supported when streaming")
+        word_ids = list(dict.fromkeys(analyzed["word_ids"]))
+
+        required, minimum = None, 0
+        if mode == "and" or min_should_match:
+            if doc_type != "reviews":
+                raise ValueError(
+                    "mode=and and min_should_match are only streamed for doc_type=reviews"
+                )
+            required_ids = set(analyzed["required"])
+            if mode == "and":
+                minimum = len(required_ids)
+            else:
+                minimum = min(min_should_match, len(required_ids))
 
-                # Basic frequency-based scoring
-                score = freq * base_freq
+        if doc_type == "reviews":
+            term_lists = await self._term_matches(word_ids, "reviews")
+            lists = [term_lists[w_id] for w_id in word_ids if w_id in term_lists]
+            if minimum:
+                required = [w_id in required_ids for w_id in word_ids if w_id in term_lists]
+        else:
+            hotel_lists, (rollups, fallback) = await asyncio.gather(
+                self._term_matches(word_ids, "hotels"), self._review_rollups(word_ids)
+            )
+            lists = list(hotel_lists.values())
+            for entry in rollups.values():
+                pl = posting_list(entry)
+                if self.impacts is not None:
+                    weights = pl.impacts * self.impacts.scale
+                else:
+                    if "_weights" not in entry:
+                        entry["_weights"] = rollup_weights(
+                            entry, self.config.SCORING_PARAMS["field_weights"]
+                        )
+                    weights = entry["_weights"]
+                lists.append(Matches.union([pl], [weights]))
+            # Terms without a rollup are rolled up here, one term at a time
+            for reviews in (await self._term_matches(fallback, "reviews")).values():
+                lists.append(reviews.rekey(self._review_hotels(reviews.ids)))
+
+        hotel_passes = await run_in_threadpool(self._hotel_filter, location, hotel_class)
+        blocks = iter_matches(lists, required=required, minimum=minimum)
+        review_counts = None
+        if doc_type == "reviews":
+            # The multi-review bonus needs each hotel's matched reviews up front
+            review_counts = await run_in_threadpool(
+                self._count_hotel_reviews,
+                iter_matches(lists, required=required, minimum=minimum),
+                hotel_passes,
+            )
+        return self._stream_lines(
+            blocks,
+            doc_type,
+            analyzed["base_tokens"],
+            analyzed["query_sentiment"],
+            hotel_passes,
+            review_counts,
+            fields,
+        )
 
-                # Field-based weighting
-                for f in fields:
-                    score += field_importance.get(
-                        f, 1.0
-                    )  # fallback=1.0 for unknown fields
+    async def _term_matches(self, word_ids: List[int], doc_type: str) -> Dict[int, Matches]:
+        """word_id -> its postings in doc_type as Matches, in doc id order."""
+        entries = await self._fetch_postings(word_ids, doc_type)
+        term_lists = {}
+        for w_id, entry in entries.items():
+            pl = posting_list(entry)
+            term_lists[w_id] = Matches.union([pl], [self._term_weights(pl)])
+        return term_lists
+
+    def _count_hotel_reviews(self, blocks: Iterator[Matches], hotel_passes=None) -> np.ndarray:
+        """Matched reviews per hotel id, over review blocks."""
+        counts = np.zeros(0, dtype=np.int64)
+        for block in blocks:
+            hotels = self._review_hotels(block.ids)
+            keep = hotels >= 0
+            if hotel_passes is not None:
+                keep &= hotel_passes(hotels)
+            block_counts = np.bincount(hotels[keep])
+            if len(block_counts) > len(counts):
+                counts = np.pad(counts, (0, len(block_counts) - len(counts)))
+            counts[: len(block_counts)] += block_counts
+        return counts
+
+    async def _stream_lines(
+        self,
+        blocks: Iterator[Matches],
+        doc_type: str,
+        query_tokens: List[str],
+        query_sentiment: float,
+        hotel_passes=None,
+        review_counts: Optional[np.ndarray] = None,
+        fields: Optional[Collection[str]] = None,
+    ) -> AsyncIterator[bytes]:
+        """NDJSON of each block of matches, computed in a thread."""
+        streamed = 0
+        batches = OrderedDict()  # review batch path -> parsed batch
+        while True:
+            lines = await run_in_threadpool(
+                self._stream_block,
+                blocks,
+                doc_type,
+                query_tokens,
+                query_sentiment,
+                hotel_passes,
+                review_counts,
+                fields,
+                batches,
+            )
+            if lines is None:
+                break
+            streamed += lines.count(b"\n")
+            if lines:
+                yield lines
+        logger.debug(f"Streamed {streamed} {doc_type}.")
 
-                # Multi-token bonus
-                approx_matched = min(len(distinct_query_tokens), freq)
-                score += approx_matched * multi_bonus
+    def _stream_block(
+        self,
+        blocks: Iterator[Matches],
+        doc_type: str,
+        query_tokens: List[str],
+        query_sentiment: float,
+        hotel_passes=None,
+        review_counts: Optional[np.ndarray] = None,
+        fields: Optional[Collection[str]] = None,
+        batches: Optional[OrderedDict] = None,
+    ) -> Optional[bytes]:
+        """The next block's results as NDJSON, None when there are no more blocks."""
+        block = next(blocks, None)
+        if block is None:
+            return None
+        if hotel_passes is not None:
+            hotels = self._review_hotels(block.ids) if doc_type == "reviews" else block.ids
+            block = block.select(hotel_passes(hotels))
+        inputs = self._rank_inputs(doc_type, block)
+        if inputs is None:
+            return b""
+        matched_docs, sentiments, hotel_ids = inputs
+        ranking = rank_documents(
+            matched_docs,
+            sentiments,
+            query_tokens,
+            query_sentiment,
+            self.config.SCORING_PARAMS,
+            impact_mode=self.impacts is not None,
+            hotel_ids=hotel_ids,
+            review_counts=review_counts,
+            sort=False,
+        )
+        records = self._records(doc_type, ranking.ids, fields, batches=batches)
+        return b"".join(
+            dumps(result) + b"\n" for result in hydrate(records, ranking, query_tokens, fields)
+        )
 
-                # Length normalization
-                score /= 1 + length_norm * freq
+    ##########################################################
+    # Index Updating with Sentiment Scoring
+    ##########################################################
+    async def schedule_indexing(self, docs: List[tuple], doc_type: str):
+        """
+        Index an ingested chunk of (doc_id, text, fields) in the background.
+        Waits while UPLOAD_INDEX_CHUNKS_IN_FLIGHT chunks are still being
+        indexed so a large upload cannot run ahead of the indexer.
+        """
+        await self.indexing_slots.acquire()
+        task = asyncio.create_task(self._index_documents(docs, doc_type))
+        self.indexing_tasks.add(task)
 
-                # Sentiment adjustment
-                doc_sentiment = self.doc_sentiment.get(
-                    rev_str, 0.0
-                )  # Default to neutral if not found
+        def _done(t):
+            self.indexing_tasks.discard(t)
+            self.indexing_slots.release()
 
-                if sentiment_type == "negative" and doc_sentiment < 0:
-                    score += SENTIMENT_BOOST_FACTOR * abs(doc_sentiment)
-                    logger.debug(
-                        f"Review ID {rev_str} aligned with negative sentiment. Boosted score to {score}"
-                    )
-                elif sentiment_type == "positive" and doc_sentiment > 0:
-                    score += SENTIMENT_BOOST_FACTOR * doc_sentiment
-                    logger.debug(
-                        f"Review ID {rev_str} aligned with positive sentiment. Boosted score to {score}"
-                    )
-                elif sentiment_type == "negative" and doc_sentiment > 0:
-                    score -= SENTIMENT_PENALTY_FACTOR * doc_sentiment
-                    logger.debug(
-                        f"Review ID {rev_str} misaligned with negative sentiment. Penalized score to {score}"
-                    )
-                elif sentiment_type == "positive" and doc_sentiment < 0:
-                    score -= SENTIMENT_PENALTY_FACTOR * abs(doc_sentiment)
-                    logger.debug(
-                        f"Review ID {rev_str} misaligned with positive sentiment. Penalized score to {score}"
-                    )
-                # Neutral sentiment: No adjustment
+        task.add_done_callback(_done)
 
-                # Ensure the score doesn't drop below base_freq
-                if score < base_freq:
-                    score = base_freq
-                    logger.debug(
-                        f"Score for review ID {rev_str} adjusted to base_freq {base_freq}."
-                    )
+    async def _index_documents(self, docs: List[tuple], doc_type: str):
+        # Tokenizing and shard rewrites would stall the event loop
+        await run_in_threadpool(self._index_chunk, docs, doc_type)
 
-                # Store final result
-                row_dict = row_data.to_dict()
-                row_dict["search_score"] = score
-                row_dict["matched_fields"] = list(set(fields))
-                row_dict["matched_terms"] = list(distinct_query_tokens)
-                row_dict["sentiment_score"] = (
-                    doc_sentiment  # Optional: Include sentiment score in results
-                )
+    def _index_chunk(self, docs: List[tuple], doc_type: str):
+        try:
+            for doc_id, text, fields in docs:
+                try:
+                    self._update_indices(doc_id, text, doc_type, fields)
+                except Exception:
+                    # Already logged by _update_indices; keep indexing the chunk
+                    pass
+        finally:
+            # Once per chunk: each bump is a durable write
+            self.bump_generation()
+        logger.debug(f"Indexed chunk of {len(docs)} {doc_type}.")
+
+    def _impact(self, freq: int, mask: int) -> Optional[int]:
+        """Quantized impact of a new posting; None (drops the entry's impacts) if not scoring by impacts."""
+        if self.impacts is None:
+            return None
+        return int(self.impacts.quantize([freq], [mask])[0])
 
-                results.append(clean_float_values(row_dict))
-                logger.debug(f"Review ID {rev_str} scored with search_score {score}")
-                hotel_review_count[row_dict["hotel_id"]] += 1
+    def _update_hotel_rollup(
+        self, rev_id: int, rollup_file: str, changes: Dict[int, tuple], shard_is_new: bool
+    ):
+        """
+        Fold a review's posting changes into its hotel's rollup rows. A
+        rollup shard is only created along with its review shard, so a
+        rollup that was never built is not mistaken for a complete one.
+        """
+        h_id = self.rev_to_hotel.get(rev_id)
+        if h_id is None:
+            logger.debug(f"Review ID {rev_id} not mapped to any hotel; rollup not updated.")
+            return
+        if not (shard_is_new or os.path.exists(rollup_file)):
+            return
+        os.makedirs(os.path.dirname(rollup_file), exist_ok=True)
+        rollup_idx = read_json(rollup_file) if os.path.exists(rollup_file) else {}
+        for w_id, (freq, new_bits, new_review, impact) in changes.items():
+            rollup_idx[str(w_id)] = rollup_add(
+                rollup_idx.get(str(w_id)), int(h_id), freq, new_bits, new_review, FIELD_BITS, impact
+            )
+        write_json(rollup_file, rollup_idx)
+        self.shard_cache.invalidate(rollup_file)
+        self.shard_paths.add(rollup_file)
+        logger.debug(f"Updated hotel rollup {rollup_file} for hotel ID {h_id}.")
 
-        # Multi-review bonus
-        for r in results:
-            extra = hotel_review_count[r["hotel_id"]] - 1
-            if extra > 0:
-                r["search_score"] += 0.05 * extra
-                logger.debug(
-                    f"Applied multi-review bonus for hotel ID {r['hotel_id']}. New search_score: {r['search_score']}"
-                )
+    async def update_indices(self, doc_id: str, text: str, doc_type: str, fields: Dict):
+        try:
+            await run_in_threadpool(self._update_indices, doc_id, text, doc_type, fields)
+        finally:
+            # Even a failed update may have rewritten some shards
+            self.bump_generation()
 
-        # Sort by final score in descending order
-        results.sort(key=lambda x: x["search_score"], reverse=True)
-        logger.debug(f"Top {len(results)} reviews after scoring.")
-        return results
+    def _update_indices(self, doc_id: str, text: str, doc_type: str, fields: Dict):
+        with self.index_lock:
+            self._index_document(doc_id, text, doc_type, fields)
 
-    ##########################################################
-    # Index Updating with Sentiment Scoring
-    ##########################################################
-    async def update_indices(self, doc_id: str, text: str, doc_type: str, fields: Dict):
+    def _index_document(self, doc_id: str, text: str, doc_type: str, fields: Dict):
         logger.info(
             f"update_indices(doc_id={doc_id}, doc_type={doc_type}) => fields={fields}"
         )
         try:
             tokens = self.tokenizer.tokenize_with_spacy(text.lower())
             logger.debug(f"update_indices tokens => {tokens}")
-            lex = self.lexicon or {}
-            max_id = max(lex.values()) if lex else 0
-            updated = False
-            for t in tokens:
-                if t not in lex:
-                    max_id += 1
-                    lex[t] = max_id
-                    updated = True
-                    logger.debug(
-                        f"Added new token '{t}' with word ID {max_id} to lexicon."
-                    )
-            if updated:
+            lex = self.lexicon
+            new_terms = [t for t in dict.fromkeys(tokens) if t not in lex]
+            for t in new_terms:
+                w_id = lex.add(t)
+                if self.speller is not None:
+                    self.speller.add(t, w_id)
+                logger.debug(f"Added new token '{t}' with word ID {w_id} to lexicon.")
+            if new_terms:
                 logger.info(
-                    f"Lexicon updated with new tokens. Saving to {Config.LEXICON_PATH}"
+                    f"Lexicon updated with {len(new_terms)} new tokens. Appending to {additions_path(Config.LEXICON_PATH)}"
                 )
-                write_json(Config.LEXICON_PATH, lex)
-                self.lexicon = lex
+                lex.persist_additions(new_terms)
 
             from collections import defaultdict
 
             word_counts = defaultdict(int)
             field_matches = defaultdict(list)
+            term_masks = defaultdict(int)
             positions = defaultdict(list)
             pos_ctr = 0
             for fkey, fval in fields.items():
@@ -956,11 +1996,16 @@ class SearchEngine:
                         w_id = lex[ft]
                         word_counts[w_id] += 1
                         field_matches[fkey].append(w_id)
+                        term_masks[w_id] |= FIELD_BITS.get(fkey, 0)
                         positions[w_id].append(pos_ctr)
                         logger.debug(
                             f"Word '{ft}' (ID {w_id}) in field '{fkey}' at position {pos_ctr}."
                         )
                     pos_ctr += 1
+                pos_ctr += FIELD_POSITION_GAP
+
+            if self.suggester is not None:
+                self.suggester.record(word_counts.keys())
 
             # Compute sentiment score
             if doc_type == "reviews":
@@ -1009,94 +2054,422 @@ class SearchEngine:
                 f"Updated forward index for document ID {doc_id} in {fwd_file}."
             )
 
-            # Update inverted index
-            for w_id, cnt in word_counts.items():
-                inv_start = (
-                    w_id // self.config.INVERTED_BATCH_SIZE
-                ) * self.config.INVERTED_BATCH_SIZE
-                inv_end = inv_start + self.config.INVERTED_BATCH_SIZE - 1
-                inv_dir = f"{self.config.INVERTED_INDEX_PATH}/{doc_type}"
-                os.makedirs(inv_dir, exist_ok=True)
-                inv_file = f"{inv_dir}/inverted_index_{inv_start}-{inv_end}.json"
-
-                inv_idx = read_json(inv_file) if os.path.exists(inv_file) else {}
-                if str(w_id) not in inv_idx:
-                    inv_idx[str(w_id)] = {"docs": []}
-
-                found = False
-                for d in inv_idx[str(w_id)]["docs"]:
-                    if d["id"] == doc_id:
-                        d["freq"] += cnt
-                        for ff in field_matches.keys():
-                            if ff not in d["fields"]:
-                                d["fields"].append(ff)
-                        d["positions"].extend(positions[w_id])
-                        found = True
+            # Update inverted index, reading and writing each shard once
+            by_shard = defaultdict(list)
+            for w_id in word_counts:
+                by_shard[self._shard_path(w_id, doc_type)].append(w_id)
+
+            for inv_file, shard_word_ids in by_shard.items():
+                os.makedirs(os.path.dirname(inv_file), exist_ok=True)
+                pos_file = positions_path(inv_file)
+
+                shard_is_new = not os.path.exists(inv_file)
+                inv_idx = read_json(inv_file) if not shard_is_new else {}
+                pos_idx = read_json(pos_file) if os.path.exists(pos_file) else {}
+                # w_id -> (freq delta, new field bits, new review, impact delta)
+                rollup_changes = {}
+
+                for w_id in shard_word_ids:
+                    docs = entry_docs(inv_idx.get(str(w_id)), pos_idx.get(str(w_id)))
+                    for d in docs:
+                        if d["id"] == doc_id_int:
+                            old_mask, old_impact = d["mask"], d.get("impact")
+                            d["freq"] += word_counts[w_id]
+                            d["mask"] |= term_masks[w_id]
+                            d["positions"].extend(positions[w_id])
+                            d["impact"] = self._impact(d["freq"], d["mask"])
+                            rollup_changes[w_id] = (
+                                word_counts[w_id],
+                                d["mask"] & ~old_mask,
+                                False,
+                                None if old_impact is None or d["impact"] is None
+                                else d["impact"] - old_impact,
+                            )
+                            logger.debug(
+                                f"Updated existing entry for doc_id {doc_id} in inverted index {inv_file}."
+                            )
+                            break
+                    else:
+                        docs.append(
+                            {
+                                "id": doc_id_int,
+                                "freq": word_counts[w_id],
+                                "mask": term_masks[w_id],
+                                "positions": positions[w_id],
+                                "impact": self._impact(word_counts[w_id], term_masks[w_id]),
+                            }
+                        )
+                        rollup_changes[w_id] = (
+                            word_counts[w_id],
+                            term_masks[w_id],
+                            True,
+                            docs[-1]["impact"],
+                        )
                         logger.debug(
-                            f"Updated existing entry for doc_id {doc_id} in inverted index {inv_file}."
+                            f"Added new entry for doc_id {doc_id} in inverted index {inv_file}."
                         )
-                        break
-
-                if not found:
-                    inv_idx[str(w_id)]["docs"].append(
-                        {
-                            "id": doc_id,
-                            "freq": cnt,
-                            "fields": list(field_matches.keys()),
-                            "positions": positions[w_id],
-                        }
-                    )
-                    logger.debug(
-                        f"Added new entry for doc_id {doc_id} in inverted index {inv_file}."
-                    )
-
+                    # Columns stay ordered by integer doc id for intersection
+                    inv_idx[str(w_id)], pos_idx[str(w_id)] = docs_entry(docs)
+                    if "impacts" not in inv_idx[str(w_id)]:
+                        # The rollup sums review impacts; keep it from diverging
+                        freq, bits, new_review, _ = rollup_changes[w_id]
+                        rollup_changes[w_id] = (freq, bits, new_review, None)
+
+                # Positions are stored in their own (unindented) stream,
+                # aligned with the postings
+                with open(pos_file, "w", encoding="utf-8-sig") as f:
+                    json.dump(pos_idx, f)
                 write_json(inv_file, inv_idx)
+                self.shard_cache.invalidate(inv_file)
+                self.positions_cache.invalidate(pos_file)
+                self.shard_paths.add(inv_file)
                 logger.debug(
-                    f"Updated inverted index file {inv_file} with word ID {w_id}."
+                    f"Updated inverted index file {inv_file} with {len(shard_word_ids)} word IDs."
                 )
+
+                if doc_type == "reviews":
+                    self._update_hotel_rollup(
+                        doc_id_int, self._shard_path(shard_word_ids[0], ROLLUP_DOC_TYPE),
+                        rollup_changes, shard_is_new,
+                    )
         except Exception as e:
             logger.error(
                 f"Error updating indices for doc_id={doc_id}: {e}", exc_info=True
             )
             raise
 
-# Initialize SearchEngine
+# Initialize SearchEngine; data is loaded by the lifespan handler
 search_engine = SearchEngine()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so the server binds immediately and /ready can
+    # report progress while the engine comes up.
+    loader = asyncio.create_task(search_engine.start())
+    yield
+    if not loader.done():
+        loader.cancel()
+    await run_in_threadpool(search_engine.append_log.flush)
+    search_engine.scoring.shutdown()
+
+
+async def cancel_on_disconnect(request: Request, task: asyncio.Task, deadline: Deadline):
+    """
+    Cancel task once the client of request disconnects. Work already
+    handed to threads stops at its next deadline check.
+    """
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info(f"Client disconnected; cancelling {request.url.path}.")
+            deadline.cancel()
+            task.cancel()
+            return
+        await asyncio.sleep(Config.DISCONNECT_POLL_INTERVAL)
+
+
+async def admit():
+    """Take an admission slot; raises a 503 with Retry-After when shed."""
+    try:
+        await search_engine.admission.acquire()
+    except Overloaded as e:
+        logger.warning(f"Shedding search: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Server overloaded; retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def admission_release():
+    """Releases the admission slot taken by admit() on its first call only."""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            search_engine.admission.release()
+
+    return release
+
+
+async def stream_until_disconnect(request: Request, lines: AsyncIterator[bytes], release):
+    """
+    lines, stopping the walk behind them once the client disconnects;
+    release is called when the stream ends, however it ends.
+    """
+    try:
+        async for chunk in lines:
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected; stopping {request.url.path}.")
+                break
+            yield chunk
+    finally:
+        await lines.aclose()
+        release()
+
+
+async def run_search(request: Request, work, deadline: Deadline):
+    """
+    Await the search coroutine work once admission control lets it run,
+    cancelling it if the client disconnects. Raises a 503 with Retry-After
+    when the search is shed and a 499 when its client has gone.
+    """
+    try:
+        await admit()
+    except HTTPException:
+        work.close()
+        raise
+    task = asyncio.create_task(work)
+    watcher = asyncio.create_task(cancel_on_disconnect(request, task, deadline))
+    try:
+        return await task
+    except HTTPException:
+        raise
+    except asyncio.CancelledError:
+        task.cancel()
+        if not deadline.cancelled:
+            raise
+        # Nobody is listening; 499 as in nginx's "client closed request"
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except Exception as e:
+        logger.error(f"Search error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+        search_engine.admission.release()
+
+
+def cache_headers(etag: str, etag_parts: tuple, cache_control: str) -> Dict[str, str]:
+    """
+    Headers of a response computed since etag was taken. If the generation
+    moved on meanwhile, the response may already show the newer data under
+    the older ETag, so it is sent without one and not stored.
+    """
+    if search_engine.etag(*etag_parts) != etag:
+        return {"Cache-Control": "no-store"}
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def require_loaded():
+    if not search_engine.loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Search engine is still loading",
+            headers={"Retry-After": "1"},
+        )
+
 ##################################
 # FastAPI Endpoints
 ##################################
 
-app = FastAPI(title="Hotel Search Engine")
+app = FastAPI(
+    title="Hotel Search Engine", lifespan=lifespan, default_response_class=FastJSONResponse
+)
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
-@app.get("/search")
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once data is loaded and caches are warm, 503 before.
+    Reports per-component load status and timings.
+    """
+    status = search_engine.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+def parse_projection(fields: Optional[str], ids_only: bool) -> Optional[List[str]]:
+    """The result fields asked for by the fields and ids_only parameters."""
+    if ids_only:
+        return ["hotel_id", "search_score"]
+    if fields:
+        return [f.strip() for f in fields.split(",") if f.strip()]
+    return None
+
+@app.get("/search", dependencies=[Depends(require_loaded)])
 async def search(
-    query: str = Query(..., description="Search query terms."),
+    request: Request,
+    query: Optional[str] = Query(None, description="Search query terms; required without a cursor."),
     doc_type: str = Query("all", description="Document type to search: all, hotels, reviews."),
     location: Optional[str] = Query(None, description="Filter results by locality (e.g., New York City)."),
-    hotel_class: Optional[int] = Query(None, description="Filter results by hotel class (e.g., 5 for 5-star hotels).")
+    hotel_class: Optional[int] = Query(None, description="Filter results by hotel class (e.g., 5 for 5-star hotels)."),
+    mode: str = Query("or", description="or: documents matching any term; and: documents matching every term."),
+    min_should_match: Optional[int] = Query(None, ge=1, description="With mode=or, minimum number of query terms a document must contain."),
+    timeout_ms: Optional[int] = Query(None, ge=1, le=Config.MAX_SEARCH_TIMEOUT_MS, description="Time budget in milliseconds; past it the best results so far are returned with partial=true."),
+    limit: int = Query(Config.SEARCH_PAGE_SIZE, ge=1, le=Config.MAX_RESULTS, description="Results per page."),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page; the other search parameters are then ignored."),
+    fields: Optional[str] = Query(None, description="Comma-separated result fields, e.g. name,locality,search_score; the doc id is always included."),
+    ids_only: bool = Query(False, description="Return just hotel_id (and rev_id for reviews) and search_score."),
 ):
     """
     Search endpoint that allows filtering by location and hotel_class.
     Location filter takes precedence over other filters.
     Supports partial matching for location (e.g., "New York" matches "New York City").
+    Results come in pages of `limit`; pass a page's next_cursor for the
+    next one. fields and ids_only trim the results to what the client
+    renders. The search is cancelled if the client disconnects. Under
+    overload it is refused with a 503 and Retry-After. Complete responses
+    carry a strong ETag; a conditional GET that still matches it gets a
+    304 without searching.
     """
+    if mode not in ("and", "or"):
+        raise HTTPException(status_code=400, detail="mode must be 'and' or 'or'")
+    if not query and not cursor:
+        raise HTTPException(status_code=400, detail="query or cursor is required")
+    projection = parse_projection(fields, ids_only)
+    cache_control = Config.CACHE_CONTROL["search"]
+    # The time budget only decides whether a response is partial, and
+    # partial responses get no ETag
+    etag_parts = (
+        "search",
+        sorted((k, v) for k, v in request.query_params.multi_items() if k != "timeout_ms"),
+    )
+    etag = search_engine.etag(*etag_parts)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    # Time spent waiting for admission counts against the budget
+    deadline = Deadline(timeout_ms or Config.SEARCH_TIMEOUT_MS)
+    if cursor:
+        work = search_engine.search_page(cursor, limit, deadline, projection)
+    else:
+        work = search_engine.search(
+            query,
+            doc_type,
+            location,
+            hotel_class,
+            mode,
+            min_should_match,
+            deadline,
+            limit,
+            projection,
+            # Repeating the search yields the same next_cursor, as a strong
+            # ETag requires
+            cursor_key=etag.strip('"'),
+        )
+    results = await run_search(request, work, deadline)
+    if results is None:
+        raise HTTPException(status_code=410, detail="Cursor expired; repeat the search")
+    logger.debug(f"Search returned {len(results['results'])} results.")
+    if results.get("partial"):
+        headers = {"Cache-Control": "no-store"}
+    else:
+        headers = cache_headers(etag, etag_parts, cache_control)
+    return FastJSONResponse(results, headers=headers)
+
+@app.post("/search/batch", dependencies=[Depends(require_loaded)])
+async def search_batch(request: Request, batch: SearchBatch):
+    """
+    Run many searches at once, e.g. for offline evaluation. Each query
+    takes /search's parameters and gets /search's response, in input
+    order. The queries are tokenized together and the index shards they
+    need are read once for the whole batch. The batch is admitted as one
+    search and shares one time budget.
+    """
+    queries = [
+        {
+            "query": q.query,
+            "doc_type": q.doc_type,
+            "location": q.location,
+            "hotel_class": q.hotel_class,
+            "mode": q.mode,
+            "min_should_match": q.min_should_match,
+            "limit": q.limit,
+            "fields": parse_projection(q.fields, q.ids_only),
+        }
+        for q in batch.queries
+    ]
+    deadline = Deadline(batch.timeout_ms or Config.SEARCH_TIMEOUT_MS)
+    results = await run_search(request, search_engine.search_batch(queries, deadline), deadline)
+    return FastJSONResponse({"results": results, "count": len(results)})
+
+@app.get("/search/stream", dependencies=[Depends(require_loaded)])
+async def search_stream(
+    request: Request,
+    query: str = Query(..., description="Search query terms."),
+    doc_type: str = Query("all", description="Document type to search: all, hotels, reviews."),
+    location: Optional[str] = Query(None, description="Filter results by locality (e.g., New York City)."),
+    hotel_class: Optional[int] = Query(None, description="Filter results by hotel class (e.g., 5 for 5-star hotels)."),
+    mode: str = Query("or", description="or: documents matching any term; and: documents matching every term (reviews only)."),
+    min_should_match: Optional[int] = Query(None, ge=1, description="With mode=or, minimum number of query terms a document must contain (reviews only)."),
+    fields: Optional[str] = Query(None, description="Comma-separated result fields, e.g. name,locality,search_score; the doc id is always included."),
+    ids_only: bool = Query(False, description="Return just hotel_id (and rev_id for reviews) and search_score."),
+):
+    """
+    Export every match of a search as NDJSON, one result per line, scored
+    as /search scores them but in doc id order rather than ranked, and
+    without its MAX_RESULTS cap. Results are sent as they are found, so
+    the first lines arrive at once and memory stays flat however many
+    docs match. Quoted phrases are not supported. Streams hold an
+    admission slot until they end, and stop when the client disconnects.
+    """
+    if mode not in ("and", "or"):
+        raise HTTPException(status_code=400, detail="mode must be 'and' or 'or'")
+    await admit()
+    release = admission_release()
     try:
-        results = await search_engine.search(query, doc_type, location, hotel_class)
-        logger.debug(f"Search returned {len(results['results'])} results.")
-        return results
-    except Exception as e:
-        logger.error(f"Search error: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
+        lines = await search_engine.stream_search(
+            query,
+            doc_type,
+            location,
+            hotel_class,
+            mode,
+            min_should_match,
+            parse_projection(fields, ids_only),
+        )
+    except ValueError as e:
+        release()
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        release()
+        raise
+    # The background release covers a client gone before the first line
+    return StreamingResponse(
+        stream_until_disconnect(request, lines, release),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(release),
+    )
 
-@app.get("/hotels/{hotel_id}")
-async def get_hotel(hotel_id: int):
+@app.get("/metrics")
+async def metrics():
+    """Admission counters of this server worker, in Prometheus text format."""
+    lines = search_engine.admission.metrics("hotel_search")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/suggest", dependencies=[Depends(require_loaded)])
+async def suggest(
+    prefix: str = Query(..., min_length=1, description="Start of the word being typed."),
+    k: int = Query(SUGGEST_TOP_K, ge=1, le=SUGGEST_TOP_K, description="Number of completions."),
+):
+    """
+    Autocomplete: the k most frequent lexicon terms starting with prefix.
+    Answered from precomputed completion lists; the inverted index is not read.
+    """
+    if search_engine.suggester is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Completion lists are still loading",
+            headers={"Retry-After": "1"},
+        )
+    prefix = prefix.strip().lower()
+    completions = search_engine.suggester.suggest(search_engine.lexicon, prefix, k)
+    return {
+        "prefix": prefix,
+        "suggestions": [{"term": t, "doc_freq": df} for t, df in completions],
+    }
+
+@app.get("/hotels/{hotel_id}", dependencies=[Depends(require_loaded)])
+async def get_hotel(request: Request, hotel_id: int):
     """
     Return single hotel info plus reviews from the correct chunk.
+    A conditional GET whose ETag still matches gets a 304.
     """
+    cache_control = Config.CACHE_CONTROL["hotel"]
+    etag_parts = ("hotel", hotel_id)
+    etag = search_engine.etag(*etag_parts)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
     try:
         hotels_df = search_engine.get_hotels_df()
         row = hotels_df[hotels_df["hotel_id"] == hotel_id]
@@ -1111,12 +2484,12 @@ async def get_hotel(hotel_id: int):
         if cached_reviews is not None:
             hotel_data["reviews"] = cached_reviews
             logger.debug(f"Returned cached reviews for hotel ID {hotel_id}.")
-            return clean_float_values(hotel_data)
+            return FastJSONResponse(hotel_data, headers=cache_headers(etag, etag_parts, cache_control))
 
         batch_file = search_engine._get_review_batch_file(hotel_id)
         reviews = []
-        if os.path.exists(batch_file):
-            df = read_csv(batch_file)
+        if batch_exists(batch_file):
+            df = read_with_delta(batch_file, "rev_id")
             sub = df[df["hotel_id"] == hotel_id]
             if not sub.empty:
                 reviews = sub.to_dict("records")
@@ -1125,22 +2498,20 @@ async def get_hotel(hotel_id: int):
         hotel_data["reviews"] = reviews
         await search_engine.document_cache.set(cache_key, reviews)
         logger.debug(f"Cached reviews for hotel ID {hotel_id}.")
-        return clean_float_values(hotel_data)
+        return FastJSONResponse(hotel_data, headers=cache_headers(etag, etag_parts, cache_control))
 
     except Exception as e:
         logger.error(f"Error fetching hotel: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/hotels", status_code=201)
+@app.post("/hotels", status_code=201, dependencies=[Depends(require_loaded)])
 async def create_hotel(hotel: HotelCreate, background_tasks: BackgroundTasks):
     """
     Create a single hotel and index it.
     """
     try:
         logger.info(f"Creating hotel: {hotel}")
-        hotels_df = search_engine.get_hotels_df()
         h_data = hotel.dict(by_alias=True)
-        h_data["hotel_id"] = len(hotels_df) + 1
 
         if not h_data.get("average_score"):
             sc = []
@@ -1157,12 +2528,10 @@ async def create_hotel(hotel: HotelCreate, background_tasks: BackgroundTasks):
                     sc.append(h_data[ff])
             if sc:
                 h_data["average_score"] = round(sum(sc) / len(sc), 1)
-                logger.debug(f"Computed average_score for hotel ID {h_data['hotel_id']}: {h_data['average_score']}")
+                logger.debug(f"Computed average_score for new hotel: {h_data['average_score']}")
 
-        newdf = pd.DataFrame([h_data])
-        updated_df = pd.concat([hotels_df, newdf], ignore_index=True)
-        write_csv(Config.HOTELS_PATH, updated_df)
-        search_engine.reload_data()
+        await search_engine.add_hotels([h_data])
+        search_engine.bump_generation()
 
         text_for_index = (
             f"{h_data['name']} "
@@ -1194,7 +2563,7 @@ async def create_hotel(hotel: HotelCreate, background_tasks: BackgroundTasks):
         logger.error(f"Error creating hotel: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/reviews", status_code=201)
+@app.post("/reviews", status_code=201, dependencies=[Depends(require_loaded)])
 async def create_review(review: ReviewCreate, background_tasks: BackgroundTasks):
     """
     Create a single review and index it.
@@ -1212,14 +2581,10 @@ async def create_review(review: ReviewCreate, background_tasks: BackgroundTasks)
         search_engine.rev_to_hotel[rev_id] = review.hotel_id
         logger.debug(f"Mapping review ID {rev_id} to hotel ID {review.hotel_id}.")
 
-        start = ((review.hotel_id - 1) // Config.REVIEW_BATCH_SIZE) * Config.REVIEW_BATCH_SIZE + 1
-        end = start + Config.REVIEW_BATCH_SIZE - 1
-        chunk_file = f"{Config.REVIEWS_DIR}/reviews_{start}-{end}.csv"
-
-        existing = read_csv(chunk_file) if os.path.exists(chunk_file) else pd.DataFrame()
-        newdf = pd.concat([existing, pd.DataFrame([r_dict])], ignore_index=True)
-        write_csv(chunk_file, newdf)
-        logger.debug(f"Added review ID {rev_id} to {chunk_file}.")
+        chunk_file = search_engine._get_review_batch_file(review.hotel_id)
+        await search_engine.append_log.append_async(chunk_file, [r_dict], "rev_id")
+        search_engine.bump_generation()
+        logger.debug(f"Appended review ID {rev_id} to {chunk_file}.")
 
         text_for_index = f"{review.title} {review.text}"
         fields_dict = {"title": review.title, "text": review.text}
@@ -1243,166 +2608,239 @@ async def create_review(review: ReviewCreate, background_tasks: BackgroundTasks)
         logger.error(f"Error creating review: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/hotels/upload", status_code=201)
-async def upload_hotels(
-    file: UploadFile = File(...), background_tasks: BackgroundTasks = BackgroundTasks()
-):
+AVERAGE_SCORE_COLUMNS = [
+    "service",
+    "cleanliness",
+    "overall",
+    "value",
+    "location",
+    "sleep_quality",
+    "rooms",
+]
+
+
+async def iter_csv_chunks(file: UploadFile, **read_csv_kwargs):
     """
-    Bulk upload hotels and index them.
+    Parse an uploaded CSV incrementally from its spooled file, yielding
+    DataFrames of at most Config.UPLOAD_CHUNK_ROWS rows.
     """
+    await file.seek(0)
+    reader = await run_in_threadpool(
+        pd.read_csv,
+        file.file,
+        chunksize=Config.UPLOAD_CHUNK_ROWS,
+        encoding="utf-8-sig",
+        **read_csv_kwargs,
+    )
     try:
-        logger.info("Starting bulk upload of hotels.")
-        content = await file.read()
-        # Run read_csv in threadpool to avoid blocking
-        df = await run_in_threadpool(
-            pd.read_csv, io.StringIO(content.decode("utf-8-sig"))
-        )
-        hotels_df = await run_in_threadpool(search_engine.get_hotels_df)
-        start_id = len(hotels_df) + 1
-        df["hotel_id"] = range(start_id, start_id + len(df))
-
-        # Compute average_score where missing using vectorized operations
-        avg_score_cols = [
-            "service",
-            "cleanliness",
-            "overall",
-            "value",
-            "location",
-            "sleep_quality",
-            "rooms",
-        ]
-        # Calculate mean across the specified columns, ignoring NaNs
-        df["average_score"] = df.apply(
-            lambda row: round(row[avg_score_cols].mean(), 1) if pd.isna(row.get("average_score", np.nan)) else row["average_score"],
-            axis=1
-        )
-        logger.debug("Computed average_score for missing entries.")
+        while True:
+            chunk = await run_in_threadpool(next, reader, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        reader.close()
 
-        updated_df = pd.concat([hotels_df, df], ignore_index=True)
-        await run_in_threadpool(write_csv, Config.HOTELS_PATH, updated_df)
-        await run_in_threadpool(search_engine.reload_data)
 
-        # Prepare data for indexing
-        hotels_to_index = df.to_dict("records")
-        for hotel in hotels_to_index:
-            h_id = int(hotel["hotel_id"])
-            text_for_index = (
-                f"{hotel['name']} "
-                f"{hotel['locality']} "
-                f"{hotel['street-address']} "
-                f"{hotel['region']}"
-            )
-            fields_dict = {
-                "name": hotel["name"],
-                "locality": hotel["locality"],
-                "street-address": hotel["street-address"],
-                "region": hotel["region"],
-            }
-            background_tasks.add_task(
-                search_engine.update_indices,
-                str(h_id),
-                text_for_index,
-                "hotels",
-                fields_dict,
-            )
-            logger.debug(f"Scheduled indexing for hotel ID {h_id}.")
+def fill_average_score(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill missing average_score with the row mean of the rating columns."""
+    cols = [c for c in AVERAGE_SCORE_COLUMNS if c in df.columns]
+    mean = df[cols].mean(axis=1).round(1) if cols else np.nan
+    if "average_score" in df.columns:
+        df["average_score"] = df["average_score"].fillna(mean)
+    else:
+        df["average_score"] = mean
+    return df
+
 
-        logger.info(f"Bulk upload of {len(df)} hotels completed and indexing tasks scheduled.")
+@app.post("/hotels/upload", status_code=201, dependencies=[Depends(require_loaded)])
+async def upload_hotels(file: UploadFile = File(...)):
+    """
+    Bulk upload hotels and index them.
+    The file is parsed, stored and handed to the indexer chunk by chunk.
+    """
+    hotel_ids = []
+    try:
+        logger.info("Starting bulk upload of hotels.")
+        required = {"name", "locality", "street-address", "region"}
+
+        async for df in iter_csv_chunks(file):
+            missing_cols = required - set(df.columns)
+            if missing_cols:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Missing columns: {sorted(missing_cols)}",
+                )
+            df = fill_average_score(df)
+
+            hotels_to_index = df.to_dict("records")
+            chunk_ids = await search_engine.add_hotels(hotels_to_index)
+            hotel_ids.extend(chunk_ids)
+
+            docs = []
+            for hotel in hotels_to_index:
+                text_for_index = (
+                    f"{hotel['name']} "
+                    f"{hotel['locality']} "
+                    f"{hotel['street-address']} "
+                    f"{hotel['region']}"
+                )
+                fields_dict = {
+                    "name": hotel["name"],
+                    "locality": hotel["locality"],
+                    "street-address": hotel["street-address"],
+                    "region": hotel["region"],
+                }
+                docs.append((str(hotel["hotel_id"]), text_for_index, fields_dict))
+            await search_engine.schedule_indexing(docs, "hotels")
+            logger.debug(f"Stored {len(docs)} hotels and scheduled their indexing.")
+
+        logger.info(f"Bulk upload of {len(hotel_ids)} hotels completed and indexing tasks scheduled.")
         return {
             "status": "success",
-            "message": f"Added {len(df)} hotels",
-            "hotel_ids": [int(x) for x in df["hotel_id"].values],
+            "message": f"Added {len(hotel_ids)} hotels",
+            "hotel_ids": hotel_ids,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading hotels: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Once for the upload; each indexed chunk bumps it again
+        if hotel_ids:
+            search_engine.bump_generation()
 
 
-@app.post("/reviews/upload", status_code=201)
-async def upload_reviews(
-    file: UploadFile = File(...), background_tasks: BackgroundTasks = BackgroundTasks()
-):
+@app.post("/reviews/upload", status_code=201, dependencies=[Depends(require_loaded)])
+async def upload_reviews(file: UploadFile = File(...)):
     """
     Bulk upload reviews and index them.
+    A first pass over the hotel_id column validates the whole file; the
+    second pass stores and indexes it chunk by chunk.
     """
+    updated_hotels = set()
     try:
         logger.info("Starting bulk upload of reviews.")
-        content = await file.read()
-        # Run read_csv in threadpool to avoid blocking
-        df = await run_in_threadpool(
-            pd.read_csv, io.StringIO(content.decode("utf-8-sig"))
-        )
         hotels_df = await run_in_threadpool(search_engine.get_hotels_df)
+        known_hotels = hotels_df["hotel_id"]
 
         # Check all hotel IDs exist
-        hotel_ids = set(hotels_df["hotel_id"].astype(str))
-        missing = [h for h in df["hotel_id"].unique() if str(h) not in hotel_ids]
+        missing = set()
+        async for ids in iter_csv_chunks(file, usecols=["hotel_id"]):
+            unknown = ids.loc[~ids["hotel_id"].isin(known_hotels), "hotel_id"]
+            missing.update(unknown.unique().tolist())
         if missing:
             logger.debug(f"Missing hotel IDs in bulk review upload: {missing}")
             raise HTTPException(
-                status_code=404, detail=f"Some hotel_ids do not exist: {missing}"
+                status_code=404, detail=f"Some hotel_ids do not exist: {sorted(missing)}"
             )
 
-        updated_hotels = set()
-
-        # Assign rev_id and map to hotel_id using vectorized operations
-        rev_ids = await run_in_threadpool(search_engine._get_next_rev_id)
-        # To handle multiple rev_ids, it's better to process in batches
-        with search_engine.rev_id_lock:
-            current_rev_id = search_engine.current_rev_id
-            df["rev_id"] = range(current_rev_id + 1, current_rev_id + 1 + len(df))
-            search_engine.current_rev_id += len(df)
-            search_engine._persist_rev_id()
-
-        # Map rev_id to hotel_id
-        rev_to_hotel_map = dict(zip(df["rev_id"], df["hotel_id"]))
-        search_engine.rev_to_hotel.update(rev_to_hotel_map)
-        updated_hotels.update(df["hotel_id"].unique())
-        logger.debug(f"Mapped review IDs to hotel IDs.")
-
-        # Group reviews by hotel_id for batch processing
-        grouped = df.groupby("hotel_id")
-        for h_id, group in grouped:
-            start = (
-                (h_id - 1) // Config.REVIEW_BATCH_SIZE
-            ) * Config.REVIEW_BATCH_SIZE + 1
-            end = start + Config.REVIEW_BATCH_SIZE - 1
-            chunk_file = f"{Config.REVIEWS_DIR}/reviews_{start}-{end}.csv"
-            existing = await run_in_threadpool(
-                read_csv, chunk_file
-            ) if os.path.exists(chunk_file) else pd.DataFrame()
-            newdf = pd.concat([existing, group], ignore_index=True)
-            await run_in_threadpool(write_csv, chunk_file, newdf)
-            logger.debug(f"Added {len(group)} reviews to {chunk_file}.")
-
-        # Prepare data for indexing
-        reviews_to_index = df.to_dict("records")
-        for review in reviews_to_index:
-            doc_id = str(review["rev_id"])
-            text_for_index = f"{review['title']} {review['text']}"
-            fields_dict = {"title": review["title"], "text": review["text"]}
-            background_tasks.add_task(
-                search_engine.update_indices,
-                doc_id,
-                text_for_index,
-                "reviews",
-                fields_dict
+        total = 0
+
+        async for df in iter_csv_chunks(file):
+            # Assign rev_ids from the reserved block; at most one file write
+            df["rev_id"] = search_engine.rev_ids.next_ids(len(df))
+
+            # Map rev_id to hotel_id
+            search_engine.rev_to_hotel.update(
+                zip(df["rev_id"].tolist(), df["hotel_id"].astype(int).tolist())
             )
-            logger.debug(f"Scheduled indexing for review ID {doc_id}.")
+            updated_hotels.update(df["hotel_id"].unique().tolist())
+
+            # Group reviews by batch file; the appends are committed together
+            batch_rows = defaultdict(list)
+            for h_id, group in df.groupby("hotel_id"):
+                chunk_file = search_engine._get_review_batch_file(int(h_id))
+                batch_rows[chunk_file].extend(group.to_dict("records"))
+            await asyncio.gather(
+                *(
+                    search_engine.append_log.append_async(chunk_file, rows, "rev_id")
+                    for chunk_file, rows in batch_rows.items()
+                )
+            )
+
+            docs = [
+                (
+                    str(review["rev_id"]),
+                    f"{review['title']} {review['text']}",
+                    {"title": review["title"], "text": review["text"]},
+                )
+                for rows in batch_rows.values()
+                for review in rows
+            ]
+            await search_engine.schedule_indexing(docs, "reviews")
+            total += len(df)
+            logger.debug(f"Stored {len(df)} reviews and scheduled their indexing.")
 
         # Invalidate caches for all hotels that got new reviews
         for h_id in updated_hotels:
             await search_engine.document_cache.delete(f"reviews:{h_id}")
             logger.debug(f"Invalidated cache for reviews of hotel ID {h_id}.")
 
-        logger.info(f"Bulk upload of {len(df)} reviews completed and indexing tasks scheduled.")
-        return {"status": "success", "message": f"Added {len(df)} reviews"}
+        logger.info(f"Bulk upload of {total} reviews completed and indexing tasks scheduled.")
+        return {"status": "success", "message": f"Added {total} reviews"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error uploading reviews: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Once for the upload; each indexed chunk bumps it again
+        if updated_hotels:
+            search_engine.bump_generation()
 
-if __name__ == "__main__":
-    import uvicorn
+@app.post("/admin/reload", dependencies=[Depends(require_loaded)])
+async def admin_reload():
+    """
+    Re-read lexicon, hotels and reviews from disk, e.g. after an offline
+    index rebuild.
+    """
+    try:
+        await run_in_threadpool(search_engine.reload_data)
+        await search_engine.document_cache.clear()
+        search_engine.bump_generation()
+        return {"status": "success", "message": "Search engine data reloaded"}
+    except Exception as e:
+        logger.error(f"Error reloading data: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+def build_snapshot(path: str = Config.SNAPSHOT_PATH):
+    """Load the engine data from the source files and write a snapshot."""
+    engine = SearchEngine()
+    engine._load_lexicon()
+    engine._load_hotels()
+    engine._rebuild_rev_to_hotel_from_disk()
+    engine._load_sentiment_scores()
+    engine._scan_shards()
+    engine.write_snapshot(path)
+    print(f"Snapshot written to {path}")
+
+def build_hotel_rollup():
+    """Roll the review shards up per hotel, after (re)building the inverted index."""
+    engine = SearchEngine()
+    engine._rebuild_rev_to_hotel_from_disk()
+    write_hotel_rollup(Config.INVERTED_INDEX_PATH, engine._review_hotels, FIELD_BITS)
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        build_snapshot()
+    elif len(sys.argv) > 1 and sys.argv[1] == "reimpact":
+        # After changing SCORING_PARAMS; reuses the stored freqs and masks
+        reimpact_index(
+            Config.INVERTED_INDEX_PATH,
+            Config.SCORING_PARAMS,
+            mask_weight_table(Config.SCORING_PARAMS["field_weights"]),
+            FIELDS,
+        )
+        # The rollup's impacts are sums of the review impacts
+        build_hotel_rollup()
+    elif len(sys.argv) > 1 and sys.argv[1] == "rollup":
+        build_hotel_rollup()
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host="0.0.0.0", port=8000)
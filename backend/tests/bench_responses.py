@@ -0,0 +1,112 @@
+"""
+Per-response serialization cost of /search payloads: the previous path
+(clean_float_values, then FastAPI's jsonable_encoder, then JSONResponse's
+json.dumps) against FastJSONResponse. Run from backend/:
+
+    python tests/bench_responses.py
+"""
+import json
+import math
+import os
+import random
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from utils.responses import FastJSONResponse
+
+
+def clean_float_values(obj):
+    # As removed from utils/scoring.py
+    if isinstance(obj, dict):
+        return {k: clean_float_values(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_float_values(x) for x in obj]
+    elif isinstance(obj, float):
+        if np.isnan(obj) or np.isinf(obj):
+            return None
+        return obj
+    return obj
+
+
+def hotel_result(i: int, rng: random.Random) -> dict:
+    return {
+        "hotel_id": i,
+        "name": f"Hotel {i}",
+        "region_id": rng.randint(1, 50),
+        "region": "NY",
+        "street-address": f"{rng.randint(1, 999)} Park Avenue",
+        "locality": "New York City",
+        "hotel_class": rng.choice([3.0, 4.0, 5.0, math.nan]),
+        "service": rng.random() * 5,
+        "cleanliness": rng.random() * 5,
+        "overall": rng.choice([rng.random() * 5, math.nan]),
+        "value": rng.random() * 5,
+        "location": rng.random() * 5,
+        "sleep_quality": math.nan,
+        "rooms": rng.random() * 5,
+        "review_count": rng.randint(0, 2000),
+        "search_score": rng.random() * 10,
+        "matched_fields": ["name", "locality"],
+        "matched_terms": ["clean", "room"],
+        "sentiment_score": rng.uniform(-1, 1),
+    }
+
+
+def review_result(i: int, rng: random.Random) -> dict:
+    words = ["clean", "room", "staff", "friendly", "breakfast", "view", "noisy", "street"]
+    return {
+        "rev_id": i,
+        "hotel_id": rng.randint(1, 500),
+        "title": "Great stay",
+        "text": " ".join(rng.choice(words) for _ in range(120)),
+        "overall": rng.choice([rng.random() * 5, math.nan]),
+        "search_score": rng.random() * 10,
+        "matched_fields": ["text"],
+        "matched_terms": ["clean", "room"],
+        "sentiment_score": rng.uniform(-1, 1),
+    }
+
+
+def response(results: list) -> dict:
+    return {
+        "results": results,
+        "count": len(results),
+        "total_matches": 5000,
+        "corrections": {},
+        "partial": False,
+        "next_cursor": "abc.50",
+    }
+
+
+def previous(content: dict) -> bytes:
+    content = {**content, "results": [clean_float_values(r) for r in content["results"]]}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def current(content: dict) -> bytes:
+    return FastJSONResponse(content).body
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    cases = {
+        "500 hotels": response([hotel_result(i, rng) for i in range(500)]),
+        "50 hotels": response([hotel_result(i, rng) for i in range(50)]),
+        "50 reviews": response([review_result(i, rng) for i in range(50)]),
+    }
+    for name, content in cases.items():
+        assert json.loads(previous(content)) == json.loads(current(content))
+        runs = 50
+        before = min(timeit.repeat(lambda: previous(content), number=runs, repeat=5)) / runs
+        after = min(timeit.repeat(lambda: current(content), number=runs, repeat=5)) / runs
+        print(
+            f"{name:>12}: {before * 1000:7.3f} ms -> {after * 1000:7.3f} ms "
+            f"({before / after:.1f}x), {len(previous(content))} -> {len(current(content))} bytes"
+        )
@@ -0,0 +1,135 @@
+"""
+AdmissionController: admission order, shedding, and CoDel's switch from
+`interval` to `target` once a queue stands. Run from backend/:
+
+    python -m pytest tests/test_admission.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.admission import AdmissionController, Overloaded
+
+
+def controller(**kwargs):
+    params = dict(max_in_flight=1, max_queue=4, target=0.02, interval=0.3, retry_after=3)
+    params.update(kwargs)
+    return AdmissionController(**params)
+
+
+def test_waiters_are_admitted_in_order():
+    async def run():
+        admission = controller(max_in_flight=2)
+        await admission.acquire()
+        await admission.acquire()
+        order = []
+
+        async def wait(name):
+            await admission.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(n)) for n in "abc"]
+        await asyncio.sleep(0.01)
+        assert admission.in_flight == 2 and len(admission.waiters) == 3
+        for _ in range(3):
+            admission.release()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*waiters)
+        assert order == ["a", "b", "c"]
+        assert admission.in_flight == 2
+        admission.release()
+        admission.release()
+        assert admission.in_flight == 0 and admission.admitted == 5
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_shed_at_once():
+    async def run():
+        admission = controller(max_queue=2)
+        await admission.acquire()
+        waiters = [asyncio.create_task(admission.acquire()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as shed:
+            await admission.acquire()
+        assert shed.value.reason == "queue_full" and shed.value.retry_after == 3
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        assert not admission.waiters and admission.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_burst_waiters_get_the_interval():
+    async def run():
+        admission = controller(interval=0.1)
+        await admission.acquire()
+        start = time.monotonic()
+        with pytest.raises(Overloaded) as shed:
+            await admission.acquire()
+        assert shed.value.reason == "queue_timeout"
+        assert time.monotonic() - start >= 0.09
+        assert admission.shed == {"queue_full": 0, "queue_timeout": 1}
+
+    asyncio.run(run())
+
+
+def test_standing_queue_switches_to_target():
+    async def run():
+        admission = controller(target=0.02, interval=0.3)
+        await admission.acquire()
+        # Waiters keep the queue from draining for longer than an interval
+        first = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.2)
+        second = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.15)
+        assert admission.overloaded(time.monotonic())
+
+        start = time.monotonic()
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        assert time.monotonic() - start < 0.1  # target, not interval
+
+        await asyncio.gather(first, second, return_exceptions=True)
+        assert not admission.waiters
+        # Once the queue has drained, bursts get the interval again
+        assert not admission.overloaded(time.monotonic())
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def run():
+        admission = controller()
+        await admission.acquire()
+        leaving = asyncio.create_task(admission.acquire())
+        staying = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        await asyncio.sleep(0.01)
+        admission.release()
+        await staying
+        assert admission.in_flight == 1 and not admission.waiters
+
+    asyncio.run(run())
+
+
+def test_metrics():
+    async def run():
+        admission = controller(max_queue=0)
+        await admission.acquire()
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+        return admission.metrics("search")
+
+    lines = asyncio.run(run())
+    assert "search_in_flight 1" in lines
+    assert "search_admitted_total 1" in lines
+    assert 'search_shed_total{reason="queue_full"} 1' in lines
+    assert "search_queue_seconds_count 1" in lines
@@ -0,0 +1,55 @@
+"""
+CursorCache: TTL expiry and LRU eviction. Run from backend/:
+
+    python -m pytest tests/test_cursor_cache.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils import batch_cache
+from utils.batch_cache import CursorCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_put_and_get():
+    cache = CursorCache()
+    key = cache.put([1, 2, 3])
+    assert cache.get(key) == [1, 2, 3]
+    assert cache.get("unknown") is None
+    assert cache.put("ranking", key="fixed") == "fixed"
+    assert cache.get("fixed") == "ranking"
+    assert cache.put("other") != key
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(batch_cache.time, "monotonic", clock)
+    cache = CursorCache(ttl=60)
+    key = cache.put("ranking")
+
+    clock.now += 59
+    assert cache.get(key) == "ranking"  # reads do not extend the ttl
+    clock.now += 2
+    assert cache.get(key) is None
+    assert key not in cache.entries
+
+
+def test_least_recently_used_is_evicted():
+    cache = CursorCache(max_entries=3)
+    a, b, c = (cache.put(v) for v in "abc")
+    assert cache.get(a) == "a"  # b is now the least recently used
+
+    d = cache.put("d")
+
+    assert cache.get(b) is None
+    assert [cache.get(k) for k in (a, c, d)] == ["a", "c", "d"]
+    assert len(cache.entries) == 3
@@ -0,0 +1,34 @@
+"""
+Index generation file: shared by every reader of the index and kept across
+restarts. Run from backend/:
+
+    python -m pytest tests/test_generation.py
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.generation import Generation, bump_generation, generation_path
+
+
+def test_bumps_are_seen_by_other_readers(tmp_path):
+    path = generation_path(str(tmp_path))
+    writer, reader = Generation(path), Generation(path)
+    assert reader.current() == (0, 0)
+
+    writer.bump()
+    seen = reader.current()
+    assert seen[0] == 1
+
+    bump_generation(path)  # e.g. an offline index build
+    assert reader.current()[0] == 2
+    assert reader.current() != seen
+
+
+def test_generation_survives_a_restart(tmp_path):
+    path = generation_path(str(tmp_path))
+    for _ in range(3):
+        Generation(path).bump()
+    assert Generation(path).current()[0] == 3
+    assert not [fn for fn in os.listdir(tmp_path) if fn.endswith(".tmp")]
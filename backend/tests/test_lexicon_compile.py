@@ -0,0 +1,57 @@
+"""
+compile_lexicon folding runtime additions into lexicon.json. Run from
+backend/:
+
+    python -m pytest tests/test_lexicon_compile.py
+"""
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.lexicon_loader import additions_path, compile_lexicon
+
+
+def write_lexicon(tmp_path, mapping, additions):
+    path = str(tmp_path / "lexicon.json")
+    with open(path, "w", encoding="utf-8-sig") as f:
+        json.dump(mapping, f)
+    with open(additions_path(path), "w", encoding="utf-8") as f:
+        for term, word_id in additions:
+            f.write(json.dumps([term, word_id]) + "\n")
+    return path
+
+
+def test_additions_keep_their_ids_without_a_rebuild(tmp_path):
+    path = write_lexicon(tmp_path, {"hotel": 0, "room": 1}, [("sunny", 2), ("beach", 3)])
+
+    lexicon = compile_lexicon(path)
+
+    assert [lexicon[t] for t in ["hotel", "room", "sunny", "beach"]] == [0, 1, 2, 3]
+    assert not os.path.exists(additions_path(path))
+
+
+def test_rebuilt_lexicon_gives_additions_fresh_ids(tmp_path):
+    # The rebuild numbered its terms from 0 again; "sunny" had id 2 before
+    path = write_lexicon(
+        tmp_path,
+        {"beach": 0, "hotel": 1, "room": 2, "view": 3},
+        [("sunny", 2), ("beach", 3), ("lake", 9)],
+    )
+
+    lexicon = compile_lexicon(path, rebuilt=True)
+
+    ids = {t: lexicon[t] for t in ["beach", "hotel", "room", "view", "sunny", "lake"]}
+    assert ids["beach"] == 0
+    assert sorted([ids["sunny"], ids["lake"]]) == [4, 5]
+    assert len(set(ids.values())) == len(ids)
+
+
+def test_colliding_addition_is_renumbered(tmp_path):
+    path = write_lexicon(tmp_path, {"hotel": 0, "room": 1}, [("sunny", 1)])
+
+    lexicon = compile_lexicon(path)
+
+    assert lexicon["room"] == 1
+    assert lexicon["sunny"] == 2
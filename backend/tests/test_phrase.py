@@ -0,0 +1,85 @@
+"""
+phrase_gap for quoted phrases and "..."~N proximity, against a brute-force
+search over position choices, and at field boundaries. Run from backend/:
+
+    python -m pytest tests/test_phrase.py
+"""
+import itertools
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.postings import FIELD_POSITION_GAP, phrase_gap
+from utils.query_parser import MAX_SLOP
+
+
+def brute_force(positions, slop):
+    if not positions or any(not p for p in positions):
+        return None
+    if slop == 0:
+        starts = positions[0]
+        ok = any(all(s + i in set(p) for i, p in enumerate(positions)) for s in starts)
+        return 0 if ok else None
+    extra = min(
+        max(0, max(choice) - min(choice) - (len(positions) - 1))
+        for choice in itertools.product(*positions)
+    )
+    return extra if extra <= slop else None
+
+
+def field_positions(fields):
+    """term -> positions, numbered the way the indexer numbers them."""
+    positions, offset = {}, 0
+    for words in fields:
+        for pos, word in enumerate(words, offset):
+            positions.setdefault(word, []).append(pos)
+        offset += len(words) + FIELD_POSITION_GAP
+    return positions
+
+
+def test_exact_phrase():
+    assert phrase_gap([[3], [4]]) == 0
+    assert phrase_gap([[4], [3]]) is None  # out of order
+    assert phrase_gap([[3], [5]]) is None
+    assert phrase_gap([[1, 7], [2, 9], [3]]) == 0
+    assert phrase_gap([[1], []]) is None
+    assert phrase_gap([[5, 9]]) == 0
+
+
+def test_proximity():
+    assert phrase_gap([[3], [5]], slop=1) == 1
+    assert phrase_gap([[3], [6]], slop=1) is None
+    assert phrase_gap([[5], [3]], slop=1) == 1  # any order within the window
+    assert phrase_gap([[4], [3]], slop=1) == 0
+    assert phrase_gap([[0, 40], [20, 43], [44]], slop=2) == 2
+
+
+def test_matches_brute_force():
+    rng = random.Random(5)
+    for _ in range(2000):
+        n_terms = rng.randint(1, 4)
+        positions = [sorted(rng.sample(range(30), rng.randint(0, 4))) for _ in range(n_terms)]
+        slop = rng.choice([0, 0, 1, 2, 5])
+        assert phrase_gap(positions, slop) == brute_force(positions, slop), (positions, slop)
+
+
+def test_phrases_do_not_span_fields():
+    # "free" ends the title, "parking" starts the text
+    positions = field_positions([["great", "free"], ["parking", "nearby"]])
+    free, parking = positions["free"], positions["parking"]
+    assert phrase_gap([free, parking]) is None
+    assert phrase_gap([free, parking], slop=MAX_SLOP) is None
+    # Within one field they still match
+    positions = field_positions([["great"], ["free", "parking", "nearby"]])
+    assert phrase_gap([positions["free"], positions["parking"]]) == 0
+
+
+def test_field_gap_exceeds_max_slop():
+    # Otherwise a proximity query could join the end of one field with the
+    # start of the next
+    positions = field_positions([["a", "b", "c"], ["d"]])
+    gap = positions["d"][0] - positions["c"][0] - 1
+    assert gap > MAX_SLOP
+    assert phrase_gap([positions["c"], positions["d"]], slop=gap) == gap
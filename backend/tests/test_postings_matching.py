@@ -0,0 +1,65 @@
+"""
+gallop, intersect and at_least (mode=and, min_should_match) against set
+arithmetic. Run from backend/:
+
+    python -m pytest tests/test_postings_matching.py
+"""
+import os
+import random
+import sys
+from bisect import bisect_left
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.postings import at_least, gallop, intersect
+
+
+def random_lists(rng, n_lists, universe):
+    return [
+        sorted(rng.sample(range(universe), rng.randint(0, universe // 2)))
+        for _ in range(n_lists)
+    ]
+
+
+def test_gallop_matches_bisect():
+    rng = random.Random(1)
+    for _ in range(500):
+        ids = sorted(rng.sample(range(1000), rng.randint(0, 60)))
+        lo = rng.randint(0, len(ids))
+        target = rng.randint(-5, 1005)
+        expected = max(lo, bisect_left(ids, target))
+        assert gallop(ids, target, lo) == expected, (ids, target, lo)
+
+
+def test_gallop_edges():
+    ids = [2, 4, 6, 8]
+    assert gallop(ids, 1) == 0
+    assert gallop(ids, 2) == 0
+    assert gallop(ids, 3) == 1
+    assert gallop(ids, 8) == 3
+    assert gallop(ids, 9) == 4
+    assert gallop(ids, 5, lo=4) == 4
+    assert gallop([], 5) == 0
+
+
+def test_intersect_matches_sets():
+    rng = random.Random(2)
+    for _ in range(300):
+        lists = random_lists(rng, rng.randint(1, 5), rng.choice([10, 50, 400]))
+        expected = sorted(set.intersection(*map(set, lists)))
+        assert intersect(lists) == expected, lists
+    assert intersect([]) == []
+    assert intersect([[1, 2, 3], []]) == []
+    assert intersect([[5], [1, 2, 3, 4, 5]]) == [5]
+
+
+def test_at_least_matches_counts():
+    rng = random.Random(3)
+    for _ in range(300):
+        lists = random_lists(rng, rng.randint(1, 6), rng.choice([10, 50, 400]))
+        for minimum in range(0, len(lists) + 2):
+            m = max(1, min(minimum, len(lists)))
+            expected = sorted(
+                d for d in set().union(*lists) if sum(d in set(ids) for ids in lists) >= m
+            )
+            assert at_least(lists, minimum) == expected, (lists, minimum)
@@ -0,0 +1,107 @@
+"""
+score_at_a_time against a full scan of the summed impacts. Run from
+backend/:
+
+    python -m pytest tests/test_score_at_a_time.py
+"""
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.postings import ImpactList, score_at_a_time
+
+
+def impact_list(rng, universe, max_impact):
+    keys = np.array(sorted(rng.sample(range(universe), rng.randint(1, universe // 2))), dtype=np.int64)
+    impacts = np.array([rng.randint(1, max_impact) for _ in keys], dtype=np.int64)
+    ones = np.ones(len(keys), dtype=np.int64)
+    return ImpactList(keys, impacts, ones, ones)
+
+
+def full_scan(lists, keep=None):
+    totals = {}
+    for l in lists:
+        for key, impact in zip(l.keys.tolist(), l.impacts.tolist()):
+            if keep is None or keep(key):
+                totals[key] = totals.get(key, 0) + impact
+    return totals
+
+
+def assert_top_k(keys, totals, k):
+    """keys are a top k of totals; ties may be broken either way."""
+    expected = sorted(totals.values(), reverse=True)[:k]
+    assert sorted((totals[key] for key in keys.tolist()), reverse=True) == expected
+    assert list(keys) == sorted(keys)
+
+
+def test_top_k_equals_full_scan():
+    rng = random.Random(11)
+    stopped_early = 0
+    for _ in range(400):
+        lists = [impact_list(rng, rng.choice([20, 200, 2000]), rng.choice([3, 20, 255])) for _ in range(rng.randint(1, 5))]
+        k = rng.choice([1, 5, 10, 50])
+        keys, seen, reason = score_at_a_time(lists, k, budget=10**9)
+        assert reason in ("exhausted", "top_k")
+        stopped_early += reason == "top_k"
+        totals = full_scan(lists)
+        assert_top_k(keys, totals, k)
+        assert seen <= len(totals)
+        if reason == "exhausted":
+            assert seen == len(totals)
+    # The early termination itself was exercised
+    assert stopped_early > 0
+
+
+def test_predicate_drops_keys():
+    rng = random.Random(12)
+    for _ in range(100):
+        lists = [impact_list(rng, 300, 50) for _ in range(3)]
+        keys, _, _ = score_at_a_time(lists, 10, budget=10**9, predicate=lambda ks: ks % 3 == 0)
+        assert all(key % 3 == 0 for key in keys.tolist())
+        assert_top_k(keys, full_scan(lists, keep=lambda key: key % 3 == 0), 10)
+
+
+def test_budget_and_should_stop_cut_evaluation_short():
+    rng = random.Random(13)
+    lists = [impact_list(rng, 5000, 255) for _ in range(3)]
+    total_postings = sum(len(l) for l in lists)
+
+    keys, seen, reason = score_at_a_time(lists, 10, budget=50)
+    assert reason == "budget"
+    assert seen <= 50 and len(keys) <= 10
+
+    keys, seen, reason = score_at_a_time(lists, 10, budget=10**9, should_stop=lambda: True)
+    assert reason == "stopped"
+    assert 0 < seen < total_postings
+
+
+def test_empty_and_small_inputs():
+    keys, seen, reason = score_at_a_time([], 10, budget=100)
+    assert len(keys) == 0 and seen == 0 and reason == "exhausted"
+    one = ImpactList(np.array([3, 7]), np.array([5, 9]), np.ones(2, np.int64), np.ones(2, np.int64))
+    keys, seen, reason = score_at_a_time([one], 10, budget=100)
+    assert keys.tolist() == [3, 7] and seen == 2
+
+
+def test_rollup_sums_per_key():
+    rng = random.Random(14)
+    l = impact_list(rng, 500, 100)
+    hotels = np.array([rng.randint(-1, 20) for _ in range(len(l))], dtype=np.int64)
+    masks = np.array([1 << rng.randint(0, 5) for _ in range(len(l))], dtype=np.int64)
+    l = ImpactList(l.keys, l.impacts, l.freqs, masks)
+
+    rolled = l.rollup(hotels)
+
+    expected = {}
+    for hotel, impact, mask in zip(hotels.tolist(), l.impacts.tolist(), masks.tolist()):
+        if hotel >= 0:
+            total, bits = expected.get(hotel, (0, 0))
+            expected[hotel] = (total + impact, bits | mask)
+    assert rolled.keys.tolist() == sorted(expected)
+    assert [(i, m) for i, m in zip(rolled.impacts.tolist(), rolled.masks.tolist())] == [
+        expected[h] for h in sorted(expected)
+    ]
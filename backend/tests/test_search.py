@@ -5,7 +5,7 @@ import sys
 sys.path.append("..")  # Add parent directory to path
 
 from utils.tokenizer import Tokenizer
-from utils.file_io import read_json
+from utils.lexicon_loader import load_lexicon
 
 
 class TestSearchEngine:
@@ -510,10 +510,9 @@ class TestSearchEngine:
         self.lexicon = self._load_lexicon()
 
     def _load_lexicon(self):
-        """Load the lexicon and create reverse mapping"""
+        """Load the compact lexicon; lexicon.term(id) does the reverse lookup"""
         lexicon_path = "../index data/lexicon/lexicon.json"
-        lexicon = read_json(lexicon_path)
-        return {str(v): k for k, v in lexicon.items()}  # Reverse mapping: ID -> word
+        return load_lexicon(lexicon_path)
 
     def decode_document(self, doc_id="1"):
         """Decode a document's content using the lexicon"""
@@ -525,15 +524,16 @@ class TestSearchEngine:
         # Decode words and their positions
         word_positions = {}
         for word_id, positions in doc["word_positions"].items():
-            if word_id in self.lexicon:
-                word = self.lexicon[word_id]
+            word = self.lexicon.term(int(word_id))
+            if word is not None:
                 word_positions[word] = positions
 
         # Decode field matches
         for field, word_ids in doc["field_matches"].items():
             for word_id in word_ids:
-                if str(word_id) in self.lexicon:
-                    decoded[field].append(self.lexicon[str(word_id)])
+                word = self.lexicon.term(int(word_id))
+                if word is not None:
+                    decoded[field].append(word)
 
         return {
             "decoded_fields": decoded,
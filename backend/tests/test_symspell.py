@@ -0,0 +1,92 @@
+"""
+SymSpellIndex corrections against a brute-force scan of the lexicon. Run
+from backend/:
+
+    python -m pytest tests/test_symspell.py
+"""
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from utils.lexicon_loader import Lexicon
+from utils.symspell import SymSpellIndex, damerau_levenshtein
+
+TERMS = [
+    "hotel", "hostel", "motel", "room", "rooms", "broom", "clean", "cleaner",
+    "breakfast", "parking", "park", "staff", "friendly", "location", "view",
+    "swimming", "restaurant", "reception", "comfortable", "noisy",
+]
+
+
+def make_index(terms=TERMS):
+    lexicon = Lexicon.from_dict({t: i for i, t in enumerate(terms)})
+    return lexicon, SymSpellIndex.build(lexicon.items())
+
+
+def test_distance_one_corrections():
+    lexicon, speller = make_index()
+    cases = {
+        "hotl": "hotel",  # deletion
+        "parkingg": "parking",  # insertion
+        "staph": None,  # two edits, not within one
+        "vuew": "view",  # substitution
+        "freindly": "friendly",  # transposition
+        "breakfsat": "breakfast",  # transposition past the indexed prefix
+    }
+    for typo, expected in cases.items():
+        found = speller.lookup(lexicon, typo, max_distance=1)
+        assert (found[0][0] if found else None) == expected, typo
+        if found:
+            assert found[0][2] == 1
+
+
+def test_distance_two_corrections():
+    lexicon, speller = make_index()
+    found = speller.lookup(lexicon, "restrant", max_distance=2)
+    assert found[0][:1] == ("restaurant",) and found[0][2] == 2
+    found = speller.lookup(lexicon, "comfortabel", max_distance=2)
+    assert found[0][0] == "comfortable"
+    assert speller.lookup(lexicon, "restrant", max_distance=1) == []
+    assert speller.lookup(lexicon, "xyzzy", max_distance=2) == []
+
+
+def test_ties_go_to_the_more_frequent_term():
+    lexicon, speller = make_index()
+    frequency = {lexicon["hotel"]: 5, lexicon["motel"]: 50, lexicon["hostel"]: 1}.get
+    found = speller.lookup(lexicon, "xotel", max_distance=1, frequency=lambda i: frequency(i, 0), k=3)
+    assert [t for t, _, _ in found] == ["motel", "hotel"]
+
+
+def test_runtime_additions_are_found():
+    lexicon, speller = make_index()
+    word_id = lexicon.add("jacuzzi")
+    speller.add("jacuzzi", word_id)
+    assert speller.lookup(lexicon, "jacuzi", max_distance=1)[0][:2] == ("jacuzzi", word_id)
+
+
+def test_matches_brute_force():
+    lexicon, speller = make_index()
+    rng = random.Random(7)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    for _ in range(300):
+        word = list(rng.choice(TERMS))
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(word))
+            op = rng.choice("dis")
+            if op == "d" and len(word) > 2:
+                del word[i]
+            elif op == "i":
+                word.insert(i, rng.choice(letters))
+            else:
+                word[i] = rng.choice(letters)
+        typo = "".join(word)
+        for max_distance in (1, 2):
+            expected = sorted(
+                (d, t)
+                for t in TERMS
+                if t != typo and (d := damerau_levenshtein(typo, t, max_distance)) <= max_distance
+            )
+            found = speller.lookup(lexicon, typo, max_distance=max_distance, k=len(TERMS))
+            assert sorted((d, t) for t, _, d in found) == expected, (typo, max_distance)
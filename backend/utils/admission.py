@@ -0,0 +1,140 @@
+import asyncio
+import time
+from collections import deque
+from typing import List
+
+# Upper bounds, in seconds, of the queue-time histogram buckets
+QUEUE_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Overloaded(Exception):
+    """A request was shed; the client should retry after retry_after seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admits at most max_in_flight requests at a time and queues up to
+    max_queue more, first come first served; beyond that requests are shed
+    at once.
+
+    How long a request may wait follows CoDel: a queue that drains now and
+    then is absorbing a burst, so waiters get up to `interval` seconds. A
+    queue that has not been empty for a whole interval is a standing queue,
+    so waiters are shed after `target` seconds instead, until it drains.
+    Shed requests raise Overloaded.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        target: float,
+        interval: float,
+        retry_after: int = 1,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiters = deque()
+        self.last_empty = time.monotonic()  # last time the queue was empty
+
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+        self.queue_time_sum = 0.0
+        self.queue_time_buckets = [0] * len(QUEUE_TIME_BUCKETS)
+
+    def overloaded(self, now: float) -> bool:
+        """The queue has not been empty for a whole interval."""
+        return bool(self.waiters) and now - self.last_empty > self.interval
+
+    async def acquire(self):
+        now = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            self._admit(0.0)
+            return
+        if len(self.waiters) >= self.max_queue:
+            self._shed("queue_full")
+
+        timeout = self.target if self.overloaded(now) else self.interval
+        if not self.waiters:
+            self.last_empty = now
+        slot = asyncio.get_running_loop().create_future()
+        self.waiters.append(slot)
+        try:
+            await asyncio.wait_for(slot, timeout)
+        except asyncio.TimeoutError:
+            # Unless a slot was handed over just as the wait timed out
+            if not slot.done() or slot.cancelled():
+                self._leave(slot)
+                self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            if slot.done() and not slot.cancelled():
+                self.release()  # pass the slot on
+            else:
+                self._leave(slot)
+            raise
+        self._admit(time.monotonic() - now)
+
+    def release(self):
+        """Hand the caller's slot to the next waiter, or free it."""
+        while self.waiters:
+            slot = self.waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _leave(self, slot: asyncio.Future):
+        if slot in self.waiters:
+            self.waiters.remove(slot)
+
+    def _admit(self, waited: float):
+        self.admitted += 1
+        self.queue_time_sum += waited
+        for i, bound in enumerate(QUEUE_TIME_BUCKETS):
+            if waited <= bound:
+                self.queue_time_buckets[i] += 1
+
+    def _shed(self, reason: str):
+        self.shed[reason] += 1
+        raise Overloaded(reason, self.retry_after)
+
+    def metrics(self, name: str) -> List[str]:
+        """Prometheus text exposition lines, metric names prefixed with name."""
+        lines = [
+            f"# HELP {name}_in_flight Requests being served.",
+            f"# TYPE {name}_in_flight gauge",
+            f"{name}_in_flight {self.in_flight}",
+            f"# HELP {name}_queue_length Requests waiting for admission.",
+            f"# TYPE {name}_queue_length gauge",
+            f"{name}_queue_length {len(self.waiters)}",
+            f"# HELP {name}_admitted_total Requests admitted.",
+            f"# TYPE {name}_admitted_total counter",
+            f"{name}_admitted_total {self.admitted}",
+            f"# HELP {name}_shed_total Requests shed with a 503.",
+            f"# TYPE {name}_shed_total counter",
+        ]
+        lines += [f'{name}_shed_total{{reason="{r}"}} {n}' for r, n in self.shed.items()]
+        lines += [
+            f"# HELP {name}_queue_seconds Time admitted requests waited in the queue.",
+            f"# TYPE {name}_queue_seconds histogram",
+        ]
+        lines += [
+            f'{name}_queue_seconds_bucket{{le="{bound}"}} {n}'
+            for bound, n in zip(QUEUE_TIME_BUCKETS, self.queue_time_buckets)
+        ]
+        lines += [
+            f'{name}_queue_seconds_bucket{{le="+Inf"}} {self.admitted}',
+            f"{name}_queue_seconds_sum {self.queue_time_sum}",
+            f"{name}_queue_seconds_count {self.admitted}",
+        ]
+        return lines
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Collection, Dict, List, Optional
+
+import pandas as pd
+
+from utils.file_io import read_csv
+
+logger = logging.getLogger(__name__)
+
+DELTA_SUFFIX = ".delta.jsonl"
+
+# Bumped before and after compaction swaps a CSV and removes its delta, so
+# it is odd while a batch's rows may be in both files. Readers retry when
+# it was odd or changed during their read (a seqlock).
+_swap_seq = 0
+_swap_lock = threading.Lock()
+
+
+def _bump_swap_seq():
+    global _swap_seq
+    with _swap_lock:
+        _swap_seq += 1
+
+
+def delta_path(csv_path: str) -> str:
+    """reviews_1-1000.csv -> reviews_1-1000.delta.jsonl"""
+    base, _ = os.path.splitext(csv_path)
+    return f"{base}{DELTA_SUFFIX}"
+
+
+def _json_default(obj):
+    # numpy scalars coming out of DataFrame rows
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+def read_delta(csv_path: str) -> List[Dict]:
+    """Rows appended to csv_path's delta log that have not been compacted yet."""
+    path = delta_path(csv_path)
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Torn tail from a crash mid-append; it was never acknowledged.
+                logger.warning(f"Skipping torn line in {path}")
+    return rows
+
+
+def read_with_delta(
+    csv_path: str, key: Optional[str] = None, columns: Optional[Collection[str]] = None
+) -> pd.DataFrame:
+    """
+    Read a CSV batch together with its pending delta rows; with columns,
+    only those of them (include the key).
+    """
+    while True:
+        seq = _swap_seq
+        if seq % 2 == 0:
+            # Delta first: compaction replaces the CSV before removing the
+            # delta, so either read sees every row
+            rows = read_delta(csv_path)
+            df = read_csv(csv_path, columns) if os.path.exists(csv_path) else pd.DataFrame()
+            if _swap_seq == seq:
+                break
+        time.sleep(0.001)
+    if rows:
+        delta = pd.DataFrame(rows)
+        if columns is not None:
+            delta = delta[[c for c in delta.columns if c in columns]]
+        df = pd.concat([df, delta], ignore_index=True)
+        # A crash between compaction's replace and the delta removal leaves
+        # the same rows in both files.
+        if key and key in df.columns:
+            df = df.drop_duplicates(subset=key, keep="last", ignore_index=True)
+    return df
+
+
+def batch_exists(csv_path: str) -> bool:
+    return os.path.exists(csv_path) or os.path.exists(delta_path(csv_path))
+
+
+def list_batches(directory: str, prefix: str) -> List[str]:
+    """CSV paths in directory that exist on disk, as a delta log, or both."""
+    paths = set()
+    for fn in os.listdir(directory):
+        if not fn.startswith(prefix):
+            continue
+        if fn.endswith(DELTA_SUFFIX):
+            paths.add(os.path.join(directory, fn[: -len(DELTA_SUFFIX)] + ".csv"))
+        elif fn.endswith(".csv"):
+            paths.add(os.path.join(directory, fn))
+    return sorted(paths)
+
+
+class AppendLog:
+    """
+    Append-only, group-committed writer for CSV batches.
+
+    Rows are appended as JSON lines to a per-batch delta log instead of
+    rewriting the batch. A single writer thread drains everything queued
+    while the previous fsync was running, so concurrent appends to the same
+    batch share one write + fsync. The same thread compacts a delta back
+    into its CSV once it holds `compact_rows` rows or has been idle for
+    `compact_interval` seconds.
+
+    keys maps CSV paths, or directories of batches, to the column rows are
+    deduplicated on when compacting. Deltas already on disk there when the
+    log starts, e.g. left by a crash, are compacted like its own.
+    """
+
+    def __init__(
+        self,
+        compact_rows: int = 5000,
+        compact_interval: float = 30.0,
+        keys: Optional[Dict[str, str]] = None,
+    ):
+        self.compact_rows = max(1, compact_rows)
+        self.compact_interval = compact_interval
+        self._queue = queue.Queue()
+        self._delta_rows = defaultdict(int)  # csv_path -> rows appended since compaction
+        self._keys = dict(keys or {})  # csv_path or directory -> dedupe column
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._register_leftovers()
+                self._thread = threading.Thread(
+                    target=self._run, name="append-log", daemon=True
+                )
+                self._thread.start()
+
+    def _register_leftovers(self):
+        """Queue up the deltas an earlier process left under the keyed paths."""
+        for location in list(self._keys):
+            if os.path.isdir(location):
+                paths = [
+                    os.path.join(location, fn[: -len(DELTA_SUFFIX)] + ".csv")
+                    for fn in os.listdir(location)
+                    if fn.endswith(DELTA_SUFFIX)
+                ]
+            else:
+                paths = [location] if os.path.exists(delta_path(location)) else []
+            for path in paths:
+                if path not in self._delta_rows:
+                    self._delta_rows[path] = len(read_delta(path))
+                    logger.info(f"Found {self._delta_rows[path]} uncompacted rows in {delta_path(path)}.")
+
+    def _key(self, csv_path: str) -> Optional[str]:
+        return self._keys.get(csv_path) or self._keys.get(os.path.dirname(csv_path))
+
+    def append(self, csv_path: str, rows: List[Dict], key: Optional[str] = None):
+        """Block until rows are durable in csv_path's delta log."""
+        if not rows:
+            return
+        done = threading.Event()
+        entry = self._submit(csv_path, rows, key, done.set)
+        done.wait()
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    async def append_async(
+        self, csv_path: str, rows: List[Dict], key: Optional[str] = None
+    ):
+        """Awaitable append; the event loop is not blocked during the fsync."""
+        if not rows:
+            return
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(
+                lambda: fut.done() or fut.set_result(None)
+            )
+
+        entry = self._submit(csv_path, rows, key, notify)
+        await fut
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    def _submit(self, csv_path, rows, key, notify) -> Dict:
+        self.start()
+        entry = {
+            "path": csv_path,
+            "rows": list(rows),
+            "key": key,
+            "notify": notify,
+            "error": None,
+        }
+        self._queue.put(entry)
+        return entry
+
+    def flush(self):
+        """Compact every delta this log has written to or found at start."""
+        done = threading.Event()
+        self._queue.put({"compact_all": True, "notify": done.set})
+        self.start()
+        done.wait()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.compact_interval)
+            except queue.Empty:
+                self._compact_paths(list(self._delta_rows))
+                continue
+
+            batch = [first]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            appends = [e for e in batch if "compact_all" not in e]
+            self._commit(appends)
+            self._compact_paths(
+                [p for p, n in self._delta_rows.items() if n >= self.compact_rows]
+            )
+            for e in batch:
+                if "compact_all" in e:
+                    self._compact_paths(list(self._delta_rows))
+                    e["notify"]()
+
+    def _commit(self, entries: List[Dict]):
+        by_path = defaultdict(list)
+        for e in entries:
+            by_path[e["path"]].append(e)
+
+        for path, group in by_path.items():
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                n_rows = 0
+                with open(delta_path(path), "a", encoding="utf-8") as f:
+                    for e in group:
+                        for row in e["rows"]:
+                            f.write(json.dumps(row, default=_json_default) + "\n")
+                        n_rows += len(e["rows"])
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._delta_rows[path] += n_rows
+                for e in group:
+                    if e["key"]:
+                        self._keys[path] = e["key"]
+                logger.debug(
+                    f"Group commit of {n_rows} rows ({len(group)} writers) to {delta_path(path)}."
+                )
+            except Exception as exc:
+                logger.error(f"Error appending to {delta_path(path)}: {exc}", exc_info=True)
+                for e in group:
+                    e["error"] = exc
+            finally:
+                for e in group:
+                    e["notify"]()
+
+    def _compact_paths(self, paths: List[str]):
+        for path in paths:
+            try:
+                self._compact(path)
+            except Exception as e:
+                logger.error(f"Error compacting {path}: {e}", exc_info=True)
+
+    def _compact(self, csv_path: str):
+        """Fold csv_path's delta log into the CSV with an atomic replace."""
+        start = time.time()
+        rows = read_delta(csv_path)
+        if rows:
+            base = read_csv(csv_path) if os.path.exists(csv_path) else pd.DataFrame()
+            df = pd.concat([base, pd.DataFrame(rows)], ignore_index=True)
+            key = self._key(csv_path)
+            if key and key in df.columns:
+                df = df.drop_duplicates(subset=key, keep="last")
+            tmp = f"{csv_path}.tmp"
+            with open(tmp, "w", encoding="utf-8-sig", newline="") as f:
+                df.to_csv(f, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+        _bump_swap_seq()
+        try:
+            if rows:
+                os.replace(tmp, csv_path)
+            if os.path.exists(delta_path(csv_path)):
+                os.remove(delta_path(csv_path))
+        finally:
+            _bump_swap_seq()
+        self._delta_rows.pop(csv_path, None)
+        logger.debug(
+            f"Compacted {len(rows)} delta rows into {csv_path} in {time.time() - start:.3f}s."
+        )
@@ -1,6 +1,13 @@
+from collections import OrderedDict
 from functools import lru_cache
 from typing import Dict, Set
 import json
+import os
+import secrets
+import threading
+import time
+
+import aiofiles
 
 @lru_cache(maxsize=1000)
 def get_inverted_batch(batch_key: str, doc_type: str, index_dir: str) -> Dict[str, list]:
@@ -20,3 +27,93 @@ def get_doc_ids_for_token(token_id: int, doc_type: str, index_dir: str) -> Set[s
     
     batch = get_inverted_batch(batch_key, doc_type, index_dir)
     return set(batch.get(str(token_id), []))
+
+
+class ShardCache:
+    """
+    LRU cache of parsed inverted index shards, keyed by path.
+    Entries are revalidated against the file's mtime so offline rebuilds and
+    update_indices writes are picked up without an explicit reload.
+    """
+
+    def __init__(self, max_shards: int = 64):
+        self.max_shards = max(1, max_shards)
+        self.shards = OrderedDict()  # path -> (mtime_ns, data)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, path: str, mtime_ns: int):
+        with self.lock:
+            entry = self.shards.get(path)
+            if entry is not None and entry[0] == mtime_ns:
+                self.shards.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, path: str, mtime_ns: int, data: dict):
+        with self.lock:
+            self.shards[path] = (mtime_ns, data)
+            self.shards.move_to_end(path)
+            while len(self.shards) > self.max_shards:
+                self.shards.popitem(last=False)
+
+    async def get(self, path: str) -> dict:
+        """Parsed shard at path, {} if it does not exist."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        data = self._lookup(path, mtime_ns)
+        if data is not None:
+            return data
+        async with aiofiles.open(path, "r", encoding="utf-8-sig") as f:
+            content = await f.read()
+        data = json.loads(content)
+        self._store(path, mtime_ns, data)
+        return data
+
+    def invalidate(self, path: str):
+        with self.lock:
+            self.shards.pop(path, None)
+
+    def clear(self):
+        with self.lock:
+            self.shards.clear()
+
+
+class CursorCache:
+    """
+    Values kept for a while under random opaque keys, e.g. the ranking of a
+    search while its client pages through it. At most max_entries are kept,
+    least recently used first out, each for ttl seconds.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires, value)
+        self.lock = threading.Lock()
+
+    def put(self, value, key: str = None) -> str:
+        """Keep value under key, a new random one if not given; returns the key."""
+        key = key or secrets.token_urlsafe(12)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return key
+
+    def get(self, key: str):
+        """The value under key, None if unknown or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
@@ -1,5 +1,7 @@
 import json
 import os
+from lexicon_loader import compile_lexicon
+from symspell import build_symspell_file
 
 # Directory containing the lexicon JSON files
 lexicons_dir = "../index data"
@@ -23,3 +25,4 @@ with open(output_filename, "w", encoding="utf-8-sig") as json_file:
     json.dump(combined_lexicon, json_file, indent=4)
 
 print(f"Combined lexicon saved to {output_filename}")
+build_symspell_file(compile_lexicon(output_filename, rebuilt=True), output_filename)
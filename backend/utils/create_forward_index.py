@@ -5,6 +5,8 @@ import multiprocessing as mp
 from functools import partial
 from tokenizer import Tokenizer
 from file_io import read_json, write_json, read_csv, write_csv
+from lexicon_loader import load_lexicon
+from postings import FIELD_POSITION_GAP
 
 BATCH_SIZE = 20000
 global_lexicon = None
@@ -13,8 +15,7 @@ global_tokenizer = None
 def init_globals(lexicon_file):
     """Initialize the global lexicon + tokenizer in each worker."""
     global global_lexicon, global_tokenizer
-    with open(lexicon_file, "r", encoding="utf-8-sig") as f:
-        global_lexicon = json.load(f)
+    global_lexicon = load_lexicon(lexicon_file)
     global_tokenizer = Tokenizer()
 
 def process_chunk(chunk_data, id_column, text_columns):
@@ -30,12 +31,14 @@ def process_chunk(chunk_data, id_column, text_columns):
             "field_matches": {},
         }
 
+        # Positions run on across fields, with a gap between fields
+        offset = 0
         for field in text_columns:
             text = str(row.get(field, ""))
             words = global_tokenizer.tokenize_with_spacy(text)
             doc_info["field_matches"][field] = []
 
-            for pos, word in enumerate(words):
+            for pos, word in enumerate(words, offset):
                 if word in global_lexicon:
                     word_id = global_lexicon[word]
                     if word_id not in doc_info["word_positions"]:
@@ -45,6 +48,7 @@ def process_chunk(chunk_data, id_column, text_columns):
                         doc_info["word_counts"].get(word_id, 0) + 1
                     )
                     doc_info["field_matches"][field].append(word_id)
+            offset += len(words) + FIELD_POSITION_GAP
 
         forward_index[item_id] = doc_info
     return forward_index
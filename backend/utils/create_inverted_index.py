@@ -2,7 +2,12 @@ import json
 import os
 from collections import defaultdict
 import multiprocessing as mp
+import sys
 import traceback
+from postings import positions_path, fields_mask, entry_docs, docs_entry, FIELDS, FIELD_BITS, mask_weight_table
+from impacts import read_impacts_meta, reimpact_index
+from hotel_rollup import batch_review_hotels, write_hotel_rollup
+from generation import bump_generation, generation_path
 
 BATCH_SIZE = 20000
 
@@ -52,7 +57,7 @@ def map_forward_to_partial_inverted(forward_index_file):
     partial_inverted = {
       word_id(str): {
         "docs": [
-          {"id": doc_id, "freq": freq, "positions": [...], "fields": [...]},
+          {"id": doc_id(int), "freq": freq, "positions": [...], "mask": field bitmask},
           ...
         ]
       },
@@ -84,10 +89,10 @@ def map_forward_to_partial_inverted(forward_index_file):
             if word_id_str not in partial_inverted:
                 partial_inverted[word_id_str] = {"docs": []}
             partial_inverted[word_id_str]["docs"].append({
-                "id": doc_id,
+                "id": int(doc_id),
                 "freq": freq,
                 "positions": positions,
-                "fields": fields_used
+                "mask": fields_mask(fields_used)
             })
 
     return partial_inverted
@@ -96,7 +101,8 @@ def reduce_partials_and_write(all_partials, output_dir):
     """
     'Reduce' step:
     Merge all partial_inverted dicts from the workers, 
-    then write final inverted_index_{start}-{end}.json files.
+    then write final inverted_index_{start}-{end}.json files and their
+    positions_{start}-{end}.json streams.
     """
 
     # 1) Merge them in memory
@@ -110,50 +116,55 @@ def reduce_partials_and_write(all_partials, output_dir):
                 merged_inverted[word_id_str] = {"docs": []}
             merged_inverted[word_id_str]["docs"].extend(data["docs"])
 
-    # 2) Now we write them out by word_id range
-    #    e.g. word_id => find batch_start, batch_end => open that file, merge, etc.
-    #    But simpler is to build an in-memory dict-of-dicts, then dump them.
-    #    We'll do a smaller step approach: for each word_id_str, figure out the file name,
-    #    load existing on disk if any, unify, then write.
-
+    # 2) Now we write them out by word_id range, one shard at a time:
+    #    load the shard (and its positions stream) if it exists, unify, write.
     print("[Reduce] Writing final inverted index JSON files...")
     os.makedirs(output_dir, exist_ok=True)
 
-    for word_id_str, data in merged_inverted.items():
-        word_id = int(word_id_str)
-        batch_start = (word_id // BATCH_SIZE)*BATCH_SIZE
-        batch_end = batch_start + BATCH_SIZE -1
+    by_shard = defaultdict(list)
+    for word_id_str in merged_inverted:
+        batch_start = (int(word_id_str) // BATCH_SIZE) * BATCH_SIZE
+        by_shard[batch_start].append(word_id_str)
+
+    for batch_start, word_id_strs in sorted(by_shard.items()):
+        batch_end = batch_start + BATCH_SIZE - 1
         inv_file = os.path.join(output_dir, f"inverted_index_{batch_start}-{batch_end}.json")
+        pos_file = positions_path(inv_file)
 
         # Use safe_json_load instead of direct json.load
         existing_data = safe_json_load(inv_file)
-
-        if word_id_str not in existing_data:
-            existing_data[word_id_str] = {"docs":[]}
-
-        postings = existing_data[word_id_str]["docs"]
-
-        # Now we unify the docs from 'data["docs"]' into 'postings',
-        # summing freq if doc_id matches, etc.
-        for new_doc in data["docs"]:
-            found = False
-            for p in postings:
-                if p["id"] == new_doc["id"]:
+        positions = safe_json_load(pos_file)
+
+        for word_id_str in word_id_strs:
+            postings = entry_docs(
+                existing_data.get(word_id_str), positions.get(word_id_str)
+            )
+
+            # Now we unify the new docs into 'postings',
+            # summing freq if doc_id matches, etc.
+            by_id = {p["id"]: p for p in postings}
+            for new_doc in merged_inverted[word_id_str]["docs"]:
+                p = by_id.get(new_doc["id"])
+                if p is not None:
                     p["freq"] += new_doc["freq"]
                     p["positions"].extend(new_doc["positions"])
-                    # unify fields
-                    for ff in new_doc["fields"]:
-                        if ff not in p["fields"]:
-                            p["fields"].append(ff)
-                    found = True
-                    break
-            if not found:
-                postings.append(new_doc)
+                    p["mask"] |= new_doc["mask"]
+                    p.pop("impact", None)  # stale; see reimpact_index
+                else:
+                    postings.append(new_doc)
+                    by_id[new_doc["id"]] = new_doc
+
+            # Columns ordered by integer doc id, so the search can intersect
+            # them without sorting. Positions go to their own stream, aligned
+            # with the columns, so queries without phrases never parse them.
+            existing_data[word_id_str], positions[word_id_str] = docs_entry(postings)
 
         # finally, write back
         try:
             with open(inv_file, "w", encoding="utf-8-sig") as f:
                 json.dump(existing_data, f, indent=4, ensure_ascii=False)
+            with open(pos_file, "w", encoding="utf-8-sig") as f:
+                json.dump(positions, f, ensure_ascii=False)
         except Exception as e:
             print(f"Error writing {inv_file}: {str(e)}")
             print(traceback.format_exc())
@@ -196,7 +207,41 @@ def create_or_update_inverted_index_parallel(forward_index_dir, inverted_index_d
     print("Inverted index creation/update complete (parallel map-reduce)!")
 
 
+def migrate_shards(inverted_index_dir):
+    """
+    Rewrite shards in older layouts (postings with string ids, field name
+    lists and inline positions) as columnar postings plus a positions stream.
+    """
+    for fn in sorted(os.listdir(inverted_index_dir)):
+        if not (fn.startswith("inverted_index_") and fn.endswith(".json")):
+            continue
+        inv_file = os.path.join(inverted_index_dir, fn)
+        shard = safe_json_load(inv_file)
+        if all("ids" in entry for entry in shard.values()):
+            continue  # already columnar
+        pos_file = positions_path(inv_file)
+        positions = safe_json_load(pos_file)
+        for word_id_str, entry in shard.items():
+            shard[word_id_str], positions[word_id_str] = docs_entry(
+                entry_docs(entry, positions.get(word_id_str))
+            )
+        with open(pos_file, "w", encoding="utf-8-sig") as f:
+            json.dump(positions, f, ensure_ascii=False)
+        with open(inv_file, "w", encoding="utf-8-sig") as f:
+            json.dump(shard, f, indent=4, ensure_ascii=False)
+        print(f"Migrated {inv_file}")
+
+
 if __name__ == "__main__":
+    from lexicon_loader import load_lexicon
+    from suggest import build_suggest_files
+
+    # One-off migration of an existing index: python create_inverted_index.py migrate
+    if sys.argv[1:] == ["migrate"]:
+        migrate_shards("../index data/inverted_index/hotels")
+        migrate_shards("../index data/inverted_index/reviews")
+        sys.exit(0)
+
     create_or_update_inverted_index_parallel(
         "../index data/forward_index/hotels", 
         "../index data/inverted_index/hotels",
@@ -205,3 +250,30 @@ if __name__ == "__main__":
         "../index data/forward_index/reviews", 
         "../index data/inverted_index/reviews",
     )
+
+    # Autocomplete lists are ranked by document frequency, so they are
+    # rebuilt once the postings are final
+    lexicon_path = "../index data/lexicon/lexicon.json"
+    build_suggest_files(
+        load_lexicon(lexicon_path), lexicon_path, "../index data/inverted_index"
+    )
+
+    # Merged postings lost their impacts; if the index has impacts,
+    # recompute them with the params they were built with
+    meta = read_impacts_meta("../index data/inverted_index")
+    if meta is not None:
+        reimpact_index(
+            "../index data/inverted_index",
+            meta["params"],
+            mask_weight_table(meta["params"]["field_weights"]),
+            FIELDS,
+        )
+
+    # The hotel rollup is derived from the final review shards, impacts
+    # included
+    write_hotel_rollup(
+        "../index data/inverted_index", batch_review_hotels("../reviews"), FIELD_BITS
+    )
+
+    # Cached responses of a running app were built from the old index
+    bump_generation(generation_path("../index data/inverted_index"))
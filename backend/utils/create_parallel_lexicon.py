@@ -4,6 +4,8 @@ import pandas as pd
 import json
 import os
 from tokenizer import Tokenizer
+from lexicon_loader import compile_lexicon
+from symspell import build_symspell_file
 
 def tokenize_chunk(chunk, tokenizer):
     """Tokenize a list of text rows using the tokenizer."""
@@ -89,6 +91,7 @@ def merge_lexicons(lexicon_dir):
         json.dump(final_lexicon, f)
 
     print(f"Created final lexicon with {len(final_lexicon)} tokens at {output_path}")
+    build_symspell_file(compile_lexicon(output_path, rebuilt=True), output_path)
 
 
 if __name__ == "__main__":
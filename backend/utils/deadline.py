@@ -0,0 +1,36 @@
+import time
+from typing import Optional
+
+# Loops over docs check the deadline every this many iterations
+DEADLINE_CHECK_ROWS = 256
+
+
+class Deadline:
+    """
+    A search's time budget. Posting traversal and result hydration check it
+    between units of work and, once it has passed, stop and keep what they
+    have; check() records that, so the response can be marked partial.
+    """
+
+    def __init__(self, timeout_ms: Optional[float] = None):
+        self.expires = float("inf") if timeout_ms is None else time.time() + timeout_ms / 1000
+        self.cancelled = False
+        self.partial = False
+
+    def remaining(self) -> float:
+        """Seconds left, 0 once expired."""
+        return 0.0 if self.cancelled else max(0.0, self.expires - time.time())
+
+    def expired(self) -> bool:
+        return self.cancelled or time.time() >= self.expires
+
+    def check(self) -> bool:
+        """expired(), recording that the work it guards was cut short."""
+        if self.expired():
+            self.partial = True
+            return True
+        return False
+
+    def cancel(self):
+        """Stop the work now, e.g. because the client went away."""
+        self.cancelled = True
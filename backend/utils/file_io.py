@@ -1,7 +1,7 @@
 import json
 import pandas as pd
 from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, Collection, Optional
 import logging
 import os
 
@@ -76,12 +76,14 @@ def write_json(filepath: str, data: dict):
     except Exception as e:
         print(f"Error writing JSON file {filepath}: {str(e)}")
 
-def read_csv(filepath: str) -> pd.DataFrame:
+def read_csv(filepath: str, columns: Optional[Collection[str]] = None) -> pd.DataFrame:
+    """With columns, only those of them the file has are parsed."""
     try:
         if not os.path.exists(filepath):
             print(f"File not found: {filepath}")
             return pd.DataFrame()
-        return pd.read_csv(filepath, encoding='utf-8-sig')
+        usecols = None if columns is None else (lambda c: c in columns)
+        return pd.read_csv(filepath, encoding='utf-8-sig', usecols=usecols)
     except Exception as e:
         print(f"Error reading CSV file {filepath}: {str(e)}")
         return pd.DataFrame()
@@ -0,0 +1,71 @@
+import logging
+import os
+import threading
+from typing import Tuple
+
+logger = logging.getLogger(__name__)
+
+# File under inverted_index/ counting writes to the indexed data. Response
+# ETags derive from it rather than from process memory, so every worker
+# serving the index, and the process after a restart, agree on them.
+GENERATION_FILE = "generation"
+
+
+def generation_path(inverted_index_dir: str) -> str:
+    return os.path.join(inverted_index_dir, GENERATION_FILE)
+
+
+def bump_generation(path: str) -> int:
+    """
+    Increment the generation persisted at path; returns the new one. The
+    file is replaced atomically, so readers see the old or new value.
+    """
+    current = _read(path)
+    generation = current + 1
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(generation))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return generation
+
+
+def _read(path: str) -> int:
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+    except ValueError as e:
+        logger.error(f"Corrupted generation file {path}: {e}")
+        return 0
+
+
+class Generation:
+    """
+    The generation persisted at path, reread only when the file's mtime
+    changes. Its mtime is part of the value: two processes bumping at once
+    may both write the same count, but not at the same instant.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cached = (None, 0)  # (mtime_ns, generation)
+
+    def bump(self) -> int:
+        with self._lock:
+            return bump_generation(self.path)
+
+    def current(self) -> Tuple[int, int]:
+        """(generation, mtime_ns), (0, 0) before the first bump."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0, 0
+        mtime_cached, generation = self._cached
+        if mtime_cached != mtime_ns:
+            generation = _read(self.path)
+            self._cached = (mtime_ns, generation)
+        return generation, mtime_ns
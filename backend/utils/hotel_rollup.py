@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Shards of review postings rolled up per hotel live in
+# inverted_index/hotel_rollup/, named like the review shards they come from.
+# Entries are columnar like the other shards, keyed by hotel id:
+#   {"ids", "freqs" (summed), "masks" (OR-ed), "reviews" (matching reviews),
+#    "field_counts": {field: reviews with the term in it}[, "impacts" (summed)]}
+ROLLUP_DOC_TYPE = "hotel_rollup"
+
+
+def rollup_path(review_shard: str) -> str:
+    """.../inverted_index/reviews/inverted_index_0-19999.json -> .../inverted_index/hotel_rollup/inverted_index_0-19999.json"""
+    shard_dir, name = os.path.split(review_shard)
+    return os.path.join(os.path.dirname(shard_dir), ROLLUP_DOC_TYPE, name)
+
+
+def rollup_entry(entry: Dict, hotels: np.ndarray, field_bits: Dict[str, int]) -> Optional[Dict]:
+    """
+    Roll a columnar review entry up per hotel; hotels holds each posting's
+    hotel id, -1 for unmapped reviews. None if no posting maps to a hotel.
+    """
+    keep = hotels >= 0
+    if not keep.any():
+        return None
+    order = np.argsort(hotels[keep], kind="stable")
+    keys = hotels[keep][order]
+    unique, starts = np.unique(keys, return_index=True)
+    freqs = np.asarray(entry["freqs"], dtype=np.int64)[keep][order]
+    masks = np.asarray(entry["masks"], dtype=np.int64)[keep][order]
+
+    rolled = {
+        "ids": unique.tolist(),
+        "freqs": np.add.reduceat(freqs, starts).tolist(),
+        "masks": np.bitwise_or.reduceat(masks, starts).tolist(),
+        "reviews": np.diff(np.append(starts, len(keys))).tolist(),
+        "field_counts": {},
+    }
+    for name, bit in field_bits.items():
+        has_field = (masks & bit) != 0
+        if has_field.any():
+            rolled["field_counts"][name] = np.add.reduceat(has_field.astype(np.int64), starts).tolist()
+    if "impacts" in entry:
+        impacts = np.asarray(entry["impacts"], dtype=np.int64)[keep][order]
+        rolled["impacts"] = np.add.reduceat(impacts, starts).tolist()
+    return rolled
+
+
+def rollup_add(
+    entry: Optional[Dict],
+    hotel_id: int,
+    freq: int,
+    new_bits: int,
+    new_review: bool,
+    field_bits: Dict[str, int],
+    impact: Optional[int] = None,
+) -> Dict:
+    """
+    Fold one review posting change into a hotel's rollup row: freq and
+    impact are the deltas, new_bits the field bits the review gained for
+    the term, new_review whether the review was not yet counted. Without
+    an impact delta the entry's impacts column is dropped as stale.
+    """
+    if entry is None:
+        entry = {"ids": [], "freqs": [], "masks": [], "reviews": [], "field_counts": {}}
+        if impact is not None:
+            entry["impacts"] = []
+    ids = entry["ids"]
+    i = bisect_left(ids, hotel_id)
+    if i == len(ids) or ids[i] != hotel_id:
+        ids.insert(i, hotel_id)
+        for col in ("freqs", "masks", "reviews"):
+            entry[col].insert(i, 0)
+        for counts in entry["field_counts"].values():
+            counts.insert(i, 0)
+        if "impacts" in entry:
+            entry["impacts"].insert(i, 0)
+
+    entry["freqs"][i] += freq
+    entry["masks"][i] |= new_bits
+    entry["reviews"][i] += int(new_review)
+    for name, bit in field_bits.items():
+        if new_bits & bit:
+            counts = entry["field_counts"].setdefault(name, [0] * len(ids))
+            counts[i] += 1
+    if "impacts" in entry:
+        if impact is None:
+            del entry["impacts"]
+        else:
+            entry["impacts"][i] += impact
+    return entry
+
+
+def rollup_weights(entry: Dict, field_weights: Dict[str, float]) -> np.ndarray:
+    """Summed field weight of each hotel's matching reviews."""
+    weights = np.zeros(len(entry["ids"]))
+    for name, counts in entry["field_counts"].items():
+        weights += field_weights.get(name, 0.0) * np.asarray(counts, dtype=np.float64)
+    return weights
+
+
+def batch_review_hotels(reviews_dir: str) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    rev_ids -> hotel_ids (-1 if unknown) from the review batches in
+    reviews_dir, their CSVs and any delta rows not compacted into them yet,
+    for building the rollup without the app.
+    """
+    rev_to_hotel = {}
+    for fn in sorted(os.listdir(reviews_dir)) if os.path.isdir(reviews_dir) else []:
+        path = os.path.join(reviews_dir, fn)
+        if not fn.startswith("reviews_"):
+            continue
+        if fn.endswith(".csv"):
+            df = pd.read_csv(path, usecols=["rev_id", "hotel_id"], encoding="utf-8-sig")
+            rev_to_hotel.update(zip(df["rev_id"].astype(int), df["hotel_id"].astype(int)))
+        elif fn.endswith(".delta.jsonl"):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        rev_to_hotel[int(row["rev_id"])] = int(row["hotel_id"])
+                    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                        continue  # blank or torn line
+    print(f"Mapped {len(rev_to_hotel)} reviews to their hotels")
+
+    def review_hotels(rev_ids: np.ndarray) -> np.ndarray:
+        return np.fromiter(
+            (rev_to_hotel.get(r, -1) for r in rev_ids.tolist()), dtype=np.int64, count=len(rev_ids)
+        )
+
+    return review_hotels
+
+
+def write_hotel_rollup(
+    inverted_index_dir: str,
+    review_hotels: Callable[[np.ndarray], np.ndarray],
+    field_bits: Dict[str, int],
+):
+    """Rebuild every rollup shard from the review shards."""
+    start = time.time()
+    review_dir = os.path.join(inverted_index_dir, "reviews")
+    rollup_dir = os.path.join(inverted_index_dir, ROLLUP_DOC_TYPE)
+    shutil.rmtree(rollup_dir, ignore_errors=True)
+    os.makedirs(rollup_dir, exist_ok=True)
+
+    written = 0
+    for fn in sorted(os.listdir(review_dir)) if os.path.isdir(review_dir) else []:
+        if not (fn.startswith("inverted_index_") and fn.endswith(".json")):
+            continue
+        with open(os.path.join(review_dir, fn), "r", encoding="utf-8-sig") as f:
+            shard = json.load(f)
+        if not all("ids" in entry for entry in shard.values()):
+            # Queries fall back to the review postings for shards without a rollup
+            print(f"Skipping {fn}: older postings layout; run `migrate` first")
+            continue
+        rolled = {}
+        for word_id_str, entry in shard.items():
+            hotels = review_hotels(np.asarray(entry["ids"], dtype=np.int64))
+            rolled_entry = rollup_entry(entry, hotels, field_bits)
+            if rolled_entry is not None:
+                rolled[word_id_str] = rolled_entry
+        with open(os.path.join(rollup_dir, fn), "w", encoding="utf-8-sig") as f:
+            json.dump(rolled, f, indent=4, ensure_ascii=False)
+        written += 1
+    print(f"Wrote {written} hotel rollup shards in {time.time() - start:.2f}s")
@@ -0,0 +1,86 @@
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class BlockIdAllocator:
+    """
+    Hands out increasing integer IDs from reserved blocks.
+
+    Only the high-water mark of the reserved block is persisted, so the file
+    is written once per `block_size` IDs instead of once per ID. IDs inside a
+    block are taken from an itertools counter (atomic under the GIL); the lock
+    is only taken when a block runs out. After a crash the unused rest of the
+    last block is skipped, but an ID at or below a persisted high-water mark
+    is never handed out again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        block_size: int = 10000,
+        floor: Callable[[], int] = lambda: 0,
+        key: str = "current_rev_id",
+    ):
+        self.path = path
+        self.block_size = max(1, block_size)
+        self.key = key
+        self._lock = threading.Lock()
+
+        start = self._read_high_water()
+        if start is None:
+            start = int(floor())
+            logger.debug(f"No {path}; starting IDs after max existing ID {start}.")
+        self._ceiling = start
+        self._ids = itertools.count(start + 1)
+
+    def _read_high_water(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r") as f:
+                return int(json.load(f)[self.key])
+        except (ValueError, KeyError, TypeError, json.JSONDecodeError) as e:
+            logger.error(f"Corrupted ID file {self.path}: {e}")
+            return None
+
+    def _persist(self, high_water: int):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({self.key: int(high_water)}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.debug(f"Reserved IDs up to {high_water} in {self.path}.")
+
+    def _reserve(self, needed: int):
+        with self._lock:
+            if needed <= self._ceiling:
+                return
+            blocks = -(-(needed - self._ceiling) // self.block_size)
+            ceiling = self._ceiling + blocks * self.block_size
+            # Durable before any ID of the new block becomes visible
+            self._persist(ceiling)
+            self._ceiling = ceiling
+
+    def next_id(self) -> int:
+        new_id = next(self._ids)
+        if new_id > self._ceiling:
+            self._reserve(new_id)
+        return new_id
+
+    def next_ids(self, n: int) -> List[int]:
+        """n IDs, increasing but not necessarily contiguous under concurrency."""
+        ids = [next(self._ids) for _ in range(n)]
+        if ids and ids[-1] > self._ceiling:
+            self._reserve(ids[-1])
+        return ids
+
+    @property
+    def high_water(self) -> int:
+        return self._ceiling
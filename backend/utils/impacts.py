@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Impacts are stored as integers in [1, MAX_IMPACT]; every posting is a
+# match, so none quantizes to 0.
+IMPACT_BITS = 8
+MAX_IMPACT = (1 << IMPACT_BITS) - 1
+
+# The SCORING_PARAMS that make up a posting's static score
+STATIC_PARAMS = ("field_weights", "base_freq_weight", "length_norm_factor")
+
+
+def impacts_meta_path(inverted_index_dir: str) -> str:
+    """inverted_index -> inverted_index/impacts_meta.json"""
+    return os.path.join(inverted_index_dir, "impacts_meta.json")
+
+
+def static_params(scoring_params: Dict) -> Dict:
+    return {name: scoring_params[name] for name in STATIC_PARAMS}
+
+
+def params_fingerprint(params: Dict, fields: Sequence[str]) -> str:
+    """Hash of the static scoring params and the field registry the masks use."""
+    payload = json.dumps(
+        {"params": params, "fields": list(fields), "bits": IMPACT_BITS}, sort_keys=True
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ImpactModel:
+    """
+    Quantizes a posting's static score,
+        (freq * base_freq_weight + summed field weights) / (1 + length_norm_factor * freq),
+    to an integer impact. `scale` is the score of one impact unit, chosen
+    at build time so the highest static score in the index maps to
+    MAX_IMPACT; postings added later are clipped to it.
+    """
+
+    def __init__(self, params: Dict, mask_weights: np.ndarray, scale: float, fingerprint: str):
+        self.params = params
+        self.mask_weights = mask_weights
+        self.scale = scale
+        self.fingerprint = fingerprint
+
+    def static_scores(self, freqs: np.ndarray, masks: np.ndarray) -> np.ndarray:
+        freqs = np.asarray(freqs, dtype=np.float64)
+        score = freqs * self.params["base_freq_weight"] + self.mask_weights[np.asarray(masks)]
+        return score / (1 + self.params["length_norm_factor"] * freqs)
+
+    def quantize(self, freqs, masks) -> np.ndarray:
+        impacts = np.rint(self.static_scores(freqs, masks) / self.scale)
+        return np.clip(impacts, 1, MAX_IMPACT).astype(np.int64)
+
+    def save(self, inverted_index_dir: str, fields: Sequence[str]):
+        path = impacts_meta_path(inverted_index_dir)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(),
+                    "fingerprint": self.fingerprint,
+                    "params": self.params,
+                    "fields": list(fields),
+                    "bits": IMPACT_BITS,
+                    "scale": self.scale,
+                },
+                f,
+                indent=4,
+            )
+        os.replace(f"{path}.tmp", path)
+
+
+def read_impacts_meta(inverted_index_dir: str) -> Optional[Dict]:
+    path = impacts_meta_path(inverted_index_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_impact_model(
+    inverted_index_dir: str, scoring_params: Dict, mask_weights: np.ndarray, fields: Sequence[str]
+) -> ImpactModel:
+    """
+    The impact model the index was built with. Raises ValueError when there
+    is none or it was built with different scoring params.
+    """
+    meta = read_impacts_meta(inverted_index_dir)
+    if meta is None:
+        raise ValueError(f"No {impacts_meta_path(inverted_index_dir)}; run the re-impact pass")
+    params = static_params(scoring_params)
+    fingerprint = params_fingerprint(params, fields)
+    if meta["fingerprint"] != fingerprint:
+        raise ValueError("Impacts were built with different scoring params; run the re-impact pass")
+    return ImpactModel(params, mask_weights, meta["scale"], fingerprint)
+
+
+def _shard_files(inverted_index_dir: str, doc_types: Sequence[str] = ("hotels", "reviews")):
+    # Not the hotel rollup: its impacts are sums of the review impacts
+    for doc_type in doc_types:
+        shard_dir = os.path.join(inverted_index_dir, doc_type)
+        if not os.path.isdir(shard_dir):
+            continue
+        for fn in sorted(os.listdir(shard_dir)):
+            if fn.startswith("inverted_index_") and fn.endswith(".json"):
+                yield os.path.join(shard_dir, fn)
+
+
+def _read_shard(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def reimpact_index(
+    inverted_index_dir: str, scoring_params: Dict, mask_weights: np.ndarray, fields: Sequence[str]
+) -> ImpactModel:
+    """
+    (Re)write the "impacts" column of every columnar entry in the hotel
+    and review shards from the stored freqs and masks, then the meta file. No
+    re-tokenizing: one pass finds the scale, a second writes the impacts.
+    Entries in the older {"docs": [...]} layout are left alone; migrate them
+    first.
+    """
+    start = time.time()
+    params = static_params(scoring_params)
+    model = ImpactModel(params, mask_weights, 1.0, params_fingerprint(params, fields))
+    paths = list(_shard_files(inverted_index_dir))
+
+    top = 0.0
+    for path in paths:
+        for entry in _read_shard(path).values():
+            if "ids" in entry and entry["ids"]:
+                top = max(top, float(model.static_scores(entry["freqs"], entry["masks"]).max()))
+    model.scale = top / MAX_IMPACT if top > 0 else 1.0
+
+    skipped = 0
+    for path in paths:
+        shard = _read_shard(path)
+        for entry in shard.values():
+            if "ids" not in entry:
+                skipped += 1
+                continue
+            entry["impacts"] = model.quantize(entry["freqs"], entry["masks"]).tolist()
+        with open(f"{path}.tmp", "w", encoding="utf-8-sig") as f:
+            json.dump(shard, f, indent=4, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    model.save(inverted_index_dir, fields)
+    if skipped:
+        print(f"Skipped {skipped} entries in the older postings layout; run `migrate` first")
+    print(
+        f"Wrote impacts for {len(paths)} shards (scale {model.scale:.6g}) in {time.time() - start:.2f}s"
+    )
+    return model
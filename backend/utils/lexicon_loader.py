@@ -1,15 +1,256 @@
 import json
+import os
 from functools import lru_cache
 import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import marisa_trie
+import numpy as np
+
+
+class Lexicon:
+    """
+    Compact term <-> word id map backed by a marisa-trie.
+
+    marisa numbers its keys itself, so the word ids live in an int array
+    indexed by trie key id (term -> id); the reverse array (id -> key id) is
+    derived from it on load. Both the trie and the id array can be
+    memory-mapped. Terms added at runtime go to an overlay dict and an
+    append-only additions file until the next compile_lexicon().
+
+    Supports the dict operations the engine and the builders use:
+    `term in lex`, `lex[term]`, `lex.get(term)`, `len(lex)`, items().
+    """
+
+    def __init__(self, trie: marisa_trie.Trie, ids: np.ndarray):
+        self.trie = trie
+        self.ids = ids
+        max_base = int(ids.max()) if len(ids) else -1
+        self.key_ids = np.full(max_base + 1, -1, dtype=np.int64)
+        self.key_ids[ids] = np.arange(len(ids), dtype=np.int64)
+        self.added = {}  # term -> id, not in the trie yet
+        self.added_terms = {}  # id -> term
+        self.max_id = max_base
+        self.additions_path = None
+
+    @classmethod
+    def from_dict(cls, mapping: Dict[str, int]) -> "Lexicon":
+        trie = marisa_trie.Trie(mapping.keys())
+        ids = np.empty(len(trie), dtype=np.int64)
+        for term, key_id in trie.iteritems():
+            ids[key_id] = mapping[term]
+        return cls(trie, ids)
+
+    @classmethod
+    def open(cls, base_path: str, mmap: bool = True) -> "Lexicon":
+        """Open base_path.marisa + base_path.ids.npy written by save()."""
+        trie = marisa_trie.Trie()
+        if mmap:
+            trie.mmap(f"{base_path}.marisa")
+        else:
+            trie.load(f"{base_path}.marisa")
+        ids = np.load(f"{base_path}.ids.npy", mmap_mode="r" if mmap else None)
+        return cls(trie, ids)
+
+    def save(self, base_path: str):
+        # Write-then-rename so concurrently starting workers never see a
+        # half-written file
+        self.trie.save(f"{base_path}.marisa.tmp")
+        with open(f"{base_path}.ids.npy.tmp", "wb") as f:
+            np.save(f, np.asarray(self.ids, dtype=np.int64))
+        os.replace(f"{base_path}.ids.npy.tmp", f"{base_path}.ids.npy")
+        os.replace(f"{base_path}.marisa.tmp", f"{base_path}.marisa")
+
+    def to_bytes(self) -> Tuple[bytes, bytes]:
+        return self.trie.tobytes(), np.asarray(self.ids, dtype=np.int64).tobytes()
+
+    @classmethod
+    def from_bytes(cls, trie_bytes: bytes, ids: np.ndarray) -> "Lexicon":
+        trie = marisa_trie.Trie()
+        trie.frombytes(bytes(trie_bytes))
+        return cls(trie, ids)
+
+    # -- dict-like lookups -------------------------------------------------
+    def get(self, term: str, default=None) -> Optional[int]:
+        key_id = self.trie.get(term)
+        if key_id is not None:
+            return int(self.ids[key_id])
+        return self.added.get(term, default)
+
+    def __getitem__(self, term: str) -> int:
+        word_id = self.get(term)
+        if word_id is None:
+            raise KeyError(term)
+        return word_id
+
+    def __contains__(self, term) -> bool:
+        if not isinstance(term, str):
+            return False
+        return term in self.trie or term in self.added
+
+    def __len__(self) -> int:
+        return len(self.trie) + len(self.added)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.trie.iterkeys()
+        yield from self.added
+
+    def keys(self):
+        return iter(self)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        for term, key_id in self.trie.iteritems():
+            yield term, int(self.ids[key_id])
+        yield from self.added.items()
+
+    def values(self) -> Iterator[int]:
+        for _, word_id in self.items():
+            yield word_id
+
+    def term(self, word_id: int) -> Optional[str]:
+        """Reverse lookup: word id -> term."""
+        word_id = int(word_id)
+        if 0 <= word_id < len(self.key_ids) and self.key_ids[word_id] >= 0:
+            return self.trie.restore_key(int(self.key_ids[word_id]))
+        return self.added_terms.get(word_id)
+
+    def prefix(self, prefix: str) -> Iterator[Tuple[str, int]]:
+        """All (term, word id) pairs whose term starts with prefix."""
+        for term, key_id in self.trie.iteritems(prefix):
+            yield term, int(self.ids[key_id])
+        for term, word_id in self.added.items():
+            if term.startswith(prefix):
+                yield term, word_id
+
+    # -- runtime additions -------------------------------------------------
+    def add(self, term: str) -> int:
+        """Word id for term, assigning the next free id if it is new."""
+        word_id = self.get(term)
+        if word_id is not None:
+            return word_id
+        self.max_id += 1
+        self.added[term] = self.max_id
+        self.added_terms[self.max_id] = term
+        return self.max_id
+
+    def load_additions(self, path: str):
+        self.additions_path = path
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    term, word_id = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue  # torn tail from a crash mid-append
+                if term not in self:
+                    self.added[term] = word_id
+                    self.added_terms[word_id] = term
+                    self.max_id = max(self.max_id, word_id)
+
+    def persist_additions(self, terms):
+        """Append newly added terms to the additions file and fsync."""
+        if not self.additions_path or not terms:
+            return
+        with open(self.additions_path, "a", encoding="utf-8") as f:
+            for term in terms:
+                f.write(json.dumps([term, self.added[term]]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def lexicon_base(lexicon_path: str) -> str:
+    """lexicon/lexicon.json -> lexicon/lexicon"""
+    return os.path.splitext(lexicon_path)[0]
+
+
+def additions_path(lexicon_path: str) -> str:
+    return f"{lexicon_base(lexicon_path)}.additions.jsonl"
+
+
+def compile_lexicon(
+    lexicon_path: str, fold_additions: bool = True, rebuilt: bool = False
+) -> Lexicon:
+    """
+    (Re)write the trie files next to lexicon.json. Run after any offline
+    lexicon build; with fold_additions, terms added at runtime are merged
+    into lexicon.json first. They keep their word ids, which the live
+    index uses, unless lexicon.json was rebuilt: its ids are numbered
+    afresh then, so the folded terms get new ids after its own.
+    """
+    mapping = {}
+    if os.path.exists(lexicon_path):
+        with open(lexicon_path, "r", encoding="utf-8-sig") as f:
+            mapping = json.load(f)
+    added = additions_path(lexicon_path)
+    if fold_additions and os.path.exists(added):
+        taken = set(mapping.values())
+        next_id = max(taken, default=-1) + 1
+        with open(added, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        term, word_id = json.loads(line)
+                    except (json.JSONDecodeError, ValueError):
+                        continue
+                    if term in mapping:
+                        continue
+                    if rebuilt or word_id in taken:
+                        if not rebuilt:
+                            print(f"Word ID {word_id} of added term '{term}' is taken; using {next_id}.")
+                        word_id = next_id
+                    mapping[term] = word_id
+                    taken.add(word_id)
+                    next_id = max(next_id, word_id + 1)
+        with open(lexicon_path, "w", encoding="utf-8-sig") as f:
+            json.dump(mapping, f)
+        os.remove(added)
+
+    lexicon = Lexicon.from_dict(mapping)
+    lexicon.save(lexicon_base(lexicon_path))
+    print(f"Compiled lexicon with {len(lexicon)} terms to {lexicon_base(lexicon_path)}.marisa")
+    return lexicon
+
+
+def _trie_is_current(lexicon_path: str) -> bool:
+    base = lexicon_base(lexicon_path)
+    files = [f"{base}.marisa", f"{base}.ids.npy"]
+    if not all(os.path.exists(p) for p in files):
+        return False
+    if not os.path.exists(lexicon_path):
+        return True
+    source = os.path.getmtime(lexicon_path)
+    return all(os.path.getmtime(p) >= source for p in files)
+
+
+def open_lexicon(lexicon_path: str) -> Lexicon:
+    """
+    Open the compact lexicon for lexicon_path (lexicon.json), compiling the
+    trie files first if they are missing or older than the JSON.
+    """
+    if not _trie_is_current(lexicon_path):
+        if not os.path.exists(lexicon_path):
+            lexicon = Lexicon.from_dict({})
+            lexicon.load_additions(additions_path(lexicon_path))
+            return lexicon
+        compile_lexicon(lexicon_path, fold_additions=False)
+    lexicon = Lexicon.open(lexicon_base(lexicon_path))
+    lexicon.load_additions(additions_path(lexicon_path))
+    return lexicon
 
 
 @lru_cache()
 def load_lexicon(lexicon_path):
     """Load lexicon with caching for subsequent calls."""
     print("Loading lexicon from disk...")
-    with open(lexicon_path, "r", encoding="utf-8-sig") as f:
-        lexicon = json.load(f)
-    return lexicon
+    return open_lexicon(lexicon_path)
 
 
 def measure_time(func, *args):
@@ -20,21 +261,13 @@ def measure_time(func, *args):
 
 
 if __name__ == "__main__":
-    lexicon_path = "../index data/lexicon/final/combined_lexicon.json"
+    lexicon_path = "../index data/lexicon/lexicon.json"
+    compile_lexicon(lexicon_path)
+    load_lexicon.cache_clear()
+
     lexicon, load_time = measure_time(load_lexicon, lexicon_path)
     print(f"Lexicon loaded in {load_time:.8f} seconds")
     print(f"Loaded {len(lexicon)} words from lexicon")
     print(f"Word ID for 'apple': {lexicon.get('apple')}")
     print(f"Word ID for 'banana': {lexicon.get('banana')}")
-
-    new_lexicon, load_time = measure_time(load_lexicon, lexicon_path)
-    print(f"Lexicon loaded in {load_time:.8f} seconds")
-    print(f"Loaded {len(new_lexicon)} words from lexicon")
-    print(f"Word ID for 'apple': {new_lexicon.get('apple')}")
-    print(f"Word ID for 'banana': {new_lexicon.get('banana')}")
-
-    new_1lexicon, load_time = measure_time(load_lexicon, lexicon_path)
-    print(f"Lexicon loaded in {load_time:.8f} seconds")
-    print(f"Loaded {len(new_1lexicon)} words from lexicon")
-    print(f"Word ID for 'apple': {new_1lexicon.get('apple')}")
-    print(f"Word ID for 'banana': {new_1lexicon.get('banana')}")
+    print(f"Terms starting with 'hot': {[t for t, _ in lexicon.prefix('hot')][:10]}")
@@ -0,0 +1,589 @@
+import heapq
+import os
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Field registry: a posting's fields are stored as a bitmask over this
+# tuple, so the order is part of the on-disk format. Only append to it.
+# These are the fields weighted in Config.SCORING_PARAMS["field_weights"].
+FIELDS = ("name", "region", "street-address", "locality", "title", "text")
+FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELDS)}
+
+
+def fields_mask(fields: Iterable[str]) -> int:
+    mask = 0
+    for name in fields:
+        mask |= FIELD_BITS.get(name, 0)
+    return mask
+
+
+def mask_fields(mask: int) -> List[str]:
+    return [name for name, bit in FIELD_BITS.items() if mask & bit]
+
+
+def mask_weight_table(field_weights: Dict[str, float]) -> np.ndarray:
+    """Summed field weight of every possible mask, indexed by mask."""
+    table = np.zeros(1 << len(FIELDS), dtype=np.float64)
+    for mask in range(len(table)):
+        table[mask] = sum(field_weights.get(name, 0.0) for name in mask_fields(mask))
+    return table
+
+
+class PostingList:
+    """
+    One term's postings as columns ordered by integer doc id. `ids` is a
+    plain list for galloping; the numpy columns are for vectorized
+    accumulation. `impacts` are the quantized static scores, if the shard
+    has them. `order` maps sorted index -> stored index for older shards
+    whose postings were not stored sorted.
+    """
+
+    __slots__ = ("ids", "id_array", "freqs", "masks", "impacts", "order")
+
+    def __init__(self, ids, freqs, masks, impacts=None, order=None):
+        self.ids = ids
+        self.id_array = np.asarray(ids, dtype=np.int64)
+        self.freqs = np.asarray(freqs, dtype=np.int64)
+        self.masks = np.asarray(masks, dtype=np.int64)
+        self.impacts = None if impacts is None else np.asarray(impacts, dtype=np.int64)
+        self.order = order
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def posting_list(entry: Dict) -> PostingList:
+    """
+    The PostingList of an inverted index entry: {"ids", "freqs", "masks"[,
+    "impacts"]} columns, or the older {"docs": [{"id": str, "freq", "fields"}]} layout,
+    which is converted (and sorted) once. Memoized on the entry, which
+    lives as long as its shard stays in the shard cache.
+    """
+    cached = entry.get("_postings")
+    if cached is not None:
+        return cached
+    if "ids" in entry:
+        postings = PostingList(
+            entry["ids"], entry["freqs"], entry["masks"], entry.get("impacts")
+        )
+    else:
+        docs = entry["docs"]
+        ids = [int(p["id"]) for p in docs]
+        order = None
+        if any(a > b for a, b in zip(ids, ids[1:])):
+            order = sorted(range(len(ids)), key=ids.__getitem__)
+            docs = [docs[i] for i in order]
+            ids = [ids[i] for i in order]
+        postings = PostingList(
+            ids,
+            [p["freq"] for p in docs],
+            [fields_mask(p["fields"]) for p in docs],
+            order=order,
+        )
+    entry["_postings"] = postings
+    return postings
+
+
+def entry_docs(entry: Optional[Dict], positions: Optional[List[List[int]]] = None) -> List[Dict]:
+    """
+    An entry in either layout as {"id", "freq", "mask", "positions"[,
+    "impact"]} dicts, for writers that merge new postings in. positions is
+    the entry's positions stream, if it has one. Writers that change a
+    posting's freq or mask must update or drop its impact.
+    """
+    if not entry:
+        return []
+    positions = positions or []
+    if "docs" in entry:
+        return [
+            {
+                "id": int(p["id"]),
+                "freq": p["freq"],
+                "mask": fields_mask(p["fields"]),
+                "positions": p.get("positions", positions[i] if i < len(positions) else []),
+            }
+            for i, p in enumerate(entry["docs"])
+        ]
+    docs = [
+        {
+            "id": doc_id,
+            "freq": freq,
+            "mask": mask,
+            "positions": positions[i] if i < len(positions) else [],
+        }
+        for i, (doc_id, freq, mask) in enumerate(
+            zip(entry["ids"], entry["freqs"], entry["masks"])
+        )
+    ]
+    for d, impact in zip(docs, entry.get("impacts", ())):
+        d["impact"] = impact
+    return docs
+
+
+def docs_entry(docs: List[Dict]) -> Tuple[Dict, List[List[int]]]:
+    """
+    Inverse of entry_docs: (columnar entry, positions stream), sorted by id.
+    The impacts column is kept only if every posting still has an impact.
+    """
+    docs = sorted(docs, key=lambda d: d["id"])
+    entry = {
+        "ids": [d["id"] for d in docs],
+        "freqs": [d["freq"] for d in docs],
+        "masks": [d["mask"] for d in docs],
+    }
+    if docs and all(d.get("impact") is not None for d in docs):
+        entry["impacts"] = [d["impact"] for d in docs]
+    return entry, [d["positions"] for d in docs]
+
+
+class Matches:
+    """
+    In-query accumulator. Per matched doc: summed term frequency, OR of the
+    field masks, summed term weights (one per matching term: its mask's
+    field weight, or its dequantized impact when scoring by impacts) and
+    phrase boost, as parallel arrays ordered by doc id.
+    """
+
+    __slots__ = ("ids", "freqs", "masks", "weights", "boosts")
+
+    def __init__(self, ids, freqs, masks, weights, boosts=None):
+        self.ids = ids
+        self.freqs = freqs
+        self.masks = masks
+        self.weights = weights
+        self.boosts = np.zeros(len(ids)) if boosts is None else boosts
+
+    @classmethod
+    def empty(cls) -> "Matches":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0),
+        )
+
+    @classmethod
+    def combine(cls, ids, freqs, masks, weights, boosts=None) -> "Matches":
+        """Group rows by doc id, summing freqs, weights and boosts and OR-ing masks."""
+        if len(ids) == 0:
+            return cls.empty()
+        if boosts is None:
+            boosts = np.zeros(len(ids))
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        unique, starts = np.unique(ids, return_index=True)
+        return cls(
+            unique,
+            np.add.reduceat(freqs[order], starts),
+            np.bitwise_or.reduceat(masks[order], starts),
+            np.add.reduceat(weights[order], starts),
+            np.add.reduceat(boosts[order], starts),
+        )
+
+    @classmethod
+    def union(cls, lists: List[PostingList], weights: List[np.ndarray]) -> "Matches":
+        """weights: each list's per-posting term weights."""
+        if not lists:
+            return cls.empty()
+        return cls.combine(
+            np.concatenate([pl.id_array for pl in lists]),
+            np.concatenate([pl.freqs for pl in lists]),
+            np.concatenate([pl.masks for pl in lists]),
+            np.concatenate(weights),
+        )
+
+    @classmethod
+    def concat(cls, parts: List["Matches"]) -> "Matches":
+        """Merge accumulators, e.g. hotel matches and review matches re-keyed by hotel."""
+        parts = [m for m in parts if len(m)]
+        if not parts:
+            return cls.empty()
+        return cls.combine(
+            *(np.concatenate([getattr(m, col) for m in parts]) for col in cls.__slots__)
+        )
+
+    @classmethod
+    def gather(cls, lists: List["ImpactList"], keys: np.ndarray, scale: float) -> "Matches":
+        """Full freqs, masks and dequantized impacts of keys over lists."""
+        freqs = np.zeros(len(keys), dtype=np.int64)
+        masks = np.zeros(len(keys), dtype=np.int64)
+        weights = np.zeros(len(keys))
+        for l in lists:
+            if not len(keys) or not len(l):
+                continue
+            idx = np.minimum(np.searchsorted(l.keys, keys), len(l) - 1)
+            hit = l.keys[idx] == keys
+            idx = idx[hit]
+            freqs[hit] += l.freqs[idx]
+            masks[hit] |= l.masks[idx]
+            weights[hit] += l.impacts[idx] * scale
+        return cls(keys, freqs, masks, weights)
+
+    def rekey(self, keys: np.ndarray) -> "Matches":
+        """Accumulate under new doc ids (one per row); rows keyed < 0 are dropped."""
+        keep = keys >= 0
+        return Matches.combine(
+            keys[keep], self.freqs[keep], self.masks[keep], self.weights[keep], self.boosts[keep]
+        )
+
+    def select(self, keep) -> "Matches":
+        """Rows selected by a boolean array or a slice."""
+        return Matches(*(getattr(self, col)[keep] for col in self.__slots__))
+
+    def index(self, doc_id: int) -> int:
+        """Row of doc_id, or -1."""
+        i = int(np.searchsorted(self.ids, doc_id))
+        return i if i < len(self.ids) and self.ids[i] == doc_id else -1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, doc_id) -> bool:
+        return self.index(doc_id) >= 0
+
+    def rows(self):
+        """(doc_id, freq, mask, weight, boost) tuples of Python scalars."""
+        return zip(
+            self.ids.tolist(),
+            self.freqs.tolist(),
+            self.masks.tolist(),
+            self.weights.tolist(),
+            self.boosts.tolist(),
+        )
+
+
+# iter_matches reads at most this many postings per list per block
+DAAT_BLOCK = 4096
+
+
+def iter_matches(
+    lists: List[Matches],
+    block: int = DAAT_BLOCK,
+    required: Optional[List[bool]] = None,
+    minimum: int = 0,
+) -> Iterator[Matches]:
+    """
+    Document-at-a-time union of lists, each sorted by doc id (one per term,
+    e.g. Matches.union of a single PostingList), yielded in doc id order as
+    blocks of complete docs: a block ends at the lowest doc id `block`
+    postings ahead in any list, so memory stays bounded by the block size.
+    With required, only docs in at least `minimum` of the lists flagged
+    there are yielded.
+    """
+    if required is not None:
+        required = [flag for m, flag in zip(lists, required) if len(m)]
+    lists = [m for m in lists if len(m)]
+    cursors = [0] * len(lists)
+    while True:
+        active = [i for i, m in enumerate(lists) if cursors[i] < len(m)]
+        if not active:
+            return
+        bound = min(
+            lists[i].ids[min(cursors[i] + block, len(lists[i])) - 1] for i in active
+        )
+        parts, required_ids = [], []
+        for i in active:
+            end = int(np.searchsorted(lists[i].ids, bound, side="right"))
+            part = lists[i].select(slice(cursors[i], end))
+            cursors[i] = end
+            parts.append(part)
+            if required is not None and required[i]:
+                required_ids.append(part.ids)
+        matches = Matches.concat(parts)
+        if required is not None:
+            ids, counts = np.unique(
+                np.concatenate(required_ids) if required_ids else np.empty(0, dtype=np.int64),
+                return_counts=True,
+            )
+            matches = matches.select(np.isin(matches.ids, ids[counts >= minimum]))
+        if len(matches):
+            yield matches
+
+
+# score_at_a_time stops once at most this many keys per result can still
+# make the top k
+CANDIDATES_PER_RESULT = 2
+
+
+class ImpactList:
+    """
+    One term's integer impact per doc key, in two orders: columns sorted by
+    key for lookups, and the keys grouped into segments of equal impact,
+    highest impact first, for score-at-a-time evaluation.
+    """
+
+    __slots__ = ("keys", "impacts", "freqs", "masks", "seg_impacts", "seg_starts", "seg_keys")
+
+    def __init__(self, keys, impacts, freqs, masks):
+        self.keys = keys
+        self.impacts = impacts
+        self.freqs = freqs
+        self.masks = masks
+        # keys are sorted, so a stable sort keeps them sorted within a segment
+        order = np.argsort(-impacts, kind="stable")
+        by_impact = impacts[order]
+        starts = np.flatnonzero(np.diff(by_impact)) + 1
+        self.seg_starts = np.concatenate(([0], starts, [len(keys)])).astype(np.int64)
+        self.seg_impacts = by_impact[self.seg_starts[:-1]] if len(keys) else by_impact
+        self.seg_keys = keys[order]
+
+    @classmethod
+    def from_postings(cls, pl: PostingList) -> "ImpactList":
+        return cls(pl.id_array, pl.impacts, pl.freqs, pl.masks)
+
+    def rollup(self, keys: np.ndarray) -> "ImpactList":
+        """
+        Re-keyed (e.g. review -> hotel), summing the impacts and freqs and
+        OR-ing the masks of postings that share a key; keys < 0 are dropped.
+        """
+        keep = keys >= 0
+        keys = keys[keep]
+        if not len(keys):
+            empty = np.empty(0, dtype=np.int64)
+            return ImpactList(empty, empty, empty, empty)
+        order = np.argsort(keys, kind="stable")
+        unique, starts = np.unique(keys[order], return_index=True)
+        return ImpactList(
+            unique,
+            np.add.reduceat(self.impacts[keep][order], starts),
+            np.add.reduceat(self.freqs[keep][order], starts),
+            np.bitwise_or.reduceat(self.masks[keep][order], starts),
+        )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def segment(self, j: int) -> np.ndarray:
+        return self.seg_keys[self.seg_starts[j] : self.seg_starts[j + 1]]
+
+
+def score_at_a_time(
+    lists: List[ImpactList],
+    k: int,
+    budget: int,
+    predicate: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Tuple[np.ndarray, int, str]:
+    """
+    The (at most) k keys with the highest summed impact over lists.
+
+    Segments of all lists are read in descending impact order, adding each
+    segment's impact to its keys' accumulators. No key can gain more from
+    the unread postings than the sum of the lists' next segment impacts,
+    so once that bound is below the k-th best accumulator no unseen key can
+    make the top k, and only keys within the bound of it still can.
+    Evaluation stops when those are few (at most CANDIDATES_PER_RESULT * k);
+    their exact sums are then looked up and the best k kept. It also stops
+    once `budget` postings have been read, in which case the result is
+    approximate, and likewise when should_stop() turns true between
+    segments. predicate(keys) -> bool array drops keys before they are
+    accumulated.
+
+    Returns the top keys in key order, the number of distinct keys seen
+    and why evaluation stopped: "exhausted", "top_k", "budget" or
+    "stopped".
+    """
+    lists = [l for l in lists if len(l)]
+    if not lists:
+        return np.empty(0, dtype=np.int64), 0, "exhausted"
+    size = max(int(l.keys[-1]) for l in lists) + 1
+    acc = np.zeros(size, dtype=np.int64)
+    seen = np.zeros(size, dtype=bool)
+    touched = []
+    n_seen = 0
+    read = 0
+    cursors = [0] * len(lists)
+    heap = [(-int(l.seg_impacts[0]), i) for i, l in enumerate(lists)]
+    heapq.heapify(heap)
+    remaining = sum(int(l.seg_impacts[0]) for l in lists)
+    last_check = None
+    reason = "exhausted"
+
+    while heap:
+        neg_impact, i = heapq.heappop(heap)
+        impact = -neg_impact
+        seg = lists[i].segment(cursors[i])
+        if read + len(seg) > budget:
+            seg = seg[: budget - read]
+            reason = "budget"
+        read += len(seg)
+        if predicate is not None and len(seg):
+            seg = seg[predicate(seg)]
+        acc[seg] += impact
+        new = seg[~seen[seg]]
+        seen[new] = True
+        touched.append(new)
+        n_seen += len(new)
+        if reason == "budget":
+            break
+        if should_stop is not None and should_stop():
+            reason = "stopped"
+            break
+
+        cursors[i] += 1
+        remaining -= impact
+        if cursors[i] < len(lists[i].seg_impacts):
+            nxt = int(lists[i].seg_impacts[cursors[i]])
+            remaining += nxt
+            heapq.heappush(heap, (-nxt, i))
+
+        # Checking costs O(keys seen), so only as the bound shrinks
+        if heap and n_seen >= k and (last_check is None or remaining <= 0.9 * last_check):
+            last_check = remaining
+            keys = np.concatenate(touched)
+            touched = [keys]
+            scores = acc[keys]
+            kth = np.partition(scores, len(keys) - k)[len(keys) - k]
+            if kth > remaining:
+                candidates = keys[scores + remaining >= kth]
+                if len(candidates) <= CANDIDATES_PER_RESULT * k:
+                    reason = "top_k"
+                    break
+
+    if reason == "top_k":
+        keys = candidates
+        scores = np.zeros(len(keys), dtype=np.int64)
+        for l in lists:
+            idx = np.minimum(np.searchsorted(l.keys, keys), len(l) - 1)
+            scores += np.where(l.keys[idx] == keys, l.impacts[idx], 0)
+    else:
+        keys = np.concatenate(touched)
+        scores = acc[keys]
+    if len(keys) > k:
+        keys = keys[np.argpartition(scores, len(keys) - k)[len(keys) - k :]]
+    return np.sort(keys), n_seen, reason
+
+
+def gallop(ids: Sequence[int], target: int, lo: int = 0) -> int:
+    """
+    Index of the first element >= target in ids[lo:], found by doubling the
+    step from lo and then bisecting the last step. Costs O(log d) for a
+    distance d from lo, so walking a long list in increasing target order
+    only pays for the gaps it skips.
+    """
+    n = len(ids)
+    if lo >= n or ids[lo] >= target:
+        return lo
+    step = 1
+    hi = lo + 1
+    while hi < n and ids[hi] < target:
+        lo = hi
+        step *= 2
+        hi = lo + step
+    return bisect_left(ids, target, lo + 1, min(hi + 1, n))
+
+
+def intersect(lists: List[Sequence[int]]) -> List[int]:
+    """Doc ids present in every sorted list; shortest list first."""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    shortest, others = lists[0], lists[1:]
+    cursors = [0] * len(others)
+    result = []
+    for doc_id in shortest:
+        for i, ids in enumerate(others):
+            pos = gallop(ids, doc_id, cursors[i])
+            cursors[i] = pos
+            if pos == len(ids):
+                return result
+            if ids[pos] != doc_id:
+                break
+        else:
+            result.append(doc_id)
+    return result
+
+
+def at_least(lists: List[Sequence[int]], minimum: int) -> List[int]:
+    """
+    Doc ids present in at least `minimum` of the sorted lists.
+
+    A doc in `minimum` of n lists must be in one of any n - minimum + 1 of
+    them, so candidates only come from the shortest n - minimum + 1 lists;
+    the longer lists are probed by galloping.
+    """
+    n = len(lists)
+    minimum = max(1, min(minimum, n))
+    if minimum == n:
+        return intersect(lists)
+    lists = sorted(lists, key=len)
+    split = n - minimum + 1
+    counts = Counter()
+    for ids in lists[:split]:
+        counts.update(ids)
+    if minimum == 1:
+        return sorted(counts)
+
+    probes = lists[split:]
+    cursors = [0] * len(probes)
+    result = []
+    for doc_id in sorted(counts):
+        hits = counts[doc_id]
+        for i, ids in enumerate(probes):
+            if hits >= minimum or hits + len(probes) - i < minimum:
+                break
+            pos = gallop(ids, doc_id, cursors[i])
+            cursors[i] = pos
+            if pos < len(ids) and ids[pos] == doc_id:
+                hits += 1
+        if hits >= minimum:
+            result.append(doc_id)
+    return result
+
+
+def find(ids: Sequence[int], doc_id: int) -> int:
+    """Index of doc_id in the sorted ids, or -1."""
+    pos = bisect_left(ids, doc_id)
+    return pos if pos < len(ids) and ids[pos] == doc_id else -1
+
+
+# Positions of consecutive fields are this far apart, so phrases and
+# proximity windows never span two fields.
+FIELD_POSITION_GAP = 100
+
+
+def phrase_gap(positions: List[Sequence[int]], slop: int = 0) -> Optional[int]:
+    """
+    How loosely a document matches a phrase, given each phrase term's
+    positions in it: 0 when the terms are adjacent (in order for slop 0,
+    in any order within the window otherwise), else the number of extra
+    positions in the smallest window holding every term. None if there is
+    no match within slop.
+    """
+    if not positions or any(not p for p in positions):
+        return None
+    if len(positions) == 1:
+        return 0
+    if slop == 0:
+        rest = [set(p) for p in positions[1:]]
+        for start in positions[0]:
+            if all(start + i in p for i, p in enumerate(rest, 1)):
+                return 0
+        return None
+
+    # Smallest window covering one position of every term: advance the
+    # list holding the window's minimum until one of them runs out
+    positions = [sorted(p) for p in positions]
+    heap = [(p[0], i, 0) for i, p in enumerate(positions)]
+    heapq.heapify(heap)
+    hi = max(p[0] for p in positions)
+    best = hi - heap[0][0]
+    while True:
+        lo, i, j = heapq.heappop(heap)
+        best = min(best, hi - lo)
+        if j + 1 == len(positions[i]):
+            break
+        nxt = positions[i][j + 1]
+        hi = max(hi, nxt)
+        heapq.heappush(heap, (nxt, i, j + 1))
+    extra = max(0, best - (len(positions) - 1))
+    return extra if extra <= slop else None
+
+
+def positions_path(inv_file: str) -> str:
+    """.../inverted_index_0-19999.json -> .../positions_0-19999.json"""
+    directory, name = os.path.split(inv_file)
+    return os.path.join(directory, name.replace("inverted_index_", "positions_", 1))
@@ -0,0 +1,29 @@
+import re
+from typing import List, NamedTuple, Tuple
+
+# "exact phrase" or "terms within a window"~N
+PHRASE_PATTERN = re.compile(r'"([^"]*)"(?:~(\d+))?')
+MAX_SLOP = 20
+
+
+class Phrase(NamedTuple):
+    text: str
+    slop: int  # 0: exact phrase; N: all terms within N extra positions
+
+
+def parse_query(query: str) -> Tuple[str, List[Phrase]]:
+    """
+    Split a query into its plain text and its quoted phrases. The phrase
+    words stay in the plain text so they are also scored as terms; stray
+    quotes are dropped.
+
+    >>> parse_query('"free parking" near "times square"~3')
+    ('free parking near times square', [Phrase(text='free parking', slop=0), Phrase(text='times square', slop=3)])
+    """
+    phrases = []
+    for m in PHRASE_PATTERN.finditer(query):
+        text = " ".join(m.group(1).split())
+        if text:
+            phrases.append(Phrase(text, min(int(m.group(2) or 0), MAX_SLOP)))
+    plain = PHRASE_PATTERN.sub(lambda m: f" {m.group(1)} ", query).replace('"', " ")
+    return " ".join(plain.split()), phrases
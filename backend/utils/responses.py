@@ -0,0 +1,61 @@
+import hashlib
+from typing import Optional
+
+import orjson
+import pandas as pd
+from starlette.responses import JSONResponse, Response
+
+# numpy scalars and arrays are written as numbers and lists; orjson writes
+# NaN and +/-inf floats, numpy's included, as null.
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Values orjson has no encoding for, mostly from DataFrame rows."""
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if hasattr(obj, "item"):
+        # numpy scalars orjson does not cover, e.g. float16 or bool_
+        return obj.item()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded by orjson in a single pass. Return it from an
+    endpoint rather than a dict: FastAPI runs jsonable_encoder over
+    returned dicts, which copies the whole response once more.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag of the representation that parts identify."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an If-None-Match header lists etag, compared weakly as RFC 9110
+    has it. "*" is not honoured: whether the resource exists is not known
+    without looking it up.
+    """
+    if not if_none_match:
+        return False
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
@@ -0,0 +1,182 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Collection, Dict, List, Optional
+
+import numpy as np
+
+from utils.postings import Matches, mask_fields
+
+# Sentiment scaling factors
+SENTIMENT_BOOST_FACTOR = 0.1
+SENTIMENT_PENALTY_FACTOR = 0.1
+# Per additional matched review of the same hotel, for doc_type=reviews
+MULTI_REVIEW_BONUS = 0.05
+# Added to each result's record by hydrate
+SCORE_FIELDS = ("search_score", "matched_fields", "matched_terms", "sentiment_score")
+
+
+def sentiment_type(query_sentiment: float) -> str:
+    if query_sentiment < -0.05:
+        return "negative"
+    if query_sentiment > 0.05:
+        return "positive"
+    return "neutral"
+
+
+class Ranking:
+    """Docs of a search, best first, with the score, field mask and sentiment of each."""
+
+    __slots__ = ("ids", "scores", "masks", "sentiments")
+
+    def __init__(self, ids, scores, masks, sentiments):
+        self.ids = ids
+        self.scores = scores
+        self.masks = masks
+        self.sentiments = sentiments
+
+    @classmethod
+    def empty(cls) -> "Ranking":
+        return cls(
+            np.empty(0, dtype=np.int64),
+            np.empty(0),
+            np.empty(0, dtype=np.int64),
+            np.empty(0),
+        )
+
+    def select(self, keep) -> "Ranking":
+        """Rows selected by a boolean array or a slice."""
+        return Ranking(*(getattr(self, col)[keep] for col in self.__slots__))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def rank_documents(
+    matched: Matches,
+    sentiments: np.ndarray,
+    query_tokens: List[str],
+    query_sentiment: float,
+    params: Dict,
+    impact_mode: bool = False,
+    hotel_ids: Optional[np.ndarray] = None,
+    review_counts: Optional[np.ndarray] = None,
+    sort: bool = True,
+) -> Ranking:
+    """
+    Score matched docs from their accumulated matches and sentiments alone,
+    so no records are needed until a page of them is shown. With hotel_ids
+    (reviews), each review gets MULTI_REVIEW_BONUS per other matched review
+    of its hotel, counted among matched, or from review_counts (matched
+    reviews per hotel id) when matched is only part of the matches. Pure
+    and vectorized; it can run in a worker process. Without sort the docs
+    stay in matched's order.
+    """
+    base_freq = params["base_freq_weight"]
+    multi_bonus = params["multi_token_bonus"]
+    length_norm = params["length_norm_factor"]
+    freqs = matched.freqs
+    approx_matched = np.minimum(len(set(query_tokens)), freqs)
+
+    if impact_mode:
+        # Static part precomputed per posting; only the multi-token bonus
+        # depends on the query
+        scores = matched.weights + approx_matched * multi_bonus
+    else:
+        # Frequency and field weights, multi-token bonus, length normalization
+        scores = freqs * base_freq + matched.weights
+        scores = scores + approx_matched * multi_bonus
+        scores = scores / (1 + length_norm * freqs)
+
+    # Phrase / proximity matches
+    scores = scores + matched.boosts
+
+    # Sentiment adjustment: boost docs that agree with the query, penalize
+    # docs that disagree; neutral queries are not adjusted
+    query_type = sentiment_type(query_sentiment)
+    if query_type != "neutral":
+        agree = sentiments < 0 if query_type == "negative" else sentiments > 0
+        disagree = sentiments > 0 if query_type == "negative" else sentiments < 0
+        strength = np.abs(sentiments)
+        scores = scores + np.where(agree, SENTIMENT_BOOST_FACTOR * strength, 0.0)
+        scores = scores - np.where(disagree, SENTIMENT_PENALTY_FACTOR * strength, 0.0)
+
+    # Ensure the score doesn't drop below base_freq
+    scores = np.maximum(scores, base_freq)
+
+    if hotel_ids is not None and len(hotel_ids):
+        if review_counts is not None:
+            reviews = review_counts[hotel_ids]
+        else:
+            _, per_hotel, counts = np.unique(hotel_ids, return_inverse=True, return_counts=True)
+            reviews = counts[per_hotel]
+        scores = scores + MULTI_REVIEW_BONUS * (reviews - 1)
+
+    if not sort:
+        return Ranking(matched.ids, scores, matched.masks, sentiments)
+    # Best first; ties stay in doc id order
+    order = np.argsort(-scores, kind="stable")
+    return Ranking(matched.ids[order], scores[order], matched.masks[order], sentiments[order])
+
+
+def hydrate(
+    records: List[Dict],
+    ranking: Ranking,
+    query_tokens: List[str],
+    fields: Optional[Collection[str]] = None,
+) -> List[Dict]:
+    """
+    Result dicts of ranking's docs; records[i] is the i-th doc's record,
+    None to skip it. With fields, only those of the SCORE_FIELDS are added.
+    """
+    wanted = set(SCORE_FIELDS if fields is None else fields)
+    matched_terms = list(set(query_tokens))
+    results = []
+    for record, score, mask, doc_sentiment in zip(
+        records, ranking.scores.tolist(), ranking.masks.tolist(), ranking.sentiments.tolist()
+    ):
+        if record is None:
+            continue
+        info = dict(record)
+        if "search_score" in wanted:
+            info["search_score"] = score
+        if "matched_fields" in wanted:
+            info["matched_fields"] = mask_fields(mask)
+        if "matched_terms" in wanted:
+            info["matched_terms"] = matched_terms
+        if "sentiment_score" in wanted:
+            info["sentiment_score"] = doc_sentiment
+        results.append(info)
+    return results
+
+
+def create_executor(kind: str, workers: int) -> Executor:
+    """Executor for rank_documents: "thread" or "process"."""
+    if kind == "process":
+        # spawn: the server process runs threads, which fork does not copy safely
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    if kind == "thread":
+        return ThreadPoolExecutor(workers, thread_name_prefix="scoring")
+    raise ValueError(f"Unknown scoring executor: {kind}")
+
+
+class ScoringPool:
+    """
+    Runs scoring off the event loop. Callers hold `slots` while preparing
+    and scoring a result set, so at most `concurrency` searches per server
+    worker are doing CPU-bound work; later ones wait their turn instead of
+    queueing unbounded work behind the loop.
+    """
+
+    def __init__(self, kind: str, workers: int, concurrency: int):
+        self.kind = kind
+        self.executor = create_executor(kind, workers)
+        self.slots = asyncio.Semaphore(concurrency)
+
+    async def submit(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
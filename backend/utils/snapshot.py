@@ -0,0 +1,218 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Layout (little endian):
+#   header   magic(8s) version(I) section_count(I) crc32(I) reserved(I)
+#   table    section_count x name(32s) offset(Q) length(Q)
+#   payload  sections, each aligned to 8 bytes
+# crc32 covers the table and the payload.
+MAGIC = b"HSESNAP\0"
+SNAPSHOT_VERSION = 2
+HEADER = struct.Struct("<8sIIII")
+ENTRY = struct.Struct("<32sQQ")
+ALIGN = 8
+
+
+class SnapshotError(Exception):
+    """Snapshot file is missing, corrupted, of another version or stale."""
+
+
+def stamp_files(paths: Iterable[str]) -> Dict[str, Optional[list]]:
+    """[size, mtime_ns] per path, None for missing files."""
+    stamps = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamps[path] = [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            stamps[path] = None
+    return stamps
+
+
+def write_snapshot(path: str, sections: Dict[str, bytes]):
+    """Write sections to path atomically."""
+    names = list(sections)
+    offset = HEADER.size + ENTRY.size * len(names)
+    table = []
+    layout = []
+    for name in names:
+        offset += -offset % ALIGN
+        data = sections[name]
+        table.append(ENTRY.pack(name.encode("utf-8"), offset, len(data)))
+        layout.append((offset, data))
+        offset += len(data)
+
+    crc = zlib.crc32(b"".join(table))
+    pos = HEADER.size + ENTRY.size * len(names)
+    body = []
+    for off, data in layout:
+        pad = b"\0" * (off - pos)
+        crc = zlib.crc32(data, zlib.crc32(pad, crc))
+        body.append(pad)
+        body.append(data)
+        pos = off + len(data)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(names), crc, 0))
+        for entry in table:
+            f.write(entry)
+        for chunk in body:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """Read-only, mmap-backed view of a snapshot file."""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.sections = self._read_table(verify)
+        except Exception:
+            self.mm.close()
+            raise
+
+    def _read_table(self, verify: bool) -> Dict[str, tuple]:
+        if len(self.mm) < HEADER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, count, crc, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not an engine snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                f"{self.path} has version {version}, expected {SNAPSHOT_VERSION}"
+            )
+        if verify:
+            view = memoryview(self.mm)
+            try:
+                actual = zlib.crc32(view[HEADER.size :])
+            finally:
+                view.release()
+            if actual != crc:
+                raise SnapshotError(f"{self.path} failed its checksum")
+
+        sections = {}
+        for i in range(count):
+            raw, offset, length = ENTRY.unpack_from(self.mm, HEADER.size + i * ENTRY.size)
+            if offset + length > len(self.mm):
+                raise SnapshotError(f"{self.path} is truncated")
+            sections[raw.rstrip(b"\0").decode("utf-8")] = (offset, length)
+        return sections
+
+    def bytes(self, name: str) -> memoryview:
+        if name not in self.sections:
+            raise SnapshotError(f"{self.path} has no section {name!r}")
+        offset, length = self.sections[name]
+        return memoryview(self.mm)[offset : offset + length]
+
+    def array(self, name: str, dtype) -> np.ndarray:
+        """Zero-copy array over the mmap."""
+        return np.frombuffer(self.bytes(name), dtype=dtype)
+
+    def json(self, name: str):
+        return json.loads(bytes(self.bytes(name)))
+
+    def pickle(self, name: str):
+        return pickle.loads(self.bytes(name))
+
+
+def json_section(obj) -> bytes:
+    return json.dumps(obj).encode("utf-8")
+
+
+def pickle_section(obj) -> bytes:
+    return pickle.dumps(obj, protocol=5)
+
+
+def int_map_sections(prefix: str, items, value_dtype) -> Dict[str, bytes]:
+    """Sorted key/value arrays for PackedIntMap."""
+    pairs = sorted((int(k), v) for k, v in items)
+    keys = np.fromiter((k for k, _ in pairs), dtype=np.int64, count=len(pairs))
+    values = np.fromiter((v for _, v in pairs), dtype=value_dtype, count=len(pairs))
+    return {f"{prefix}.keys": keys.tobytes(), f"{prefix}.values": values.tobytes()}
+
+
+class PackedIntMap:
+    """
+    Dict-like map over sorted int64 keys and a parallel values array, as
+    loaded zero-copy from a snapshot. Writes go to an overlay dict, so the
+    arrays never have to be rebuilt. key_type is the type keys are reported
+    as by items() (str for maps persisted as JSON objects).
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray, key_type=int):
+        self.keys = keys
+        self.values = values
+        self.key_type = key_type
+        self.overlay = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot, prefix: str, value_dtype, key_type=int):
+        return cls(
+            snapshot.array(f"{prefix}.keys", np.int64),
+            snapshot.array(f"{prefix}.values", value_dtype),
+            key_type,
+        )
+
+    def _index(self, key: int) -> Optional[int]:
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+    def __getitem__(self, key):
+        k = int(key)
+        if k in self.overlay:
+            return self.overlay[k]
+        i = self._index(k)
+        if i is None:
+            raise KeyError(key)
+        return self.values[i].item()
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def __contains__(self, key):
+        try:
+            k = int(key)
+        except (TypeError, ValueError):
+            return False
+        return k in self.overlay or self._index(k) is not None
+
+    def __setitem__(self, key, value):
+        self.overlay[int(key)] = value
+
+    def update(self, other):
+        pairs = other.items() if hasattr(other, "items") else other
+        for k, v in pairs:
+            self[k] = v
+
+    def __len__(self):
+        return len(self.keys) + sum(1 for k in self.overlay if self._index(k) is None)
+
+    def items(self):
+        for k, v in zip(self.keys.tolist(), self.values.tolist()):
+            if k not in self.overlay:
+                yield self.key_type(k), v
+        for k, v in self.overlay.items():
+            yield self.key_type(k), v
+
+    def clear(self):
+        self.keys = self.keys[:0]
+        self.values = self.values[:0]
+        self.overlay = {}
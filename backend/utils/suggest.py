@@ -0,0 +1,171 @@
+import heapq
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import marisa_trie
+import numpy as np
+
+# Completion lists are precomputed for every prefix up to this length;
+# longer prefixes are answered from the lexicon trie, which by then only
+# has a handful of matching terms.
+MAX_PREFIX_LENGTH = 6
+TOP_K = 10
+
+
+def suggest_base(lexicon_path: str) -> str:
+    """lexicon/lexicon.json -> lexicon/suggest"""
+    return os.path.join(os.path.dirname(lexicon_path), "suggest")
+
+
+def count_document_frequencies(
+    inverted_index_dir: str, doc_types: Tuple[str, ...] = ("hotels", "reviews")
+) -> Dict[int, int]:
+    """Number of documents per word id, over the doc types' inverted shards."""
+    df = defaultdict(int)
+    for doc_type in doc_types:
+        shard_dir = os.path.join(inverted_index_dir, doc_type)
+        if not os.path.isdir(shard_dir):
+            continue
+        for fn in sorted(os.listdir(shard_dir)):
+            if not (fn.startswith("inverted_index_") and fn.endswith(".json")):
+                continue
+            with open(os.path.join(shard_dir, fn), "r", encoding="utf-8-sig") as f:
+                shard = json.load(f)
+            for word_id, entry in shard.items():
+                df[int(word_id)] += len(entry["ids"] if "ids" in entry else entry["docs"])
+    return df
+
+
+class SuggestIndex:
+    """
+    Prefix -> top-k completions, ranked by document frequency.
+
+    `lists` is a marisa BytesTrie mapping every prefix of up to
+    MAX_PREFIX_LENGTH characters to the packed word ids of its best
+    completions, so a keystroke is a single trie lookup. `df` holds the
+    document frequency per word id. Terms added to the lexicon at runtime
+    are merged in from the lexicon overlay until the next rebuild.
+    """
+
+    def __init__(self, lists: marisa_trie.BytesTrie, df: np.ndarray, k: int = TOP_K):
+        self.lists = lists
+        self.df = df
+        self.k = k
+        self.added_df = defaultdict(int)  # word id -> docs indexed since the build
+
+    @classmethod
+    def build(
+        cls,
+        lexicon,
+        df: Dict[int, int],
+        k: int = TOP_K,
+        max_prefix_length: int = MAX_PREFIX_LENGTH,
+    ) -> "SuggestIndex":
+        size = max((int(w) for _, w in lexicon.items()), default=-1) + 1
+        df_array = np.zeros(size, dtype=np.uint32)
+        for word_id, count in df.items():
+            if word_id < size:
+                df_array[word_id] = count
+
+        ranked = sorted(lexicon.items(), key=lambda tw: (-int(df_array[tw[1]]), tw[0]))
+        completions = defaultdict(list)
+        for term, word_id in ranked:
+            if not df_array[word_id]:
+                break  # never indexed; not worth suggesting
+            for n in range(1, min(len(term), max_prefix_length) + 1):
+                best = completions[term[:n]]
+                if len(best) < k:
+                    best.append(word_id)
+
+        lists = marisa_trie.BytesTrie(
+            (prefix, np.asarray(ids, dtype=np.uint32).tobytes())
+            for prefix, ids in completions.items()
+        )
+        return cls(lists, df_array, k)
+
+    def save(self, base_path: str):
+        self.lists.save(f"{base_path}.marisa.tmp")
+        with open(f"{base_path}.df.npy.tmp", "wb") as f:
+            np.save(f, self.df)
+        os.replace(f"{base_path}.df.npy.tmp", f"{base_path}.df.npy")
+        os.replace(f"{base_path}.marisa.tmp", f"{base_path}.marisa")
+
+    @classmethod
+    def open(cls, base_path: str) -> "SuggestIndex":
+        lists = marisa_trie.BytesTrie()
+        lists.mmap(f"{base_path}.marisa")
+        return cls(lists, np.load(f"{base_path}.df.npy", mmap_mode="r"))
+
+    def doc_frequency(self, word_id: int) -> int:
+        base = int(self.df[word_id]) if 0 <= word_id < len(self.df) else 0
+        return base + self.added_df.get(word_id, 0)
+
+    def record(self, word_ids: Iterable[int]):
+        """Count a newly indexed document for terms the build has not seen."""
+        for word_id in word_ids:
+            if word_id >= len(self.df):
+                self.added_df[word_id] += 1
+
+    def suggest(self, lexicon, prefix: str, k: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Up to k (term, document frequency) pairs for prefix, best first."""
+        # Stored lists hold self.k ids, so that is also the cap for short prefixes
+        k = k or self.k
+        if not prefix:
+            return []
+
+        if len(prefix) <= MAX_PREFIX_LENGTH:
+            packed = self.lists.get(prefix)
+            candidates = np.frombuffer(packed[0], dtype=np.uint32).tolist() if packed else []
+            candidates = [(lexicon.term(w), w) for w in candidates]
+            candidates += [
+                (term, w) for term, w in lexicon.added.items() if term.startswith(prefix)
+            ]
+        else:
+            candidates = lexicon.prefix(prefix)
+
+        best = heapq.nsmallest(
+            k,
+            (
+                (-self.doc_frequency(w), term)
+                for term, w in candidates
+                if term is not None and self.doc_frequency(w) > 0
+            ),
+        )
+        return [(term, -neg_df) for neg_df, term in best]
+
+
+def suggest_is_current(lexicon_path: str) -> bool:
+    """The suggest files exist and were built against the current lexicon trie."""
+    base = suggest_base(lexicon_path)
+    files = [f"{base}.marisa", f"{base}.df.npy"]
+    if not all(os.path.exists(p) for p in files):
+        return False
+    lexicon_trie = f"{os.path.splitext(lexicon_path)[0]}.marisa"
+    if not os.path.exists(lexicon_trie):
+        return True
+    built = min(os.path.getmtime(p) for p in files)
+    return built >= os.path.getmtime(lexicon_trie)
+
+
+def build_suggest_files(lexicon, lexicon_path: str, inverted_index_dir: str) -> SuggestIndex:
+    """Count document frequencies and write the completion lists next to the lexicon."""
+    start = time.time()
+    index = SuggestIndex.build(lexicon, count_document_frequencies(inverted_index_dir))
+    index.save(suggest_base(lexicon_path))
+    print(
+        f"Built completion lists for {len(index.lists)} prefixes in {time.time() - start:.2f}s"
+    )
+    return index
+
+
+if __name__ == "__main__":
+    from lexicon_loader import load_lexicon
+
+    lexicon_path = "../index data/lexicon/lexicon.json"
+    lexicon = load_lexicon(lexicon_path)
+    index = build_suggest_files(lexicon, lexicon_path, "../index data/inverted_index")
+    for prefix in ["h", "ho", "hot", "brea", "clean"]:
+        print(prefix, index.suggest(lexicon, prefix))
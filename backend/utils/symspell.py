@@ -0,0 +1,182 @@
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+import marisa_trie
+import numpy as np
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+
+def symspell_path(lexicon_path: str) -> str:
+    """lexicon/lexicon.json -> lexicon/symspell.marisa"""
+    return os.path.join(os.path.dirname(lexicon_path), "symspell.marisa")
+
+
+def deletes(term: str, max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH) -> Set[str]:
+    """term's prefix and every string reachable from it by up to max_distance deletions."""
+    key = term[:prefix_length]
+    result = {key}
+    frontier = [key]
+    for _ in range(max_distance):
+        nxt = []
+        for word in frontier:
+            if len(word) <= 1:
+                continue
+            for i in range(len(word)):
+                d = word[:i] + word[i + 1 :]
+                if d not in result:
+                    result.add(d)
+                    nxt.append(d)
+        frontier = nxt
+    return result
+
+
+def damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance between a and b, or max_distance + 1
+    as soon as it is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev2 is not None
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class SymSpellIndex:
+    """
+    Symmetric-delete spelling index over the lexicon.
+
+    Every term's prefix is indexed under all of its deletions of up to
+    max_distance characters, so the candidates for a misspelling are found
+    by generating the query's own deletions and looking each one up; the
+    cost does not depend on the lexicon size. Candidates are verified with
+    Damerau-Levenshtein on the full strings. The base index is a marisa
+    BytesTrie (one packed word id per delete/term pair); terms added at
+    runtime go to an in-memory overlay.
+    """
+
+    def __init__(
+        self,
+        trie: marisa_trie.BytesTrie,
+        max_distance: int = MAX_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+    ):
+        self.trie = trie
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.added = defaultdict(list)  # delete -> word ids
+
+    @classmethod
+    def build(
+        cls,
+        items: Iterable[Tuple[str, int]],
+        max_distance: int = MAX_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+    ) -> "SymSpellIndex":
+        """items: (term, word id) pairs, e.g. lexicon.items()."""
+        pairs = (
+            (d, np.uint32(word_id).tobytes())
+            for term, word_id in items
+            for d in deletes(term, max_distance, prefix_length)
+        )
+        return cls(marisa_trie.BytesTrie(pairs), max_distance, prefix_length)
+
+    def save(self, path: str):
+        self.trie.save(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def open(cls, path: str) -> "SymSpellIndex":
+        trie = marisa_trie.BytesTrie()
+        trie.mmap(path)
+        return cls(trie)
+
+    def add(self, term: str, word_id: int):
+        for d in deletes(term, self.max_distance, self.prefix_length):
+            self.added[d].append(word_id)
+
+    def _candidates(self, term: str, max_distance: int) -> Set[int]:
+        ids = set()
+        for d in deletes(term, max_distance, self.prefix_length):
+            for packed in self.trie.get(d, ()):
+                ids.add(int(np.frombuffer(packed, dtype=np.uint32)[0]))
+            ids.update(self.added.get(d, ()))
+        return ids
+
+    def lookup(
+        self,
+        lexicon,
+        term: str,
+        max_distance: Optional[int] = None,
+        frequency: Optional[Callable[[int], int]] = None,
+        k: int = 1,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Up to k (term, word id, distance) corrections for term, closest
+        first, more frequent first among equally close ones.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        if max_distance <= 0:
+            return []
+        scored = []
+        for word_id in self._candidates(term, max_distance):
+            candidate = lexicon.term(word_id)
+            if candidate is None or candidate == term:
+                continue
+            distance = damerau_levenshtein(term, candidate, max_distance)
+            if distance <= max_distance:
+                freq = frequency(word_id) if frequency else 0
+                scored.append((distance, -freq, candidate, word_id))
+        scored.sort()
+        return [(candidate, word_id, distance) for distance, _, candidate, word_id in scored[:k]]
+
+
+def symspell_is_current(lexicon_path: str) -> bool:
+    """The delete index exists and is newer than the lexicon trie."""
+    path = symspell_path(lexicon_path)
+    if not os.path.exists(path):
+        return False
+    lexicon_trie = f"{os.path.splitext(lexicon_path)[0]}.marisa"
+    if not os.path.exists(lexicon_trie):
+        return True
+    return os.path.getmtime(path) >= os.path.getmtime(lexicon_trie)
+
+
+def build_symspell_file(lexicon, lexicon_path: str) -> SymSpellIndex:
+    """Build the delete index for lexicon and write it next to lexicon_path."""
+    start = time.time()
+    index = SymSpellIndex.build(lexicon.items())
+    index.save(symspell_path(lexicon_path))
+    print(
+        f"Built spelling index with {len(index.trie)} deletes in {time.time() - start:.2f}s"
+    )
+    return index
+
+
+if __name__ == "__main__":
+    from lexicon_loader import load_lexicon
+
+    lexicon_path = "../index data/lexicon/lexicon.json"
+    lexicon = load_lexicon(lexicon_path)
+    index = build_symspell_file(lexicon, lexicon_path)
+    for word in ["hiltn", "breakfst", "clen", "locaton"]:
+        print(word, index.lookup(lexicon, word))
@@ -24,15 +24,23 @@ class Tokenizer:
         self.nlp = spacy.load("en_core_web_sm", disable=["ner", "parser"])
 
     def tokenize_with_spacy(self, text):
+        doc = self.nlp(self.__clean(text))
+        return self.__tokens(doc)
+
+    def tokenize_many(self, texts, batch_size=64):
+        """tokenize_with_spacy of each text, run through spaCy as one nlp.pipe stream."""
+        docs = self.nlp.pipe((self.__clean(text) for text in texts), batch_size=batch_size)
+        return [self.__tokens(doc) for doc in docs]
+
+    def __clean(self, text):
         text = self.__remove_urls(text)
         text = self.__expand_contractions(text)
         text = self.__remove_punctuation(text)
         text = self.__remove_stopwords(text)
-        text = text.lower()
+        return text.lower()
 
-        doc = self.nlp(text)
-        tokens = [token.lemma_ if token.pos_ != "NOUN" else token.text for token in doc]
-        return tokens
+    def __tokens(self, doc):
+        return [token.lemma_ if token.pos_ != "NOUN" else token.text for token in doc]
 
     # =======================================================================
     # def process_large_text_parallel(self, texts):
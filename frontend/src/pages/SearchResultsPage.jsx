@@ -1,12 +1,38 @@
+import { useEffect, useState } from "react";
 import HotelCard from "@/components/HotelCard";
 import SearchBar from "@/components/SearchBar";
+import { Button } from "@/components/ui/button";
 import { useLocation } from "react-router-dom";
 
 function SearchResultsPage() {
   const location = useLocation();
   const { data } = location.state;
-  const hotels = data.results;
   const totalResults = data.total_matches;
+  const [hotels, setHotels] = useState(data.results);
+  const [nextCursor, setNextCursor] = useState(data.next_cursor);
+  const [loading, setLoading] = useState(false);
+
+  // A new search from the search bar replaces the results
+  useEffect(() => {
+    setHotels(data.results);
+    setNextCursor(data.next_cursor);
+  }, [data]);
+
+  const loadMore = () => {
+    setLoading(true);
+    fetch(`http://127.0.0.1:8000/search?cursor=${encodeURIComponent(nextCursor)}`, {
+      method: "GET",
+    })
+      .then((res) => res.json())
+      .then((page) => {
+        setHotels((current) => current.concat(page.results || []));
+        setNextCursor(page.next_cursor);
+      })
+      .catch((err) => {
+        console.log(err);
+      })
+      .finally(() => setLoading(false));
+  };
 
   return (
     <div className="min-h-screen w-screen bg-primaryclr p-8">
@@ -34,9 +60,17 @@ function SearchResultsPage() {
             />
           ))}
         </div>
+
+        {nextCursor && (
+          <div className="flex justify-center">
+            <Button variant="outline" onClick={loadMore} disabled={loading}>
+              {loading ? "Loading..." : "Load more"}
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
 }
 
-export default SearchResultsPage;
\ No newline at end of file
+export default SearchResultsPage;